@@ -2,27 +2,47 @@
 
 # Python Packages
 import os
+import shutil
 import logging
 import json
 import time
+import importlib
 import environs
 from flask import Flask, request, Response, json
-import deep_lynx
 import threading
 
 # Repository Modules
-from .deep_lynx_query import query_deep_lynx
-from .deep_lynx_import import import_to_deep_lynx
-from .ml_adapter import main
+from .jobs import JobQueue
 import utils
+import prediction
+
+# The names of the modules of the package that are imported on first use, so that pandas, deep_lynx and the Jupyter
+# packages are not imported before the HTTP server starts
+LAZY_MODULES = {
+    "deep_lynx_query": ["query_deep_lynx", "queue"],
+    "deep_lynx_import": ["import_to_deep_lynx"],
+    "ml_adapter": ["main"],
+    "ring_buffer": ["RingBuffer"],
+    "scheduler": ["TrainingScheduler"],
+    "ingest_batcher": ["IngestBatcher"],
+    "adapter_config": ["AdapterConfig", "ADAPTERS_DIR", "DATASET_FILE"],
+    "adapter_scheduler": ["AdapterScheduler"],
+    "deep_lynx_client": ["DeepLynxClient", "get_deep_lynx_client"],
+    "metatype_cache": ["MetatypeCache", "get_metatype_cache"],
+    "bulk_import": ["BulkImporter", "get_bulk_importer", "read_records"],
+    "deep_lynx_startup": ["Startup", "deep_lynx_init", "register_for_event"],
+}
+LAZY_NAMES = {name: module for module, names in LAZY_MODULES.items() for name in names}
 
 # Global variables
 api_client = None
-lock_ = threading.Lock()
 threads = list()
-number_of_events = 1
+jobs = None
+batcher = None
 env = environs.Env()
-new_data = False
+window = None
+scheduler = None
+startup = None
 
 # configure logging. to overwrite the log file for each run, add option: filemode='w'
 logging.basicConfig(filename='MLAdapter.log',
@@ -34,10 +54,30 @@ logging.basicConfig(filename='MLAdapter.log',
 print('Application started. Logging to file MLAdapter.log')
 
 
+def __getattr__(name: str):
+    """ Imports the module of a name of LAZY_NAMES on first use """
+    if name not in LAZY_NAMES:
+        raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+    # Importing a submodule binds its name in the package, which must not replace a global of the same name
+    missing = object()
+    previous = globals().get(LAZY_NAMES[name], missing)
+    module = importlib.import_module("." + LAZY_NAMES[name], __name__)
+    if previous is not missing:
+        globals()[LAZY_NAMES[name]] = previous
+    for module_name in LAZY_MODULES[LAZY_NAMES[name]]:
+        globals()[module_name] = getattr(module, module_name)
+    return globals()[name]
+
+
 def create_app():
     """ This file and aplication is the entry point for the `flask run` command """
-    global number_of_events
+    global api_client
     global env
+    global jobs
+    global batcher
+    global window
+    global scheduler
+    global startup
     app = Flask(os.getenv('FLASK_APP'), instance_relative_config=True)
 
     # Validate .env file exists
@@ -47,17 +87,47 @@ def create_app():
     env = environs.Env()
     env.read_env()
     env.url("DEEP_LYNX_URL")
+    env.int("DEEP_LYNX_POOL_SIZE", 10)
+    env.str("DEEP_LYNX_TOKEN_EXPIRY", "12h")
+    env.int("DEEP_LYNX_RETRIES", 3)
+    env.float("DEEP_LYNX_BACKOFF_SECONDS", 0.5)
     env.str("CONTAINER_NAME")
     env.str("DATA_SOURCE_NAME")
     env.list("DATA_SOURCES")
     env.int("IMPORT_FILE_WAIT_SECONDS")
+    env.float("IMPORT_FILE_TIMEOUT_SECONDS", None)
+    env.str("IMPORT_MODE", "upload", validate=environs.validate.OneOf(["upload", "manual"]))
+    env.int("IMPORT_CHUNK_NODES", 1000)
+    env.int("IMPORT_CHUNK_BYTES", 4 * 1024 * 1024)
+    env.int("IMPORT_IN_FLIGHT", 4)
+    env.int("IMPORT_RETRIES", 3)
+    env.float("METATYPE_CACHE_SECONDS", 300)
+    env.float("METATYPE_VALIDATION_SAMPLE", 0.0)
     env.int("REGISTER_WAIT_SECONDS")
-    env.path("QUERY_FILE_NAME")
-    env.path("IMPORT_FILE_NAME")
     env.path("ML_ADAPTER_OBJECT_LOCATION")
     env.path("METADATA")
     env.path("QUEUE_FILE_NAME")
     env.int("QUEUE_LENGTH")
+    env.int("QUEUE_SEGMENT_ROWS", None)
+    env.int("QUEUE_MAX_SEGMENTS", 8)
+    env.int("TRAIN_MIN_NEW_ROWS", 1)
+    env.float("TRAIN_MAX_LATENCY_SECONDS", None)
+    env.int("EVENT_WORKERS", 4)
+    env.int("EVENT_QUEUE_SIZE", 100)
+    env.int("INGEST_BATCH_FILES", 100)
+    env.int("INGEST_BATCH_MS", 50)
+    env.int("INGEST_CHUNK_ROWS", 100000)
+    env.int("ADAPTER_WORKERS", None)
+    env.int("MODEL_WORKERS", 1)
+    env.int("MODEL_THREADS", None)
+    env.float("ARTIFACT_CACHE_MB", 0)
+    env.path("ARTIFACT_CACHE_DIR", os.path.join("data", "cache"))
+    env.str("DATASET_HANDOFF", "csv", validate=environs.validate.OneOf(["csv", "npy"]))
+    env.json("DATASET_SCHEMA", None)
+    env.bool("DATASET_COMPACT_DTYPES", False)
+    env.str("DATASET_FLOAT_DTYPE", "float32", validate=environs.validate.OneOf(["float32", "float64"]))
+    env.int("PREDICTION_BATCH_ROWS", 256)
+    env.float("PREDICTION_BATCH_MS", 5)
     env.list("ML_ADAPTER_OBJECTS")
 
     split = json.loads(os.getenv("SPLIT"))
@@ -65,57 +135,35 @@ def create_app():
         error = "must be dict, not {0}".format(type(split))
         raise TypeError(error)
 
+    # Bounded pool of worker threads that retrieve files from Deep Lynx for received events
+    jobs = JobQueue(env.int("EVENT_WORKERS", 4), env.int("EVENT_QUEUE_SIZE", 100), name="event_thread")
+
     # Purpose to run flask once (not twice)
     if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
-        # Instantiate deep_lynx
-        container_id, data_source_id, api_client = deep_lynx_init()
-        os.environ["CONTAINER_ID"] = container_id
-        os.environ["DATA_SOURCE_ID"] = data_source_id
-
-        # Register for events to listen for
-        register_for_event(api_client)
-
-        # Create Thread object that runs the machine learning algorithms
-        # Thread object: activity that is run in a separate thread of control
-        # Daemon: a process that runs in the background. A daemon thread will shut down immediately when the program exits.
-        ml_thread = threading.Thread(target=main, daemon=True, name="ml_thread")
-        print("Created ml_thread")
-        threads.append(ml_thread)
-        # Start the thread’s activity
-        ml_thread.start()
-
-        # File clean up
-        if os.path.exists(os.getenv("QUEUE_FILE_NAME")):
-            os.remove(os.getenv("QUEUE_FILE_NAME"))
-        if os.path.exists(os.getenv("ML_ADAPTER_OBJECT_LOCATION")):
-            f = open(os.getenv("ML_ADAPTER_OBJECT_LOCATION"))
-            ml_adapter_object = json.load(f)
-            f.close()
-            if os.path.exists(ml_adapter_object["MODEL"]["output_file"]):
-                os.remove(ml_adapter_object["MODEL"]["output_file"])
-            if os.path.exists(ml_adapter_object["DATASET"]):
-                os.remove(ml_adapter_object["DATASET"])
-            os.remove(os.getenv("ML_ADAPTER_OBJECT_LOCATION"))
-        if os.path.exists("data/training_set.csv"):
-            os.remove("data/training_set.csv")
-        if os.path.exists("data/testing_set.csv"):
-            os.remove("data/testing_set.csv")
-        if os.path.exists("data/X_train.csv"):
-            os.remove("data/X_train.csv")
-        if os.path.exists("data/X_test.csv"):
-            os.remove("data/X_test.csv")
-        if os.path.exists("data/y_train.csv"):
-            os.remove("data/y_train.csv")
-        if os.path.exists("data/y_test.csv"):
-            os.remove("data/y_test.csv")
+        # Deep Lynx is initialized in the background, so that the HTTP server starts at once, see /machinelearning/ready
+        from .deep_lynx_startup import Startup
+        startup = Startup(initialize).start()
 
     @app.route('/machinelearning', methods=['POST'])
     def events():
-        global number_of_events
-        if 'application/json' not in request.content_type:
+        # The latency and the status of every event are observed
+        start = time.perf_counter()
+        response = handle_event()
+        metrics = utils.get_metrics_registry()
+        metrics["events_total"].inc(status=response.status_code)
+        metrics["event_seconds"].observe(time.perf_counter() - start, status=response.status_code)
+        return response
+
+    def handle_event():
+        if 'application/json' not in (request.content_type or ''):
             logging.warning('Received request with unsupported content type')
             return Response('Unsupported Content Type. Please use application/json', status=400)
 
+        if startup is None or not startup.ready:
+            # Deep Lynx retries the event once the ML Adapter is initialized
+            response = json.dumps({'received': False, 'error': 'ML Adapter is starting'})
+            return Response(response=response, status=503, mimetype='application/json', headers={'Retry-After': '5'})
+
         # Data from graph has been received
         data = request.get_json()
         try:
@@ -125,155 +173,114 @@ def create_app():
             # The incoming payload doesn't have what we need, but still return a 200
             return Response(response=json.dumps({'received': True}), status=200, mimetype='application/json')
 
-        # Retrieves file from Deep Lynx
-        name = "event_thread_" + str(number_of_events)
-        # Thread object: activity that is run in a separate thread of control
-        event_thread = threading.Thread(target=query_deep_lynx, args=(file_id, ), name=name)
-        print("Created ", name)
-        threads.append(event_thread)
-        number_of_events += 1
-        # Start the thread’s activity
-        event_thread.start()
-        # Join: Wait until the thread terminates. This blocks the calling thread until the thread whose join() method is called terminates.
-        event_thread.join()
-        with lock_:
-            new_data = True
-        print(name, " is done")
-
-        return Response(response=json.dumps({'received': True}), status=200, mimetype='application/json')
+        # Queue the retrieval of the file from Deep Lynx and respond before it is processed
+        from .deep_lynx_query import query_deep_lynx
+        job_id = jobs.submit(query_deep_lynx, file_id)
+        if job_id is None:
+            # Apply backpressure: Deep Lynx retries the event later
+            logging.warning('Event queue is full. Rejected event for file ' + str(file_id))
+            response = json.dumps({'received': False, 'error': 'Too many events in progress'})
+            return Response(response=response, status=429, mimetype='application/json', headers={'Retry-After': '1'})
+        logging.info('Queued job ' + job_id + ' for file ' + str(file_id))
+
+        response = json.dumps({'received': True, 'job_id': job_id})
+        return Response(response=response, status=202, mimetype='application/json')
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        # The metrics of the pipeline in the Prometheus text format
+        return Response(response=utils.get_metrics_registry().render(),
+                        status=200,
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    @app.route('/machinelearning/ready', methods=['GET'])
+    def ready():
+        # Ready once Deep Lynx is initialized and the machine learning thread is started
+        status = startup.status() if startup is not None else {'ready': False, 'stage': 'not started'}
+        return Response(response=json.dumps(status),
+                        status=200 if status['ready'] else 503,
+                        mimetype='application/json')
+
+    @app.route('/machinelearning/jobs/<job_id>', methods=['GET'])
+    def job_status(job_id):
+        job = jobs.status(job_id)
+        if job is None:
+            return Response(response=json.dumps({'error': 'Job not found'}), status=404, mimetype='application/json')
+        return Response(response=json.dumps(job), status=200, mimetype='application/json')
+
+    @app.route('/machinelearning/predict/stats', methods=['GET'])
+    def prediction_stats():
+        stats = prediction.get_prediction_batcher().stats()
+        return Response(response=json.dumps(stats), status=200, mimetype='application/json')
+
+    @app.route('/machinelearning/predict/<name>', methods=['POST'])
+    def predict(name):
+        if 'application/json' not in (request.content_type or ''):
+            return Response('Unsupported Content Type. Please use application/json', status=400)
+
+        # The rows are a list of records, or a JSON object of columns e.g. {"rows": [{"x1": 1.0, "x2": 2.0}]}
+        body = request.get_json()
+        rows = body.get("rows", body) if isinstance(body, dict) else body
+        model_registry = prediction.get_model_registry()
+        if name not in model_registry.objects:
+            response = json.dumps({'error': 'ML Adapter object ' + name + ' not found'})
+            return Response(response=response, status=404, mimetype='application/json')
+        try:
+            result = prediction.get_prediction_batcher().predict(name, rows)
+        except FileNotFoundError as error:
+            return Response(response=json.dumps({'error': str(error)}), status=503, mimetype='application/json')
+        except (ValueError, TypeError) as error:
+            return Response(response=json.dumps({'error': str(error)}), status=400, mimetype='application/json')
+        return Response(response=json.dumps(result), status=200, mimetype='application/json')
 
     return app
 
 
-def register_for_event(api_client: deep_lynx.ApiClient, iterations=30):
+def initialize(api):
     """
-    Register with Deep Lynx to receive data_ingested events on applicable data sources
-    
-    Args
-        api_client (deep_lynx.ApiClient): deep lynx api client
-        iterations (integer): the number of interations to try registering for events
-    """
-    registered = False
-
-    # List of adapters to receive events from
-    data_ingested_adapters = json.loads(os.getenv("DATA_SOURCES"))
-
-    # Register events for listening from other data sources
-    while registered == False and iterations > 0:
-        # Get a list of data sources and validate that no error occurred
-        datasource_api = deep_lynx.DataSourcesApi(api_client)
-        data_sources = datasource_api.list_data_sources(os.getenv("CONTAINER_ID"))
-
-        if data_sources.is_error == False and len(data_sources.value) > 0:
-            #data_sources = data_sources.to_dict()["value"]
-            for data_source in data_sources.value:
-                # If the data source is found, create a registered event
-                if data_source.name in data_ingested_adapters:
-
-                    events_api = deep_lynx.EventsApi(api_client)
-
-                    # verify that this event action does not already exist
-                    # by comparing to the established event action we would like to create
-
-                    event_action = deep_lynx.CreateEventActionRequest(
-                        data_source.container_id, data_source.id, "file_created", "send_data", None, "http://" +
-                        os.getenv('FLASK_RUN_HOST') + ":" + os.getenv('FLASK_RUN_PORT') + "/machinelearning",
-                        os.getenv("DATA_SOURCE_ID"), True)
-
-                    actions = events_api.list_event_actions()
-                    for action in actions.value:
-
-                        # if destination, event_type, and data_source_id match, we know that this
-                        # event action already exists
-                        if action.destination == event_action.destination and action.event_type == event_action.event_type \
-                            and action.data_source_id == event_action.data_source_id:
-                            # this exact event action already exists, remove data source from list
-                            logging.info('Event action on ' + data_source.name + ' already exists')
-                            data_ingested_adapters.remove(data_source.name)
-
-                    # continue event action creation if the same was not already found
-                    if data_source.name in data_ingested_adapters:
-                        create_action_result = events_api.create_event_action(event_action)
-
-                        if create_action_result.is_error:
-                            logging.warning('Error creating event action: ' + create_action_result.error)
-                        else:
-                            logging.info('Successful creation of event action on ' + data_source.name + ' datasource')
-                            data_ingested_adapters.remove(data_source.name)
-
-                    # If all events are registered
-                    if len(data_ingested_adapters) == 0:
-                        registered = True
-                        logging.info('Successful registration on all adapters')
-                        return registered
-
-        # If the desired data source and container is not found, repeat
-        logging.info(
-            f'Datasource(s) {", ".join(data_ingested_adapters)} not found. Next event registration attempt in {os.getenv("REGISTER_WAIT_SECONDS")} seconds.'
-        )
-        time.sleep(float(os.getenv('REGISTER_WAIT_SECONDS')))
-        iterations -= 1
-
-    return registered
-
-
-def deep_lynx_init():
-    """ 
-    Returns the container id, data source id, and api client for use with the DeepLynx SDK.
-    Assumes token authentication. 
+    Creates the queue window and starts the machine learning thread once Deep Lynx is initialized, see Startup
 
     Args
-        None
-    Return
-        container_id (str), data_source_id (str), api_client (ApiClient)
+        api (deep_lynx.ApiClient): deep lynx api client
     """
-    # initialize an ApiClient for use with deep_lynx APIs
-    configuration = deep_lynx.configuration.Configuration()
-    configuration.host = os.getenv('DEEP_LYNX_URL')
-    api_client = deep_lynx.ApiClient(configuration)
-
-    # perform API token authentication only if values are provided
-    if os.getenv('DEEP_LYNX_API_KEY') != '' and os.getenv('DEEP_LYNX_API_KEY') is not None:
-
-        # authenticate via an API key and secret
-        auth_api = deep_lynx.AuthenticationApi(api_client)
-
-        try:
-            token = auth_api.retrieve_o_auth_token(x_api_key=os.getenv('DEEP_LYNX_API_KEY'),
-                                                   x_api_secret=os.getenv('DEEP_LYNX_API_SECRET'),
-                                                   x_api_expiry='12h')
-        except TypeError:
-            print("ERROR: Cannot connect to DeepLynx.")
-            logging.error("Cannot connect to DeepLynx.")
-            return '', '', None
-
-        # update header
-        api_client.set_default_header('Authorization', 'Bearer {}'.format(token))
-
-    # get container ID
-    container_id = None
-    container_api = deep_lynx.ContainersApi(api_client)
-    containers = container_api.list_containers()
-    for container in containers.value:
-        if container.name == os.getenv('CONTAINER_NAME'):
-            container_id = container.id
-            continue
-
-    if container_id is None:
-        print('Container not found')
-        return None, None, None
-
-    # get data source ID, create if necessary
-    data_source_id = None
-    datasources_api = deep_lynx.DataSourcesApi(api_client)
-
-    datasources = datasources_api.list_data_sources(container_id)
-    for datasource in datasources.value:
-        if datasource.name == os.getenv('DATA_SOURCE_NAME'):
-            data_source_id = datasource.id
-    if data_source_id is None:
-        datasource = datasources_api.create_data_source(
-            deep_lynx.CreateDataSourceRequest(os.getenv('DATA_SOURCE_NAME'), 'standard', True), container_id)
-        data_source_id = datasource.value.id
-
-    return container_id, data_source_id, api_client
+    global api_client
+    global batcher
+    global window
+    global scheduler
+    # The submodules are imported before the globals of the same name, e.g. scheduler, are set
+    from .deep_lynx_query import queue
+    from .ml_adapter import main
+    from .ring_buffer import RingBuffer
+    from .scheduler import TrainingScheduler
+    from .ingest_batcher import IngestBatcher
+    from .adapter_config import ADAPTERS_DIR, DATASET_FILE
+    api_client = api
+
+    # Create the in-memory queue window, which is restored from the segment files of a previous run
+    window = RingBuffer(env.int("QUEUE_LENGTH"),
+                        spill_path=os.getenv("QUEUE_FILE_NAME"),
+                        segment_rows=env.int("QUEUE_SEGMENT_ROWS", None),
+                        max_segments=env.int("QUEUE_MAX_SEGMENTS", 8))
+    # The machine learning thread blocks on the scheduler until new data triggers a training cycle
+    scheduler = TrainingScheduler(window,
+                                  min_new_rows=env.int("TRAIN_MIN_NEW_ROWS", 1),
+                                  max_latency=env.float("TRAIN_MAX_LATENCY_SECONDS", None))
+    # Bursts of retrieved files are committed to the queue window together
+    batcher = IngestBatcher(queue,
+                            max_files=env.int("INGEST_BATCH_FILES", 100),
+                            max_wait=env.int("INGEST_BATCH_MS", 50) / 1000)
+
+    # File clean up of the scratch directories and the queue window snapshot of a previous run
+    if os.path.exists(ADAPTERS_DIR):
+        shutil.rmtree(ADAPTERS_DIR)
+    if os.path.exists(DATASET_FILE):
+        os.remove(DATASET_FILE)
+
+    # Create Thread object that runs the machine learning algorithms
+    # Thread object: activity that is run in a separate thread of control
+    # Daemon: a process that runs in the background. A daemon thread will shut down immediately when the program exits.
+    ml_thread = threading.Thread(target=main, daemon=True, name="ml_thread")
+    print("Created ml_thread")
+    threads.append(ml_thread)
+    # Start the thread’s activity
+    ml_thread.start()
@@ -0,0 +1,93 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import os
+import copy
+import json
+import shutil
+
+import utils
+
+# Directory of the scratch directories of the ML Adapter objects
+ADAPTERS_DIR = os.path.join("data", "adapters")
+
+# File of the queue window snapshot shared by every ML Adapter object of a training cycle
+DATASET_FILE = os.path.join("data", "dataset.csv")
+
+
+class AdapterConfig():
+    """
+    The configuration of a single run of an ML Adapter object, which keeps the files of the run in a scratch
+    directory so that ML Adapter objects run concurrently without sharing files or environment variables
+
+        1. Copies the JSON object of the ML Adapter object, so that a run never modifies ML_ADAPTER_OBJECTS
+        2. Moves the files written by the run into the scratch directory: the ML Adapter object file, the training and
+           testing sets, the variable selection output file, the model output file and the working directories of the
+           models
+        3. Hands the file paths to the Jupyter Notebooks through the ML Adapter object file and the environment
+           variables of the kernel, see env
+
+    Args
+        name (string): the name of the ML Adapter object
+        data (dictionary): a single JSON object in the ML_ADAPTER_OBJECTS environment variable
+        dataset_file (string): the .csv file of the queue window, which is read and never written by the run
+        directory (string): the scratch directory, defaults to data/adapters/<name>
+    """
+
+    def __init__(self, name: str, data: dict, dataset_file: str = DATASET_FILE, directory: str = None):
+        self.name = name
+        self.directory = directory or os.path.join(ADAPTERS_DIR, name)
+        self.object_location = os.path.join(self.directory, utils.handoff.OBJECT_FILE)
+        self.training_set_file = os.path.join(self.directory, "training_set.csv")
+        self.testing_set_file = os.path.join(self.directory, "testing_set.csv")
+        self.training_set_dir = utils.handoff.dataset_directory(self.training_set_file)
+        self.testing_set_dir = utils.handoff.dataset_directory(self.testing_set_file)
+        self.models_directory = os.path.join(self.directory, "models")
+
+        self.data = copy.deepcopy(data)
+        self.data["DATASET"] = dataset_file
+        self.data["TRAINING_SET"] = self.training_set_file
+        self.data["TESTING_SET"] = self.testing_set_file
+        self.data["MODEL"]["output_file"] = os.path.join(self.directory, "ML_" + os.path.basename(dataset_file))
+        if self.data.get("VARIABLE_SELECTION", {}).get("output_file"):
+            self.data["VARIABLE_SELECTION"]["output_file"] = os.path.join(
+                self.directory, os.path.basename(self.data["VARIABLE_SELECTION"]["output_file"]))
+
+    @property
+    def env(self):
+        """ Returns the environment variables of the Jupyter Notebooks of the run """
+        return {
+            "ML_ADAPTER_OBJECT_LOCATION": self.object_location,
+            "QUERY_FILE_NAME": self.data["DATASET"],
+            "IMPORT_FILE_NAME": self.data["MODEL"]["output_file"]
+        }
+
+    def create(self):
+        """
+        Replaces the scratch directory with an empty directory and writes the ML Adapter object file
+        """
+        if os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
+        os.makedirs(self.directory)
+        with open(self.object_location, 'w') as fp:
+            json.dump(self.data, fp)
+
+    def remove(self, keep: list = None):
+        """
+        Removes the scratch directory
+
+        Args
+            keep (list): the files to keep e.g. an output file that failed to import, in which case only the other
+                files of the scratch directory are removed
+        """
+        keep = [os.path.abspath(path) for path in keep or list() if os.path.exists(path)]
+        if not keep:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            return
+        for entry in os.listdir(self.directory):
+            path = os.path.abspath(os.path.join(self.directory, entry))
+            if path in keep:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
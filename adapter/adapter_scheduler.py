@@ -0,0 +1,72 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import time
+import logging
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+import utils
+from .adapter_config import AdapterConfig, DATASET_FILE
+from .ml_adapter import ML_Adapter
+
+
+class AdapterScheduler():
+    """
+    Runs the ML Adapter objects of a training cycle concurrently, so that a training cycle takes as long as the slowest
+    ML Adapter object instead of the sum of the ML Adapter objects
+
+        1. Creates an AdapterConfig for every ML Adapter object, which gives the run its own copy of the ML Adapter
+           object and its own scratch directory data/adapters/<name>/
+        2. Runs up to workers ML Adapter objects at once over the same snapshot of the queue window. Every ML Adapter
+           object receives a shallow copy of the snapshot, so that one ML Adapter object cannot add or drop columns
+           of the snapshot of another
+        3. Logs an ML Adapter object that fails without stopping the other ML Adapter objects
+
+    Jupyter Notebooks of concurrent ML Adapter objects share the kernel pool (KERNEL_POOL_SIZE) and the model
+    scheduler (MODEL_WORKERS), which bound the number of kernels that run at once.
+
+    Args
+        workers (integer): the number of ML Adapter objects run at once
+    """
+
+    def __init__(self, workers: int = 1):
+        self.workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="adapter")
+
+    def run(self, ml_adapter_objects: list, dataset: pd.DataFrame, dataset_file: str = DATASET_FILE):
+        """
+        Runs the ML Adapter objects of a training cycle
+
+        Args
+            ml_adapter_objects (list): the ML_ADAPTER_OBJECTS environment variable e.g. [{"ML_Object_1": {...}}]
+            dataset (DataFrame): the snapshot of the queue window, which is never modified
+            dataset_file (string): the .csv file of the snapshot of the queue window
+        Return
+            ml_adapters (list): the ML_Adapter objects that succeeded, in the order of ml_adapter_objects
+        """
+        futures = list()
+        for ml_adapter_object in ml_adapter_objects:
+            name = list(ml_adapter_object.keys())[0]
+            config = AdapterConfig(name, ml_adapter_object[name], dataset_file)
+            futures.append((name, self._executor.submit(self._run, config, dataset.copy(deep=False))))
+
+        ml_adapters = list()
+        runs = utils.get_metrics_registry()["adapter_runs_total"]
+        for name, future in futures:
+            try:
+                ml_adapters.append(future.result())
+                runs.inc(object=name, outcome="ok")
+            except Exception:
+                logging.exception('ML Adapter object {0} failed'.format(name))
+                runs.inc(object=name, outcome="error")
+        return ml_adapters
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def _run(self, config: AdapterConfig, dataset: pd.DataFrame):
+        """ Runs a single ML Adapter object and logs how long it took """
+        start = time.time()
+        ml_adapter = ML_Adapter(config, dataset=dataset)
+        logging.info('ML Adapter object {0} ran in {1:.2f} seconds'.format(config.name, time.time() - start))
+        return ml_adapter
@@ -0,0 +1,201 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+# Python Packages
+import os
+import json
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import pandas as pd
+import adapter
+
+bulk_importer = None
+bulk_importer_lock = threading.Lock()
+
+
+class BulkImporter():
+    """
+    Imports large numbers of nodes into a Deep Lynx data source with concurrent manual imports
+
+        1. Reads the nodes from an iterator, e.g. the rows of a result file streamed by read_records, so that the whole
+           file is never held in memory
+        2. Splits the nodes into chunks of at most max_nodes nodes and max_bytes bytes of JSON
+        3. Sends every chunk as a manual import, keeping at most in_flight chunks in progress at once
+        4. Retries a chunk that failed up to retries times, waiting backoff, 2 * backoff, ... seconds with jitter
+        5. Returns and logs the number of nodes, chunks and bytes and the throughput of the import, see import_records
+
+    A chunk that failed after Deep Lynx stored it is imported twice when it is retried, so the type mappings of the
+    data source should identify nodes by an original id.
+
+    Args
+        client (DeepLynxClient): the Deep Lynx client
+        container_id (string): the id of the container
+        data_source_id (string): the id of the data source of the manual imports
+        max_nodes (integer): the number of nodes of a chunk
+        max_bytes (integer): the number of bytes of the JSON of a chunk. A single node larger than max_bytes is sent
+            as a chunk of its own
+        in_flight (integer): the number of chunks sent to Deep Lynx at once
+        retries (integer): the number of times a chunk is retried
+        backoff (float): the number of seconds before the first retry of a chunk
+    """
+
+    def __init__(self,
+                 client,
+                 container_id: str,
+                 data_source_id: str,
+                 max_nodes: int = 1000,
+                 max_bytes: int = 4 * 1024 * 1024,
+                 in_flight: int = 4,
+                 retries: int = 3,
+                 backoff: float = 0.5):
+        self.client = client
+        self.container_id = container_id
+        self.data_source_id = data_source_id
+        self.max_nodes = max(1, max_nodes)
+        self.max_bytes = max(1, max_bytes)
+        self.in_flight = max(1, in_flight)
+        self.retries = retries
+        self.backoff = backoff
+
+    def chunks(self, records):
+        """
+        Splits nodes into chunks bounded by max_nodes and max_bytes
+
+        Args
+            records (iterable): the nodes, every node a dictionary of its properties
+        Return
+            chunks (iterator): (chunk, number of bytes of its JSON) for every chunk
+        """
+        chunk = list()
+        size = 2
+        for record in records:
+            # Every node after the first adds its JSON and a comma to the JSON list of the chunk
+            record_size = len(json.dumps(record, default=str).encode()) + 1
+            if chunk and (len(chunk) >= self.max_nodes or size + record_size > self.max_bytes):
+                yield chunk, size
+                chunk = list()
+                size = 2
+            chunk.append(record)
+            size += record_size
+        if chunk:
+            yield chunk, size
+
+    def import_records(self, records):
+        """
+        Imports nodes into Deep Lynx in concurrent chunks
+
+        Args
+            records (iterable): the nodes, every node a dictionary of its properties
+        Return
+            stats (dictionary): the number of nodes, chunks and bytes imported, the number of failed chunks and nodes,
+                the seconds of the import, and the nodes and bytes imported per second
+        """
+        stats = {"nodes": 0, "chunks": 0, "bytes": 0, "failed_chunks": 0, "failed_nodes": 0}
+        start = time.monotonic()
+        # The number of nodes and bytes of every chunk in progress
+        pending = dict()
+
+        def collect(futures):
+            for future in futures:
+                nodes, size = pending.pop(future)
+                if future.exception() is None:
+                    stats["nodes"] += nodes
+                    stats["chunks"] += 1
+                    stats["bytes"] += size
+                else:
+                    logging.error('Could not import a chunk of {0} nodes into Deep Lynx: {1}'.format(
+                        nodes, future.exception()))
+                    stats["failed_chunks"] += 1
+                    stats["failed_nodes"] += nodes
+
+        with ThreadPoolExecutor(max_workers=self.in_flight, thread_name_prefix="bulk_import") as executor:
+            for chunk, size in self.chunks(records):
+                # The chunks are read from the records only as fast as Deep Lynx imports them
+                if len(pending) >= self.in_flight:
+                    collect(wait(pending, return_when=FIRST_COMPLETED).done)
+                pending[executor.submit(self._send, chunk)] = (len(chunk), size)
+            collect(wait(pending).done)
+
+        stats["seconds"] = time.monotonic() - start
+        stats["nodes_per_second"] = stats["nodes"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+        stats["bytes_per_second"] = stats["bytes"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+        logging.info('Imported {0} nodes in {1} chunks ({2} failed) in {3:.2f} seconds: {4:.0f} nodes/s, '
+                     '{5:.2f} MB/s'.format(stats["nodes"], stats["chunks"], stats["failed_chunks"], stats["seconds"],
+                                           stats["nodes_per_second"], stats["bytes_per_second"] / 1e6))
+        return stats
+
+    def _send(self, chunk: list):
+        """ Sends a chunk as a manual import, retrying it after a failure """
+        attempt = 0
+        while True:
+            try:
+                return self.client.call(self.client.data_sources.create_manual_import,
+                                        body=chunk,
+                                        container_id=self.container_id,
+                                        data_source_id=self.data_source_id,
+                                        idempotent=False)
+            except Exception:
+                if attempt >= self.retries:
+                    raise
+            wait_seconds = self.backoff * 2**attempt * random.uniform(0.5, 1.5)
+            attempt += 1
+            logging.warning('Manual import of {0} nodes failed. Retry {1} of {2} in {3:.2f} seconds'.format(
+                len(chunk), attempt, self.retries, wait_seconds))
+            time.sleep(wait_seconds)
+
+
+def read_records(data_file: str, chunk_rows: int = 10000):
+    """
+    Streams the rows of a result file as nodes
+
+    The rows of .csv and .jsonl files are streamed. A .json file is parsed whole by json.load, so high-volume results
+    should be written as .csv or .jsonl files
+
+    Args
+        data_file (string): a .csv file, a .json file of a list of objects, or a .jsonl file of an object per line
+        chunk_rows (integer): the number of rows of a .csv file read at once
+    Return
+        records (iterator): a dictionary of the properties of every row. Missing values are None
+    """
+    extension = os.path.splitext(data_file)[1].lower()
+    if extension == ".json":
+        # A JSON document cannot be parsed in parts, so the whole list is held in memory
+        with open(data_file) as f:
+            data = json.load(f)
+        yield from data if isinstance(data, list) else [data]
+    elif extension == ".jsonl":
+        with open(data_file) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        # The rows are read with the default dtypes, so the values are imported as they are in the file
+        with pd.read_csv(data_file, chunksize=chunk_rows) as reader:
+            for chunk in reader:
+                chunk = chunk.astype(object)
+                yield from chunk.where(chunk.notna(), None).to_dict("records")
+
+
+def get_bulk_importer():
+    """
+    Returns the bulk importer of the data source DATA_SOURCE_ID, sized by the IMPORT_CHUNK_NODES, IMPORT_CHUNK_BYTES,
+    IMPORT_IN_FLIGHT and IMPORT_RETRIES environment variables
+    """
+    global bulk_importer
+    container_id = os.environ["CONTAINER_ID"]
+    data_source_id = os.environ["DATA_SOURCE_ID"]
+    with bulk_importer_lock:
+        ids = (container_id, data_source_id)
+        if bulk_importer is None or (bulk_importer.container_id, bulk_importer.data_source_id) != ids:
+            client = adapter.get_deep_lynx_client()
+            bulk_importer = BulkImporter(client,
+                                         container_id,
+                                         data_source_id,
+                                         max_nodes=int(os.getenv("IMPORT_CHUNK_NODES") or 1000),
+                                         max_bytes=int(os.getenv("IMPORT_CHUNK_BYTES") or 4 * 1024 * 1024),
+                                         in_flight=int(os.getenv("IMPORT_IN_FLIGHT") or 4),
+                                         retries=int(os.getenv("IMPORT_RETRIES") or 3),
+                                         backoff=client.backoff)
+        return bulk_importer
@@ -0,0 +1,234 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+# Python Packages
+import os
+import re
+import time
+import random
+import logging
+import threading
+import urllib3
+import deep_lynx
+
+# Repository Modules
+import utils
+
+# Seconds of every unit of a Deep Lynx token expiry e.g. 12h
+EXPIRY_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# Statuses of a Deep Lynx response after which an idempotent call is retried
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+deep_lynx_client = None
+deep_lynx_client_lock = threading.Lock()
+
+
+class DeepLynxClient():
+    """
+    A single authenticated connection to Deep Lynx shared by every thread of the ML Adapter
+
+        1. Holds one ApiClient whose connection pool keeps up to pool_size connections open for concurrent threads
+        2. Creates every API object e.g. DataSourcesApi once, see api
+        3. Refreshes the bearer token refresh_margin seconds before it expires, and after a 401 Unauthorized response
+        4. Retries idempotent calls after a connection error or a 429 or 5xx response with exponential backoff, see call
+
+    Args
+        host (string): the url of Deep Lynx e.g. DEEP_LYNX_URL
+        api_key (string): the api key of Deep Lynx, or None if Deep Lynx does not authenticate
+        api_secret (string): the api secret of Deep Lynx
+        pool_size (integer): the number of connections kept open to Deep Lynx
+        token_expiry (string): the expiry of the token e.g. 12h
+        retries (integer): the number of times an idempotent call is retried
+        backoff (float): the number of seconds before the first retry, which doubles with every retry
+    """
+
+    def __init__(self,
+                 host: str,
+                 api_key: str = None,
+                 api_secret: str = None,
+                 pool_size: int = 10,
+                 token_expiry: str = "12h",
+                 retries: int = 3,
+                 backoff: float = 0.5):
+        configuration = deep_lynx.configuration.Configuration()
+        configuration.host = host
+        configuration.connection_pool_maxsize = max(1, pool_size)
+        self.api_client = deep_lynx.ApiClient(configuration)
+        self.pool_size = configuration.connection_pool_maxsize
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.token_expiry = token_expiry
+        self.expiry_seconds = parse_expiry(token_expiry)
+        # Refresh at the latest 10 minutes, or a tenth of the expiry, before the token expires
+        self.refresh_margin = min(600, self.expiry_seconds / 10)
+        self.retries = retries
+        self.backoff = backoff
+        self.expires_at = None
+        self._apis = dict()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._refresher = None
+
+    @property
+    def authenticates(self):
+        """ Whether Deep Lynx authenticates with an api key and secret """
+        return bool(self.api_key)
+
+    def api(self, api_class):
+        """
+        Returns the API object of an API class of the deep_lynx package, created once
+
+        Args
+            api_class (class): e.g. deep_lynx.DataSourcesApi
+        """
+        with self._lock:
+            if api_class not in self._apis:
+                self._apis[api_class] = api_class(self.api_client)
+            return self._apis[api_class]
+
+    @property
+    def data_sources(self):
+        return self.api(deep_lynx.DataSourcesApi)
+
+    @property
+    def metatypes(self):
+        return self.api(deep_lynx.MetatypesApi)
+
+    @property
+    def metatype_keys(self):
+        return self.api(deep_lynx.MetatypeKeysApi)
+
+    @property
+    def events(self):
+        return self.api(deep_lynx.EventsApi)
+
+    @property
+    def containers(self):
+        return self.api(deep_lynx.ContainersApi)
+
+    def authenticate(self):
+        """
+        Retrieves a bearer token and starts the thread that refreshes it before it expires
+
+        Raises
+            TypeError, ApiException, HTTPError: Deep Lynx cannot be reached or rejected the api key and secret
+        """
+        if not self.authenticates:
+            return
+        self.refresh_token()
+        if self._refresher is None:
+            self._refresher = threading.Thread(target=self._refresh, daemon=True, name="deep_lynx_token")
+            self._refresher.start()
+
+    def refresh_token(self):
+        """ Retrieves a new bearer token and sets the Authorization header of every API object """
+        auth_api = self.api(deep_lynx.AuthenticationApi)
+        token = auth_api.retrieve_o_auth_token(x_api_key=self.api_key,
+                                               x_api_secret=self.api_secret,
+                                               x_api_expiry=self.token_expiry)
+        with self._lock:
+            self.api_client.set_default_header('Authorization', 'Bearer {}'.format(token))
+            self.expires_at = time.time() + self.expiry_seconds
+        logging.info('Refreshed the Deep Lynx token')
+
+    def call(self, function, *args, idempotent: bool = True, **kwargs):
+        """
+        Calls a method of an API object
+
+        A call is retried once with a new token after a 401 Unauthorized response. An idempotent call is also retried
+        after a connection error or a 429 or 5xx response, waiting backoff, 2 * backoff, ... seconds with jitter.
+
+        Args
+            function (method): the method of an API object e.g. client.data_sources.retrieve_file
+            args: the arguments of the method
+            idempotent (boolean): whether the call can be repeated without side effects e.g. False for an upload
+            kwargs: the keyword arguments of the method
+        Return
+            response: the response of the method
+        """
+        # The duration of the call, with its retries, is observed by operation e.g. retrieve_file
+        operation = getattr(function, '__name__', str(function))
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = self._call(function, *args, idempotent=idempotent, **kwargs)
+            outcome = "ok"
+            return response
+        finally:
+            utils.get_metrics_registry()["deep_lynx_seconds"].observe(time.perf_counter() - start,
+                                                                      operation=operation,
+                                                                      outcome=outcome)
+
+    def _call(self, function, *args, idempotent: bool = True, **kwargs):
+        """ Calls a method of an API object with the retries of call """
+        attempt = 0
+        reauthenticated = False
+        while True:
+            try:
+                return function(*args, **kwargs)
+            except deep_lynx.rest.ApiException as error:
+                if error.status == 401 and self.authenticates and not reauthenticated:
+                    logging.warning('Deep Lynx rejected the token. Refreshing the token')
+                    self.refresh_token()
+                    reauthenticated = True
+                    continue
+                if not idempotent or error.status not in RETRY_STATUSES or attempt >= self.retries:
+                    raise
+            except urllib3.exceptions.HTTPError:
+                if not idempotent or attempt >= self.retries:
+                    raise
+            wait = self.backoff * 2**attempt * random.uniform(0.5, 1.5)
+            attempt += 1
+            logging.warning('Deep Lynx call {0} failed. Retry {1} of {2} in {3:.2f} seconds'.format(
+                getattr(function, '__name__', function), attempt, self.retries, wait))
+            time.sleep(wait)
+
+    def stop(self):
+        """ Stops the thread that refreshes the token """
+        self._stopped.set()
+
+    def _refresh(self):
+        """ Refreshes the token refresh_margin seconds before it expires, retrying every backoff seconds on failure """
+        while True:
+            with self._lock:
+                refresh_in = max(0, self.expires_at - self.refresh_margin - time.time())
+            if self._stopped.wait(refresh_in):
+                return
+            try:
+                self.refresh_token()
+            except Exception:
+                logging.exception('Could not refresh the Deep Lynx token')
+                if self._stopped.wait(max(1, self.backoff)):
+                    return
+
+
+def parse_expiry(expiry: str):
+    """
+    Returns the number of seconds of a Deep Lynx token expiry e.g. 12h, 30m, 3600
+
+    Args
+        expiry (string): a number followed by s, m, h or d, or a number of seconds
+    """
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*', str(expiry))
+    if match is None:
+        error = "invalid token expiry {0}".format(expiry)
+        raise ValueError(error)
+    return float(match.group(1)) * EXPIRY_UNITS.get(match.group(2) or "s")
+
+
+def get_deep_lynx_client():
+    """
+    Returns the Deep Lynx client of the process for the DEEP_LYNX_URL, DEEP_LYNX_API_KEY, DEEP_LYNX_API_SECRET,
+    DEEP_LYNX_POOL_SIZE, DEEP_LYNX_TOKEN_EXPIRY, DEEP_LYNX_RETRIES and DEEP_LYNX_BACKOFF_SECONDS environment variables
+    """
+    global deep_lynx_client
+    with deep_lynx_client_lock:
+        if deep_lynx_client is None:
+            deep_lynx_client = DeepLynxClient(os.getenv("DEEP_LYNX_URL"),
+                                              api_key=os.getenv("DEEP_LYNX_API_KEY") or None,
+                                              api_secret=os.getenv("DEEP_LYNX_API_SECRET"),
+                                              pool_size=int(os.getenv("DEEP_LYNX_POOL_SIZE") or 10),
+                                              token_expiry=os.getenv("DEEP_LYNX_TOKEN_EXPIRY") or "12h",
+                                              retries=int(os.getenv("DEEP_LYNX_RETRIES") or 3),
+                                              backoff=float(os.getenv("DEEP_LYNX_BACKOFF_SECONDS") or 0.5))
+        return deep_lynx_client
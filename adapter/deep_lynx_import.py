@@ -9,51 +9,67 @@ import json
 import time
 import adapter
 
+# Repository Modules
+import utils
 
-def import_to_deep_lynx(import_file: str):
+
+def import_to_deep_lynx(import_file: str, timeout: float = None):
     """
-    Import data into Deep Lynx
+    Import data into Deep Lynx once the import file is written
     Args
         import_file (string): the file path to import into Deep Lynx
+        timeout (float): the number of seconds to wait for the import file to be written, e.g. 0 for a file returned by
+            the model scheduler, which exists. Defaults to IMPORT_FILE_TIMEOUT_SECONDS
+    Return
+        did_succeed (boolean): whether the import file was found and uploaded
     """
     # Get deep lynx environment variables
-    api_client = adapter.api_client
     container_id = os.environ["CONTAINER_ID"]
     data_source_id = os.environ["DATA_SOURCE_ID"]
 
-    done = False
-    did_succeed = False
-    start = time.time()
-    path = os.path.join(os.getcwd() + '/' + import_file)
-    while not done:
-        # Check if import file exists
-        if os.path.exists(path):
-            logging.info(f'Found {import_file}.')
-            # Import data into Deep Lynx
-            data_sources_api = deep_lynx.DataSourcesApi(api_client)
-            info = upload_file(data_sources_api, import_file)
-            logging.info('Success: Run complete. Output data sent.')
-            done = True
-            did_succeed = True
-            break
-        else:
-            logging.info(
-                f'Fail: {import_file} not found. Trying again in {os.getenv("IMPORT_FILE_WAIT_SECONDS")} seconds')
-            end = time.time()
-            # Break out of infinite loop
-            if end - start > float(os.getenv("IMPORT_FILE_WAIT_SECONDS")) * 20:
-                logging.info(f'Fail: In the final attempt, {import_file} was not found.')
-                done = True
-                break
-            # Sleep for wait seconds
+    if timeout is None:
+        timeout = import_file_timeout()
+    path = os.path.abspath(import_file)
+    # The import file is found the moment it is closed, instead of polling every IMPORT_FILE_WAIT_SECONDS seconds
+    if not utils.wait_for_file(path, timeout):
+        logging.info(f'Fail: {import_file} was not found within {timeout} seconds.')
+        utils.get_metrics_registry()["imports_total"].inc(outcome="not_found")
+        return False
+
+    logging.info(f'Found {import_file}.')
+    # Import data into Deep Lynx
+    mode = os.getenv("IMPORT_MODE", "upload")
+    metrics = utils.get_metrics_registry()
+    try:
+        with metrics["import_seconds"].time(mode=mode):
+            if mode == "manual":
+                # The rows of the import file are streamed into concurrent manual imports of bounded chunks
+                stats = adapter.get_bulk_importer().import_records(adapter.read_records(path))
+                did_succeed = stats["failed_chunks"] == 0
+                if not did_succeed:
+                    logging.error(f'Fail: {stats["failed_nodes"]} nodes of {import_file} were not imported.')
             else:
-                logging.info(
-                    f'Fail: {import_file} was not found. Trying again in {os.getenv("IMPORT_FILE_WAIT_SECONDS")} seconds'
-                )
-                time.sleep(int(os.getenv("IMPORT_FILE_WAIT_SECONDS")))
+                data_sources_api = adapter.get_deep_lynx_client().data_sources
+                info = upload_file(data_sources_api, import_file)
+                did_succeed = True
+    except Exception:
+        metrics["imports_total"].inc(outcome="error")
+        raise
+    metrics["imports_total"].inc(outcome="ok" if did_succeed else "error")
     if did_succeed:
-        return True
-    return False
+        logging.info('Success: Run complete. Output data sent.')
+    return did_succeed
+
+
+def import_file_timeout():
+    """
+    Returns the number of seconds to wait for an import file: IMPORT_FILE_TIMEOUT_SECONDS, or 20 times
+    IMPORT_FILE_WAIT_SECONDS as before import files were watched
+    """
+    timeout = os.getenv("IMPORT_FILE_TIMEOUT_SECONDS")
+    if timeout:
+        return float(timeout)
+    return float(os.getenv("IMPORT_FILE_WAIT_SECONDS") or 30) * 20
 
 
 def upload_file(data_sources_api: deep_lynx.DataSourcesApi, file_path: str):
@@ -64,47 +80,53 @@ def upload_file(data_sources_api: deep_lynx.DataSourcesApi, file_path: str):
         file_path (string): the file path to import into Deep Lynx
     """
     # Get deep lynx environment variables
-    api_client = adapter.api_client
     container_id = os.environ["CONTAINER_ID"]
     data_source_id = os.environ["DATA_SOURCE_ID"]
 
-    file_return = data_sources_api.upload_file(container_id,
-                                               data_source_id,
-                                               file=file_path,
-                                               metadata=os.getenv("METADATA"),
-                                               async_req=False)
-    print(file_return)
+    # An upload is not retried after a failure, since Deep Lynx may have stored the file
+    file_return = adapter.get_deep_lynx_client().call(data_sources_api.upload_file,
+                                                      container_id,
+                                                      data_source_id,
+                                                      file=file_path,
+                                                      metadata=os.getenv("METADATA"),
+                                                      async_req=False,
+                                                      idempotent=False)
+    logging.debug('Upload response: {0}'.format(file_return))
     if len(file_return["value"]) > 0:
         logging.info("Successfully imported data to deep lynx")
-        print("Successfully imported data to deep lynx")
     else:
         logging.error("Could not import data into Deep Lynx. Check log file for more information")
-        print("Could not import data into Deep Lynx. Check log file for more information")
     return file_return
 
 
 def create_manual_import(data_sources_api: deep_lynx.DataSourcesApi = None, payload: list = None):
     """
-    Creates a manual import of the payload to insert into Deep Lynx
+    Creates a manual import of the payload to insert into Deep Lynx in a single request. Large payloads are imported in
+    concurrent chunks with adapter.get_bulk_importer().import_records(payload)
     Args
         data_sources_api (deep_lynx.DataSourcesApi): deep lynx data source api
         payload (list): a list of payloads to import into deep lynx
     """
     # Get deep lynx environment variables
-    api_client = adapter.api_client
     container_id = os.environ["CONTAINER_ID"]
     data_source_id = os.environ["DATA_SOURCE_ID"]
 
     if data_sources_api and payload:
-        return data_sources_api.create_manual_import(body=payload,
-                                                     container_id=container_id,
-                                                     data_source_id=data_source_id)
+        return adapter.get_deep_lynx_client().call(data_sources_api.create_manual_import,
+                                                   body=payload,
+                                                   container_id=container_id,
+                                                   data_source_id=data_source_id,
+                                                   idempotent=False)
 
 
 def generate_payload(data_file):
     """
-    Generate a list of payloads to import into deep lynx
-    
+    Generate a list of payloads to import into deep lynx. A customization point of the developer, which returns an
+    empty payload until it is customized
+
+    The result files of the ML Adapter objects do not go through this function: with IMPORT_MODE=manual,
+    import_to_deep_lynx streams the rows of a result file with read_records into get_bulk_importer().import_records
+
     Args
         data_file (string): location of file to read
     Return
@@ -124,23 +146,8 @@ def validate_payload(payload: dict):
     Return
         is_valid (boolean): whether the payload is valid or not
     """
-    # Get deep lynx environment variables
-    api_client = adapter.api_client
-    container_id = os.environ["CONTAINER_ID"]
-    data_source_id = os.environ["DATA_SOURCE_ID"]
-
-    # Create deep lynx validator object
-    metatypes_api = deep_lynx.MetatypesApi(api_client)
-    is_valid = True
-    for metatype, nodes in payload.items():
-        for node in nodes:
-            # For each node, validate the its properies
-            # assumes the first return is the desired metatype
-            metatype_id = metatypes_api.list_metatypes(container_id, name=metatype)[0].id
-            json_error = metatypes_api.validate_metatype_properties(container_id, metatype_id, node)
-            json_error = json.loads(json_error)
-            if json_error["isError"]:
-                for error in json_error["error"]:
-                    logging.error(error)
-                    is_valid = False
-    return is_valid
+    # The nodes are validated against the cached keys of their metatype, and by Deep Lynx only when needed
+    errors = adapter.get_metatype_cache().validate(payload)
+    for error in errors:
+        logging.error(error)
+    return not errors
@@ -1,36 +1,179 @@
 # Copyright 2021, Battelle Energy Alliance, LLC
 
 # Python Packages
+import io
 import os
+import logging
 import pandas as pd
+import urllib3
 import deep_lynx
 import adapter
-import pandas as pd
 
 # Repository Modules
+import utils
 import settings
 
+# Number of bytes read at once from the end of a file when only its last rows are read
+TAIL_BLOCK_BYTES = 1 << 20
+
 
 def query_deep_lynx(file_id: str):
     """
     Retrieve data from Deep Lynx
     Args
         file_id (string): the id of a file stored in Deep Lynx
+    Return
+        future (Future): resolved once the data is committed to the queue, or None if the data was queued directly
     """
     # Get deep lynx environment variables
-    api_client = adapter.api_client
     container_id = os.environ["CONTAINER_ID"]
     data_source_id = os.environ["DATA_SOURCE_ID"]
 
-    # Retrieve file from Deep Lynx
-    data_sources_api = deep_lynx.DataSourcesApi(api_client)
-    dl_file_path = retrieve_file(data_sources_api, file_id)
-
-    # Write csv to local repository
-    query_df = pd.read_csv(dl_file_path)
+    with utils.get_metrics_registry()["ingest_seconds"].time():
+        # Retrieve file from Deep Lynx with the API object shared by every thread
+        data_sources_api = adapter.get_deep_lynx_client().data_sources
+        file_info = retrieve_file_info(data_sources_api, file_id)
+        if file_info is None:
+            error = 'Could not retrieve file {0} from Deep Lynx'.format(file_id)
+            logging.error(error)
+            raise FileNotFoundError(error)
+        dl_file_path = file_info["adapter_file_path"] + file_info["file_name"]
+
+        # Read the rows of the file that fit in the queue window with the schema registry of the queue window, if any
+        query_df = read_file(data_sources_api, file_id, dl_file_path)
+
+    # Stage the data so bursts of files are committed to the queue together
+    if adapter.batcher is not None:
+        return adapter.batcher.add(query_df, file_info.get("created_at"))
     queue(query_df)
 
 
+def read_file(data_sources_api: deep_lynx.DataSourcesApi, file_id: str, file_path: str):
+    """
+    Reads the last rows of a file that fit in the queue window, so that a file larger than the queue window is never
+    read into memory. Rows before the last QUEUE_LENGTH rows of a file would be evicted by the rows after them
+
+        1. A file on the file system of the adapter is read backwards from its end until QUEUE_LENGTH rows are found,
+           see tail_csv
+        2. A file that is not on the file system of the adapter, e.g. when Deep Lynx runs on another host, is streamed
+           from Deep Lynx in chunks of INGEST_CHUNK_ROWS rows, of which the last QUEUE_LENGTH rows are kept
+
+    Args
+        data_sources_api (deep_lynx.DataSourcesApi): deep lynx data source api
+        file_id (string): the id of the file
+        file_path (string): the path of the file on the file system of Deep Lynx
+    Return
+        query_df (DataFrame): the last QUEUE_LENGTH rows of the file
+    """
+    capacity = adapter.window.capacity if adapter.window is not None else int(os.getenv("QUEUE_LENGTH"))
+    chunk_rows = int(os.getenv("INGEST_CHUNK_ROWS") or 100000)
+
+    if os.path.isfile(file_path):
+        header, rows = tail_csv(file_path, capacity)
+        if rows is not None:
+            return utils.read_csv(io.BytesIO(header + rows))
+        # Quoted values may span lines, so the rows cannot be found from the end of the file
+        return tail_chunks(utils.read_csv_chunks(file_path, chunk_rows), capacity)
+
+    response = stream_file(data_sources_api, file_id)
+    if response is None:
+        error = 'Could not download file {0} from Deep Lynx'.format(file_id)
+        logging.error(error)
+        raise FileNotFoundError(error)
+    try:
+        return tail_chunks(utils.read_csv_chunks(response, chunk_rows), capacity)
+    finally:
+        response.release_conn()
+
+
+def tail_csv(file_path: str, rows: int, block_size: int = TAIL_BLOCK_BYTES):
+    """
+    Reads the header and the last rows of a .csv file without reading the rest of the file
+
+    Args
+        file_path (string): the .csv file
+        rows (integer): the number of rows to read
+        block_size (integer): the number of bytes read at once from the end of the file
+    Return
+        header (bytes): the first line of the file
+        rows (bytes): the last rows of the file, or None if they have quoted values, which may span lines
+    """
+    with open(file_path, 'rb') as fp:
+        header = fp.readline()
+        start = fp.tell()
+        position = fp.seek(0, os.SEEK_END)
+        blocks = list()
+        # The newlines of the blocks, where the newlines of trailing blank lines are not counted because they are not
+        # rows. The partial first line of the blocks is not a row, so one more newline than rows is needed
+        lines = 0
+        blank = True
+        while position > start and lines <= rows:
+            size = min(block_size, position - start)
+            position -= size
+            fp.seek(position)
+            blocks.insert(0, fp.read(size))
+            if blank:
+                # Every block after this block only holds trailing newlines
+                block = blocks[0].rstrip(b'\r\n')
+                blank = not block
+                lines += block.count(b'\n')
+            else:
+                lines += blocks[0].count(b'\n')
+
+    data = b''.join(blocks).rstrip(b'\r\n')
+    if b'"' in data:
+        return header, None
+    data_lines = data.split(b'\n')
+    if position > start:
+        # The first line of the blocks starts before the blocks
+        data_lines = data_lines[1:]
+    data = b'\n'.join(data_lines[-rows:] if rows > 0 else list())
+    return header, data + b'\n'
+
+
+def tail_chunks(chunks, rows: int):
+    """
+    Returns the last rows of the chunks of a file, holding at most rows rows and a chunk in memory
+
+    Args
+        chunks (iterator): the DataFrame of every chunk of the file
+        rows (integer): the number of rows to keep
+    Return
+        query_df (DataFrame): the last rows of the file
+    """
+    kept = list()
+    size = 0
+    for chunk in chunks:
+        kept.append(chunk)
+        size += chunk.shape[0]
+        while size - kept[0].shape[0] >= rows:
+            size -= kept.pop(0).shape[0]
+    if not kept:
+        return pd.DataFrame()
+    query_df = pd.concat(kept, ignore_index=True) if len(kept) > 1 else kept[0]
+    return query_df.iloc[-rows:].reset_index(drop=True)
+
+
+def stream_file(data_sources_api: deep_lynx.DataSourcesApi, file_id: str):
+    """
+    Downloads a file from Deep Lynx as a stream, which is read without holding the file in memory
+    Args
+        data_sources_api (deep_lynx.DataSourcesApi): deep lynx data source api
+        file_id (string): the id of a file
+    Return
+        response (HTTPResponse): the response to read the file from, or None if an error occurred
+    """
+    container_id = os.environ["CONTAINER_ID"]
+    try:
+        return adapter.get_deep_lynx_client().call(data_sources_api.download_file,
+                                                   container_id,
+                                                   file_id,
+                                                   _preload_content=False)
+    except (deep_lynx.rest.ApiException, urllib3.exceptions.HTTPError):
+        logging.exception('Could not download file {0} from Deep Lynx'.format(file_id))
+        return None
+
+
 def download_file(dl_service: deep_lynx.DataSourcesApi, file_id: str):
     """
     Downloads a file from Deep Lynx
@@ -39,11 +182,10 @@ def download_file(dl_service: deep_lynx.DataSourcesApi, file_id: str):
         file_id (string): the id of a file
     """
     # Get deep lynx environment variables
-    api_client = adapter.api_client
     container_id = os.environ["CONTAINER_ID"]
     data_source_id = os.environ["DATA_SOURCE_ID"]
 
-    download_file = dl_service.download_file(container_id, file_id)
+    download_file = adapter.get_deep_lynx_client().call(dl_service.download_file, container_id, file_id)
 
     if not download_file.is_error:
         return download_file
@@ -57,39 +199,40 @@ def retrieve_file(data_sources_api: deep_lynx.DataSourcesApi, file_id: str):
         file_id (string): the id of a file
         container_id (str): deep lynx container id
     """
+    retrieve_file = retrieve_file_info(data_sources_api, file_id)
+    if retrieve_file is not None:
+        path = retrieve_file["adapter_file_path"] + retrieve_file["file_name"]
+        return path
+
+
+def retrieve_file_info(data_sources_api: deep_lynx.DataSourcesApi, file_id: str):
+    """
+    Retrieve the information of a file from Deep Lynx e.g. file_name, adapter_file_path, created_at
+    Args
+        data_sources_api (deep_lynx.DataSourcesApi): deep lynx data source api
+        file_id (string): the id of a file
+    Return
+        file_info (dictionary): the information of the file, or None if an error occurred
+    """
     # Get deep lynx environment variables
-    api_client = adapter.api_client
     container_id = os.environ["CONTAINER_ID"]
-    data_source_id = os.environ["DATA_SOURCE_ID"]
 
-    retrieve_file = data_sources_api.retrieve_file(container_id, file_id)
+    retrieve_file = adapter.get_deep_lynx_client().call(data_sources_api.retrieve_file, container_id, file_id)
 
     if not retrieve_file.is_error:
-        retrieve_file = retrieve_file.to_dict()["value"]
-        path = retrieve_file["adapter_file_path"] + retrieve_file["file_name"]
-        return path
+        return retrieve_file.to_dict()["value"]
 
 
 def queue(query_df: pd.DataFrame or pd.Series):
     """
-    Maintains a queue file of a given length via the First In First Out (FIFO) data structure
+    Maintains a queue of a given length via the First In First Out (FIFO) data structure
     Args
         query_df (DataFrame or Series): data to add to the queue
     """
-    # Applies a lock for threading
-    with adapter.lock_:
-        if os.path.exists(os.getenv("QUEUE_FILE_NAME")):
-            # Read master queue file
-            queue_df = pd.read_csv(os.getenv("QUEUE_FILE_NAME"))
-            # Append query file to queue
-            queue_df = queue_df.append(query_df, ignore_index=True)
-        else:
-            # If queue file does not exist
-            queue_df = query_df
-        new_queue_length = queue_df.shape[0]
-        # Keep queue at given length
-        if new_queue_length > int(os.getenv("QUEUE_LENGTH")):
-            subtract_length = new_queue_length - int(os.getenv("QUEUE_LENGTH"))
-            queue_df.drop([i for i in range(subtract_length)], axis=0, inplace=True)
-        # Write queue to csv
-        queue_df.to_csv(os.getenv("QUEUE_FILE_NAME"), index=False)
+    # The window is an in-memory ring buffer that persists each append to a segment log
+    # Appending through the scheduler wakes up the machine learning thread
+    metrics = utils.get_metrics_registry()
+    with metrics["queue_append_seconds"].time():
+        adapter.scheduler.append(query_df)
+    if adapter.window is not None:
+        metrics["window_rows"].set(len(adapter.window))
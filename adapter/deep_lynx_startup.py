@@ -0,0 +1,240 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+# Python Packages
+import os
+import json
+import time
+import logging
+import threading
+import urllib3
+import deep_lynx
+import adapter
+
+
+class Startup():
+    """
+    Initializes the ML Adapter in a background thread, so that the HTTP server accepts requests at once
+
+        1. Connects to Deep Lynx and finds the container and data source, see deep_lynx_init. A Deep Lynx that cannot be
+           reached is tried again every REGISTER_WAIT_SECONDS seconds
+        2. Runs initialize, e.g. creating the queue window and starting the machine learning thread
+        3. Registers for the events of the DATA_SOURCES data sources, see register_for_event
+
+    The ML Adapter is ready once steps 1 and 2 are done, see status. Registration may keep waiting for data sources that
+    are not created yet.
+
+    Args
+        initialize (function): called with the api client once Deep Lynx is initialized
+        iterations (integer): the number of attempts to initialize Deep Lynx and to register for events
+    """
+
+    def __init__(self, initialize, iterations: int = 30):
+        self.initialize = initialize
+        self.iterations = iterations
+        self.stage = "starting"
+        self.registered = None
+        self.error = None
+        self.started = time.monotonic()
+        # The number of seconds after the start at which every stage ended
+        self.stages = dict()
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="startup")
+
+    @property
+    def ready(self):
+        """ Whether Deep Lynx is initialized and the ML Adapter accepts events """
+        return self._ready.is_set()
+
+    def start(self):
+        """ Starts the background initialization """
+        self._thread.start()
+        return self
+
+    def wait(self, timeout: float = None):
+        """ Waits until the ML Adapter is ready, and returns whether it is ready """
+        return self._ready.wait(timeout)
+
+    def status(self):
+        """
+        Returns the state of the initialization
+
+        Return
+            status (dictionary): whether the ML Adapter is ready, the current stage (deep_lynx, initialize, register,
+                done or failed), whether the event registration succeeded, the error of a failed initialization, the
+                seconds since the start and the seconds after the start at which every stage ended
+        """
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "stage": self.stage,
+                "registered": self.registered,
+                "error": self.error,
+                "uptime_seconds": time.monotonic() - self.started,
+                "stages": dict(self.stages)
+            }
+
+    def _set_stage(self, stage: str):
+        with self._lock:
+            self.stages[self.stage] = time.monotonic() - self.started
+            self.stage = stage
+        logging.info('Startup stage: ' + stage)
+
+    def _connect(self):
+        """ Initializes Deep Lynx, see deep_lynx_init. Returns empty ids if Deep Lynx cannot be reached """
+        try:
+            return deep_lynx_init()
+        except (deep_lynx.rest.ApiException, urllib3.exceptions.HTTPError) as error:
+            logging.error('Cannot connect to DeepLynx: {0}'.format(error))
+            return '', '', None
+
+    def _run(self):
+        try:
+            self._set_stage("deep_lynx")
+            iterations = self.iterations
+            container_id, data_source_id, api_client = self._connect()
+            while not (container_id and data_source_id):
+                iterations -= 1
+                if iterations <= 0:
+                    error = "cannot connect to Deep Lynx or find container {0}".format(os.getenv('CONTAINER_NAME'))
+                    raise RuntimeError(error)
+                time.sleep(float(os.getenv('REGISTER_WAIT_SECONDS') or 30))
+                container_id, data_source_id, api_client = self._connect()
+            os.environ["CONTAINER_ID"] = container_id
+            os.environ["DATA_SOURCE_ID"] = data_source_id
+
+            self._set_stage("initialize")
+            self.initialize(api_client)
+            self._ready.set()
+
+            self._set_stage("register")
+            registered = register_for_event(api_client, self.iterations)
+            with self._lock:
+                self.registered = registered
+            self._set_stage("done")
+        except Exception as error:
+            logging.exception('Could not initialize the ML Adapter')
+            with self._lock:
+                self.error = str(error)
+            self._set_stage("failed")
+
+
+def event_action_key(action):
+    """ Returns the destination, event type and data source of an event action, which identify a registration """
+    return (action.destination, action.event_type, action.data_source_id)
+
+
+def register_for_event(api_client: deep_lynx.ApiClient = None, iterations=30):
+    """
+    Register with Deep Lynx to receive data_ingested events on applicable data sources
+
+    Args
+        api_client (deep_lynx.ApiClient): deep lynx api client
+        iterations (integer): the number of interations to try registering for events
+    Return
+        registered (boolean): whether events are registered on every data source
+    """
+    # List of adapters to receive events from
+    data_ingested_adapters = json.loads(os.getenv("DATA_SOURCES"))
+    destination = "http://" + os.getenv('FLASK_RUN_HOST') + ":" + os.getenv('FLASK_RUN_PORT') + "/machinelearning"
+    client = adapter.get_deep_lynx_client()
+
+    # Register events for listening from other data sources
+    while iterations > 0:
+        # Get a list of data sources and validate that no error occurred
+        data_sources = client.call(client.data_sources.list_data_sources, os.getenv("CONTAINER_ID"))
+        if data_sources.is_error == False:
+            matches = [data_source for data_source in data_sources.value if data_source.name in data_ingested_adapters]
+        else:
+            matches = list()
+
+        if matches:
+            # The event actions are listed once per attempt, and indexed by destination, event type and data source
+            events_api = client.events
+            actions = client.call(events_api.list_event_actions)
+            existing = set(event_action_key(action) for action in actions.value or list())
+
+            for data_source in matches:
+                # If the data source is found, create a registered event
+                event_action = deep_lynx.CreateEventActionRequest(data_source.container_id, data_source.id,
+                                                                  "file_created", "send_data", None, destination,
+                                                                  os.getenv("DATA_SOURCE_ID"), True)
+                if event_action_key(event_action) in existing:
+                    # this exact event action already exists, remove data source from list
+                    logging.info('Event action on ' + data_source.name + ' already exists')
+                    data_ingested_adapters.remove(data_source.name)
+                    continue
+
+                create_action_result = client.call(events_api.create_event_action, event_action, idempotent=False)
+                if create_action_result.is_error:
+                    logging.warning('Error creating event action: ' + str(create_action_result.error))
+                else:
+                    logging.info('Successful creation of event action on ' + data_source.name + ' datasource')
+                    existing.add(event_action_key(event_action))
+                    data_ingested_adapters.remove(data_source.name)
+
+        # If all events are registered
+        if len(data_ingested_adapters) == 0:
+            logging.info('Successful registration on all adapters')
+            return True
+
+        # If the desired data source and container is not found, repeat
+        logging.info(
+            f'Datasource(s) {", ".join(data_ingested_adapters)} not found. Next event registration attempt in {os.getenv("REGISTER_WAIT_SECONDS")} seconds.'
+        )
+        time.sleep(float(os.getenv('REGISTER_WAIT_SECONDS')))
+        iterations -= 1
+
+    return False
+
+
+def deep_lynx_init():
+    """
+    Returns the container id, data source id, and api client for use with the DeepLynx SDK.
+    Assumes token authentication.
+
+    Args
+        None
+    Return
+        container_id (str), data_source_id (str), api_client (ApiClient)
+    """
+    # The client shared by every thread, which refreshes its token before it expires
+    client = adapter.get_deep_lynx_client()
+    api_client = client.api_client
+
+    # perform API token authentication only if values are provided
+    try:
+        client.authenticate()
+    except (TypeError, deep_lynx.rest.ApiException, urllib3.exceptions.HTTPError):
+        print("ERROR: Cannot connect to DeepLynx.")
+        logging.error("Cannot connect to DeepLynx.")
+        return '', '', None
+
+    # get container ID
+    container_id = None
+    containers = client.call(client.containers.list_containers)
+    for container in containers.value:
+        if container.name == os.getenv('CONTAINER_NAME'):
+            container_id = container.id
+            continue
+
+    if container_id is None:
+        print('Container not found')
+        return None, None, None
+
+    # get data source ID, create if necessary
+    data_source_id = None
+    datasources_api = client.data_sources
+
+    datasources = client.call(datasources_api.list_data_sources, container_id)
+    for datasource in datasources.value:
+        if datasource.name == os.getenv('DATA_SOURCE_NAME'):
+            data_source_id = datasource.id
+    if data_source_id is None:
+        datasource = client.call(datasources_api.create_data_source,
+                                 deep_lynx.CreateDataSourceRequest(os.getenv('DATA_SOURCE_NAME'), 'standard', True),
+                                 container_id,
+                                 idempotent=False)
+        data_source_id = datasource.value.id
+
+    return container_id, data_source_id, api_client
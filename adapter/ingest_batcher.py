@@ -0,0 +1,116 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+# Python Packages
+import time
+import logging
+import threading
+from concurrent.futures import Future
+import pandas as pd
+
+
+class IngestBatcher():
+    """
+    Coalesces the files retrieved for bursts of file_created events into a single commit to the queue
+
+        1. Stages the data of each retrieved file
+        2. Flushes once max_files files are staged or the oldest staged file waited max_wait seconds
+        3. Orders the staged files by their Deep Lynx timestamp and concatenates them once
+        4. Commits the concatenated data to the queue in a single operation
+
+    Args
+        commit (function): receives the concatenated DataFrame of a batch e.g. deep_lynx_query.queue
+        max_files (integer): the number of staged files that triggers a flush
+        max_wait (float): the number of seconds a staged file waits before a flush is triggered
+    """
+
+    def __init__(self, commit, max_files: int = 100, max_wait: float = 0.05):
+        self.commit = commit
+        self.max_files = max(1, max_files)
+        self.max_wait = max_wait
+        self._condition = threading.Condition()
+        self._staged = list()
+        self._sequence = 0
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True, name="ingest_batcher")
+        self._thread.start()
+
+    def add(self, query_df: pd.DataFrame, timestamp: str = None):
+        """
+        Stages the data of a retrieved file
+
+        Args
+            query_df (DataFrame): the data of the file
+            timestamp (string): the Deep Lynx creation time of the file, used to order the files of a batch
+        Return
+            future (Future): resolved with the number of rows in the batch once the batch is committed to the queue
+        """
+        future = Future()
+        with self._condition:
+            if self._stopped:
+                future.set_exception(RuntimeError("Ingest batcher is stopped"))
+                return future
+            self._sequence += 1
+            self._staged.append((_parse_timestamp(timestamp), self._sequence, time.monotonic(), query_df, future))
+            self._condition.notify_all()
+        return future
+
+    def stop(self):
+        """ Commits the staged files and stops the flush thread """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    flush_in = self._flush_in()
+                    if flush_in == 0:
+                        break
+                    self._condition.wait(flush_in)
+                batch = self._staged
+                self._staged = list()
+                stopped = self._stopped
+            if batch:
+                self._flush(batch)
+            if stopped:
+                return
+
+    def _flush_in(self):
+        """
+        Returns the number of seconds until the next flush, 0 to flush now, or None to wait for a file.
+        The caller must hold the condition
+        """
+        if not self._staged:
+            return None
+        if len(self._staged) >= self.max_files:
+            return 0
+        waited = time.monotonic() - self._staged[0][2]
+        return max(0, self.max_wait - waited)
+
+    def _flush(self, batch: list):
+        # Order by Deep Lynx timestamp. Files without a timestamp keep their arrival order after the others
+        batch.sort(key=lambda item: (item[0] is None, item[0] or 0, item[1]))
+        try:
+            batch_df = pd.concat([item[3] for item in batch], ignore_index=True)
+            self.commit(batch_df)
+        except Exception as error:
+            logging.exception('Failed to commit a batch of ' + str(len(batch)) + ' files to the queue')
+            for item in batch:
+                item[4].set_exception(error)
+            return
+        logging.info('Committed a batch of ' + str(len(batch)) + ' files and ' + str(batch_df.shape[0]) +
+                     ' rows to the queue')
+        for item in batch:
+            item[4].set_result(batch_df.shape[0])
+
+
+def _parse_timestamp(timestamp: str):
+    """ Converts a Deep Lynx timestamp to a number of nanoseconds since the epoch, or None if it is not valid """
+    if not timestamp:
+        return None
+    parsed = pd.to_datetime(timestamp, utc=True, errors='coerce')
+    if pd.isna(parsed):
+        return None
+    return parsed.value
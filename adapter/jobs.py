@@ -0,0 +1,115 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+# Python Packages
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+
+
+class JobQueue():
+    """
+    A bounded work queue served by a fixed size pool of worker threads
+
+        1. Accepts a job only if fewer than max_pending jobs are queued or running
+        2. Runs the job on one of the worker threads. A job that returns a Future finishes when the Future is resolved
+        3. Keeps the status of the last max_history finished jobs
+
+    Args
+        workers (integer): the number of worker threads
+        max_pending (integer): the maximum number of jobs that are queued or running
+        max_history (integer): the maximum number of finished jobs whose status is kept
+        name (string): the prefix of the worker thread names
+    """
+
+    def __init__(self, workers: int, max_pending: int, max_history: int = 1000, name: str = "job"):
+        self.max_history = max_history
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queues a job without blocking
+
+        Args
+            fn (function): the function to run
+            *args, **kwargs: the arguments passed to the function
+        Return
+            job_id (string): the id of the job, or None if the queue is full
+        """
+        if not self._slots.acquire(blocking=False):
+            return None
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": "queued",
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None
+        }
+        with self._lock:
+            self._jobs[job["id"]] = job
+            self._prune()
+        try:
+            self._executor.submit(self._run, job, fn, args, kwargs)
+        except RuntimeError:
+            # The executor was shut down
+            self._finish(job, "failed", "Job queue is shut down")
+        return job["id"]
+
+    def status(self, job_id: str):
+        """
+        Returns the status of a job
+
+        Args
+            job_id (string): the id of the job
+        Return
+            job (dictionary): a copy of the job status, or None if the job is unknown
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job: dict, fn, args: tuple, kwargs: dict):
+        with self._lock:
+            job["status"] = "running"
+            job["started_at"] = time.time()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as error:
+            logging.exception('Job ' + job["id"] + ' failed')
+            self._finish(job, "failed", str(error))
+            return
+        if isinstance(result, Future):
+            # The job continues outside of the worker thread, e.g. a file staged for a batched commit
+            result.add_done_callback(lambda future: self._finish_future(job, future))
+        else:
+            self._finish(job, "done")
+
+    def _finish_future(self, job: dict, future: Future):
+        error = future.exception()
+        if error is not None:
+            self._finish(job, "failed", str(error))
+        else:
+            self._finish(job, "done")
+
+    def _finish(self, job: dict, status: str, error: str = None):
+        with self._lock:
+            job["status"] = status
+            job["error"] = error
+            job["finished_at"] = time.time()
+        self._slots.release()
+
+    def _prune(self):
+        """ Removes the oldest finished jobs beyond max_history. The caller must hold the lock """
+        finished = [job_id for job_id, job in self._jobs.items() if job["finished_at"] is not None]
+        for job_id in finished[:max(0, len(finished) - self.max_history)]:
+            del self._jobs[job_id]
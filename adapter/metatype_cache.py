@@ -0,0 +1,262 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+# Python Packages
+import os
+import re
+import json
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import adapter
+
+# Data types of Deep Lynx metatype keys that are checked locally
+NUMBER_TYPES = ["number", "number64"]
+FLOAT_TYPES = ["float", "float64"]
+ANY_TYPES = ["file", "unknown"]
+BOOLEAN_STRINGS = ["true", "false"]
+
+metatype_cache = None
+metatype_cache_lock = threading.Lock()
+
+
+class MetatypeSchema():
+    """
+    The id and the keys of a Deep Lynx metatype
+
+    Args
+        name (string): the name of the metatype
+        id (string): the id of the metatype
+        keys (list): the keys of the metatype (deep_lynx.MetatypeKey)
+    """
+
+    def __init__(self, name: str, id: str, keys: list):
+        self.name = name
+        self.id = id
+        self.keys = {key.property_name: key for key in keys or list() if not getattr(key, "archived", False)}
+        self.required = [name for name, key in self.keys.items() if key.required]
+
+    def validate(self, node: dict):
+        """
+        Checks the properties of a node against the keys of the metatype
+
+        Args
+            node (dictionary): the properties of the node
+        Return
+            errors (list): the errors of the node, or None if a property has a data type that is not checked locally
+        """
+        errors = list()
+        for name in self.required:
+            if node.get(name) is None:
+                errors.append("{0}: missing required property {1}".format(self.name, name))
+        for name, value in node.items():
+            key = self.keys.get(name)
+            if key is None or value is None:
+                continue
+            valid = _valid_value(key, value)
+            if valid is None:
+                return None
+            if not valid:
+                errors.append("{0}: property {1} of value {2} is not a valid {3}".format(
+                    self.name, name, value, key.data_type))
+        return errors
+
+
+class MetatypeCache():
+    """
+    Caches the id and keys of the Deep Lynx metatypes of a container, and validates payloads against them
+
+        1. The schema of a metatype, its id and keys, is retrieved with one call the first time the metatype is
+           validated, and kept for ttl seconds
+        2. The nodes of a payload are validated locally against the cached schema: required properties, data types,
+           enumeration options and regex, min and max validations
+        3. A node is validated by Deep Lynx when its metatype is not found in the container, when it has a property
+           whose data type is not checked locally, or on a sample of sample_rate of the other nodes. The remote
+           validations run concurrently on the connections of the Deep Lynx client
+        4. A sampled node that is valid locally but invalid for Deep Lynx drops the schema of its metatype, which is
+           retrieved again by the next validation
+
+    Args
+        client (DeepLynxClient): the Deep Lynx client
+        container_id (string): the id of the container of the metatypes
+        ttl (float): the number of seconds a schema is kept
+        sample_rate (float): the share of locally validated nodes that are also validated by Deep Lynx
+    """
+
+    def __init__(self, client, container_id: str, ttl: float = 300, sample_rate: float = 0.0):
+        self.client = client
+        self.container_id = container_id
+        self.ttl = ttl
+        self.sample_rate = sample_rate
+        # The schema of every metatype name, as (expiry time, schema or None for a metatype that is not found)
+        self._schemas = dict()
+        self._lock = threading.Lock()
+
+    def get(self, name: str):
+        """
+        Returns the schema of a metatype
+
+        Args
+            name (string): the name of the metatype
+        Return
+            schema (MetatypeSchema): the schema, or None if the container has no metatype of the name
+        """
+        with self._lock:
+            entry = self._schemas.get(name)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        schema = self._retrieve(name)
+        with self._lock:
+            self._schemas[name] = (time.monotonic() + self.ttl, schema)
+        return schema
+
+    def invalidate(self, name: str = None):
+        """ Drops the schema of a metatype, or of every metatype if name is None """
+        with self._lock:
+            if name is None:
+                self._schemas.clear()
+            else:
+                self._schemas.pop(name, None)
+
+    def validate(self, payload: dict):
+        """
+        Validates the nodes of a payload
+
+        Args
+            payload (dictionary): a dictionary of payloads to import into deep lynx e.g. {metatype: list(payload)}
+        Return
+            errors (list): the errors of every invalid node
+        """
+        errors = list()
+        remote = list()
+        for metatype, nodes in payload.items():
+            schema = self.get(metatype)
+            for node in nodes:
+                node_errors = schema.validate(node) if schema is not None else None
+                if node_errors is None:
+                    remote.append((metatype, schema, node, None))
+                elif node_errors:
+                    errors.extend(node_errors)
+                elif self.sample_rate > 0 and random.random() < self.sample_rate:
+                    remote.append((metatype, schema, node, node_errors))
+
+        if remote:
+            workers = min(len(remote), max(1, getattr(self.client, "pool_size", 1)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(lambda item: self._validate_remote(*item[:3]), remote))
+            for (metatype, _, _, local_errors), remote_errors in zip(remote, results):
+                if local_errors is not None and remote_errors:
+                    logging.warning('Metatype {0} changed in Deep Lynx. Retrieving its keys again'.format(metatype))
+                    self.invalidate(metatype)
+                errors.extend(remote_errors)
+        return errors
+
+    def _retrieve(self, name: str):
+        """ Retrieves the id and keys of a metatype from Deep Lynx """
+        response = self.client.call(self.client.metatypes.list_metatypes,
+                                    self.container_id,
+                                    name=name,
+                                    load_keys="true")
+        # The name is a pattern, so the metatype of the exact name is picked
+        metatypes = [metatype for metatype in _value(response) if metatype.name == name]
+        if not metatypes:
+            logging.warning('Metatype {0} was not found in container {1}'.format(name, self.container_id))
+            return None
+        metatype = metatypes[0]
+        keys = metatype.keys
+        if keys is None:
+            keys = _value(
+                self.client.call(self.client.metatype_keys.list_metatypes_keys, self.container_id, metatype.id))
+        return MetatypeSchema(name, metatype.id, keys)
+
+    def _validate_remote(self, metatype: str, schema: MetatypeSchema, node: dict):
+        """ Validates a node with the validation endpoint of Deep Lynx, and returns its errors """
+        if schema is None:
+            schema = self.get(metatype)
+            if schema is None:
+                return ["{0}: metatype not found".format(metatype)]
+        response = self.client.call(self.client.metatypes.validate_metatype_properties,
+                                    self.container_id,
+                                    schema.id,
+                                    body=node)
+        if isinstance(response, (str, bytes)):
+            response = json.loads(response)
+        if isinstance(response, dict):
+            is_error, error = response.get("isError"), response.get("error", response.get("value"))
+        else:
+            is_error, error = response.is_error, response.value
+        if not is_error:
+            return list()
+        return error if isinstance(error, list) else [error]
+
+
+def _value(response):
+    """ Returns the list of a list response of Deep Lynx """
+    if isinstance(response, list):
+        return response
+    return getattr(response, "value", None) or list()
+
+
+def _valid_value(key, value):
+    """ Returns whether a value is valid for a metatype key, or None if the data type of the key is not checked """
+    data_type = (key.data_type or "unknown").lower()
+    if data_type in ANY_TYPES:
+        return True
+    if data_type in NUMBER_TYPES or data_type in FLOAT_TYPES:
+        number = _number(value, integer=data_type in NUMBER_TYPES)
+        if number is None:
+            return False
+        validation = key.validation
+        if validation is not None:
+            if validation.min is not None and number < validation.min:
+                return False
+            if validation.max is not None and number > validation.max:
+                return False
+        return True
+    if data_type == "boolean":
+        return isinstance(value, bool) or str(value).lower() in BOOLEAN_STRINGS
+    if data_type == "string":
+        regex = key.validation.regex if key.validation is not None else None
+        return isinstance(value, str) and (not regex or re.search(regex, value) is not None)
+    if data_type == "enumeration":
+        return not key.options or str(value) in [str(option) for option in key.options]
+    if data_type == "date":
+        try:
+            pd.Timestamp(value)
+            return True
+        except (ValueError, TypeError):
+            return False
+    if data_type == "list":
+        return isinstance(value, list)
+    return None
+
+
+def _number(value, integer: bool):
+    """ Returns a value as a number, or None if it is not a number or not an integer for an integer key """
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (ValueError, TypeError):
+        return None
+    if integer and not number.is_integer():
+        return None
+    return number
+
+
+def get_metatype_cache():
+    """
+    Returns the metatype cache of the container CONTAINER_ID, which keeps a schema METATYPE_CACHE_SECONDS seconds and
+    validates a share METATYPE_VALIDATION_SAMPLE of the locally validated nodes with Deep Lynx
+    """
+    global metatype_cache
+    container_id = os.environ["CONTAINER_ID"]
+    with metatype_cache_lock:
+        if metatype_cache is None or metatype_cache.container_id != container_id:
+            metatype_cache = MetatypeCache(adapter.get_deep_lynx_client(),
+                                           container_id,
+                                           ttl=float(os.getenv("METATYPE_CACHE_SECONDS") or 300),
+                                           sample_rate=float(os.getenv("METATYPE_VALIDATION_SAMPLE") or 0))
+        return metatype_cache
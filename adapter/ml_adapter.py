@@ -3,12 +3,17 @@
 # Python Packages
 import os
 import json
+import shutil
+import logging
+import numpy as np
 import pandas as pd
 import time
 
 # Repository Modules
 import utils
 import model
+import split
+import prediction
 import settings
 
 api_client = None
@@ -22,59 +27,138 @@ class ML_Adapter():
         1. Generates training and testing sets
         2. Perform variable selection to determine the independent and dependent variables
         3. Create ML_Model objects with different independent and dependent variables
+
+    Every file of the run is kept in the scratch directory of the config, so that ML Adapter objects run concurrently.
+    With the artifact cache (ARTIFACT_CACHE_MB), a stage whose inputs did not change since a previous run is restored
+    from the cache instead of being run, see cache_key.
+
+    Args
+        config (AdapterConfig): the configuration and scratch directory of the run of the ML Adapter object
+        dataset (DataFrame): the queue window shared by the ML Adapter objects of a training cycle, which is never
+            modified. If None, the dataset is read from the DATASET file
     """
 
-    def __init__(self, name, data):
-        self.name = name
-        self.data = data
+    def __init__(self, config, dataset=None):
+        self.config = config
+        self.name = config.name
+        self.data = config.data
+        self.dataset = dataset
+        self.training_set = None
+        self.testing_set = None
         self.models = list()
+        self.cache = utils.get_artifact_cache()
+        # The artifact cache key of every stage
+        self.keys = dict()
 
-        self.write_ml_adapter_object_location_to_file()
-        self.generate_training_testing_sets(self.data["SPLIT_METHOD"])
-        self.variable_selection()
+        self.config.create()
+        stage_seconds = utils.get_metrics_registry()["stage_seconds"]
+        with stage_seconds.time(object=self.name, stage="split"):
+            self.generate_training_testing_sets(self.data["SPLIT_METHOD"])
+        with stage_seconds.time(object=self.name, stage="variable_selection"):
+            self.variable_selection()
         self.create_models()
 
-    def write_ml_adapter_object_location_to_file(self):
-        """
-        Writes the data for the ML_Adapter object to a JSON file
-
-        Note: equivalent to a single JSON object in ML_ADAPTER_OBJECTS environment variable located in the .env file
-        """
-        self.data["DATASET"] = os.getenv("QUERY_FILE_NAME")
-        self.data["MODEL"]["output_file"] = os.getenv("IMPORT_FILE_NAME")
-        # Validate path exists
-        file_path = os.path.abspath(os.getenv("ML_ADAPTER_OBJECT_LOCATION"))
-        utils.validate_extension('.json', file_path)
-        path = os.path.split(file_path)
-        utils.validate_paths_exist(path[0])
-
-        # Write dictionary to JSON file
-        with open(file_path, 'w') as fp:
-            json.dump(self.data, fp)
-
     def generate_training_testing_sets(self, type: str):
         """
         Generates the the training and testing sets from the dataset
         Args
             type (string): the type of split method e.g. none, random, hierarchical_clustering, kennard_stone, sequential
         """
-        if type == "none":
-            dataset = pd.read_csv(os.getenv("QUERY_FILE_NAME"))
-            dataset.to_csv("data/training_set.csv")
-        else:
-            # Determine name of split file
-            file = ".".join([type, "ipynb"])
+        split_methods = json.loads(os.getenv("SPLIT"))
+        splitter = split.get_splitter(type, split_methods.get(type))
+
+        # Split in-process unless a custom split Jupyter Notebook is given
+        if splitter is not None and "SPLIT_NOTEBOOK" not in self.data:
+            if self.dataset is None:
+                self.dataset = utils.read_csv(self.data["DATASET"])
+            key = self.cache_key("split", self.dataset, type, split_methods.get(type), utils.hash_package(split))
+            files = self.cache.get("split", key, self.config.directory) if key else None
+            if files is not None:
+                # The cache stores the positions of the rows of the training and testing sets in the dataset
+                self.training_set = self.dataset.iloc[np.load(files["training_set.npy"])]
+                self.testing_set = self.dataset.iloc[np.load(files["testing_set.npy"])]
+            else:
+                self.training_set, self.testing_set = splitter.split(self.dataset)
+                if key:
+                    self.cache_split_positions(key)
+            self.write_training_testing_sets()
+            return
 
-            # Determine path for .csv file
-            file_path = os.path.abspath(os.path.join("split", file))
-            utils.validate_paths_exist(file_path)
-            utils.validate_extension('.ipynb', file_path)
+        if "SPLIT_NOTEBOOK" in self.data:
+            file_path = os.path.abspath(self.data["SPLIT_NOTEBOOK"]["notebook"])
+            kernel = self.data["SPLIT_NOTEBOOK"]["kernel"]
+        else:
+            # Determine path of the split file e.g. split/kennard_stone.ipynb
+            file_path = os.path.abspath(os.path.join("split", ".".join([type, "ipynb"])))
+            kernel = 'ir' if type == "kennard_stone" else 'python3'
+        utils.validate_paths_exist(file_path)
+        utils.validate_extension('.ipynb', file_path)
 
+        dataset = self.dataset if self.dataset is not None else utils.hash_file(self.data["DATASET"])
+        key = self.cache_key("split", dataset, type, split_methods.get(type), utils.hash_file(file_path), kernel)
+        if not key or self.cache.get("split", key, self.config.directory) is None:
             # Run Jupyter Notebook
-            if type == "random" or type == "hierarchical_clustering" or type == "sequential":
-                utils.run_jupyter_notebook(file_path, 'python3')
-            elif type == "kennard_stone":
-                utils.run_jupyter_notebook(file_path, 'ir')
+            utils.run_jupyter_notebook(file_path, kernel, env=self.config.env)
+            if key:
+                self.cache.put(
+                    "split", key, {
+                        os.path.basename(self.config.training_set_file): self.config.training_set_file,
+                        os.path.basename(self.config.testing_set_file): self.config.testing_set_file
+                    })
+
+        # Load the training and testing sets written by the Jupyter Notebook once for every ML Model
+        # The training and testing sets of the ML Adapter object have a schema of their own
+        self.training_set = utils.read_csv(self.config.training_set_file, dataset=self.name)
+        self.testing_set = utils.read_csv(self.config.testing_set_file, dataset=self.name)
+        if os.getenv("DATASET_HANDOFF", "csv") == "npy":
+            self.write_training_testing_sets()
+
+    def write_training_testing_sets(self):
+        """
+        Writes the training and testing sets for the Jupyter Notebooks in the DATASET_HANDOFF format: .csv files, or
+        a directory of memory-mappable .npy files per set (npy)
+        """
+        if os.getenv("DATASET_HANDOFF", "csv") == "npy":
+            # Rows are numbered from 0 like the rows read from the .csv files
+            utils.write_dataset(self.training_set.reset_index(drop=True), self.config.training_set_dir)
+            utils.write_dataset(self.testing_set.reset_index(drop=True), self.config.testing_set_dir)
+        else:
+            self.training_set.to_csv(self.config.training_set_file, index=False)
+            self.testing_set.to_csv(self.config.testing_set_file, index=False)
+
+    def cache_key(self, stage: str, *parts):
+        """
+        Returns the artifact cache key of a stage of the ML Adapter object, or None if the artifact cache is disabled
+
+        The key of a stage includes the key of the previous stage, so that a stage is run again when the queue window,
+        the split or the variable selection changed
+
+        Args
+            stage (string): the name of the stage e.g. split, variable_selection, model
+            parts: the inputs of the stage e.g. the dataset, the hash of the Jupyter Notebook, the kernel
+        """
+        if self.cache is None:
+            return None
+        self.keys[stage] = self.cache.key(stage, *parts)
+        return self.keys[stage]
+
+    def cache_split_positions(self, key: str):
+        """
+        Stores the positions of the rows of the training and testing sets of an in-process split in the artifact cache
+
+        Args
+            key (string): the artifact cache key of the split
+        """
+        files = dict()
+        for name, subset in [("training_set.npy", self.training_set), ("testing_set.npy", self.testing_set)]:
+            positions = self.dataset.index.get_indexer(subset.index)
+            # The rows cannot be found again if the index has duplicates or the split changed the columns
+            found = self.dataset.index.is_unique and (positions >= 0).all()
+            if not found or not subset.columns.equals(self.dataset.columns):
+                return
+            files[name] = os.path.join(self.config.directory, name)
+            np.save(files[name], positions)
+        self.cache.put("split", key, files)
 
     def variable_selection(self):
         """
@@ -85,8 +169,15 @@ class ML_Adapter():
         utils.validate_paths_exist(file_path)
         kernel = self.data["VARIABLE_SELECTION"]["kernel"]
 
+        key = self.cache_key("variable_selection", self.keys.get("split"), utils.hash_file(file_path), kernel)
+        if key and self.cache.get("variable_selection", key, self.config.directory) is not None:
+            return
+
         # Run Jupyter Notebook
-        utils.run_jupyter_notebook(file_path, kernel)
+        utils.run_jupyter_notebook(file_path, kernel, env=self.config.env)
+        output_file = self.data["VARIABLE_SELECTION"]["output_file"]
+        if key:
+            self.cache.put("variable_selection", key, {os.path.basename(output_file): output_file})
 
     def create_models(self):
         """
@@ -102,67 +193,125 @@ class ML_Adapter():
             models = json.load(f)
             f.close()
 
-        # Create list of models
-        for i in range(len(models)):
-            self.models.append(
-                model.ML_Model(independent_variables=models[i]["independent_variables"],
-                               dependent_variables=models[i]["dependent_variables"]))
-            print(self.models)
+        file_path = os.path.abspath(self.data["MODEL"]["notebook"])
+        key = self.cache_key("model", self.keys.get("variable_selection"), models, utils.hash_file(file_path),
+                             self.data["MODEL"]["kernel"], self.model_parameters())
+        output_files = self.restore_models(key) if key else None
+        metrics = utils.get_metrics_registry()
+        if output_files is None:
+            # Create the models concurrently, each in its own working directory
+            start = time.time()
+            self.models, output_files = model.get_model_scheduler().run(models, self.data, self.training_set,
+                                                                        self.testing_set, self.config.models_directory,
+                                                                        self.name)
+            logging.info('{0}: {1} of {2} models created in {3:.2f} seconds'.format(self.name, len(self.models),
+                                                                                    len(models),
+                                                                                    time.time() - start))
+            metrics["stage_seconds"].observe(time.time() - start, object=self.name, stage="models")
+            # Only the results of a run where every model succeeded are cached
+            if key and output_files and len(self.models) == len(models):
+                self.cache_models(key, output_files)
+        if os.path.exists(path):
+            os.remove(path)
 
-        # Import the results to deep lynx
-        print("Begin import to deep lynx")
-        did_succeed = adapter.import_to_deep_lynx(self.data["MODEL"]["output_file"])
-        print("Deep Lynx Import", did_succeed)
+        # The model serialization file of the last model is kept, so predictions select the variables of that model
+        if self.models:
+            variables = (self.models[-1].independent_variables, self.models[-1].dependent_variables)
+        else:
+            # Restored from the artifact cache, which only stores runs where every model succeeded
+            variables = (models[-1]["independent_variables"], models[-1]["dependent_variables"]) if models else None
+        if variables is not None and output_files and self.data["MODEL"].get("model_serialization_file"):
+            prediction.get_model_registry().register(self.name, *variables)
 
-        # File clean up
-        if did_succeed and os.path.exists(self.data["MODEL"]["output_file"]):
-            os.remove(self.data["MODEL"]["output_file"])
-        if did_succeed and os.path.exists(self.data["DATASET"]):
-            os.remove(self.data["DATASET"])
-        if did_succeed and os.path.exists(os.getenv("ML_ADAPTER_OBJECT_LOCATION")):
-            os.remove(os.getenv("ML_ADAPTER_OBJECT_LOCATION"))
-        if os.path.exists("data/training_set.csv"):
-            os.remove("data/training_set.csv")
-        if os.path.exists("data/testing_set.csv"):
-            os.remove("data/testing_set.csv")
+        # Import the results of every model to deep lynx at once
+        logging.info('{0}: importing {1} output files to Deep Lynx'.format(self.name, len(output_files or list())))
+        did_succeed = bool(output_files)
+        with metrics["stage_seconds"].time(object=self.name, stage="import"):
+            for output_file in output_files:
+                # The output files of the model scheduler exist, so they are not waited for
+                did_succeed = adapter.import_to_deep_lynx(output_file, timeout=0) and did_succeed
+        logging.info('{0}: Deep Lynx import succeeded: {1}'.format(self.name, did_succeed))
+
+        # File clean up. Output files that failed to import are kept until the next run of the ML Adapter object
+        self.config.remove(keep=None if did_succeed else output_files)
+
+    def model_parameters(self):
+        """
+        Returns the MODEL key of the ML Adapter object for the artifact cache key of the models. The files of the
+        models are given by their names, because their directories are the scratch directories of the run
+        """
+        parameters = dict(self.data["MODEL"])
+        for name in model.ml_model.MODEL_FILES:
+            if parameters.get(name):
+                parameters[name] = os.path.basename(parameters[name])
+        return parameters
+
+    def cache_models(self, key: str, output_files: list):
+        """
+        Stores the output files, the model serialization file and the standardization file of the models in the
+        artifact cache
+
+        Args
+            key (string): the artifact cache key of the models
+            output_files (list): the output files of the models
+        """
+        files = {os.path.basename(output_file): output_file for output_file in output_files}
+        for name in ["model_serialization_file", "standardization_file"]:
+            if self.data["MODEL"].get(name) and os.path.isfile(self.data["MODEL"][name]):
+                files[name] = self.data["MODEL"][name]
+        self.cache.put("model", key, files)
+
+    def restore_models(self, key: str):
+        """
+        Restores the files of the models from the artifact cache
+
+        Args
+            key (string): the artifact cache key of the models
+        Return
+            output_files (list): the output files of the models to import, or None on a cache miss
+        """
+        files = self.cache.get("model", key, self.config.directory)
+        if files is None:
+            return None
+        output_files = list()
+        for name, path in files.items():
+            if name in ["model_serialization_file", "standardization_file"]:
+                shutil.move(path, self.data["MODEL"][name])
+            else:
+                output_files.append(path)
+        return output_files
 
 
 def main():
     """
     Main entry point for script
     """
+    ml_adapter_objects = json.loads(os.getenv("ML_ADAPTER_OBJECTS"))
+    workers = os.getenv("ADAPTER_WORKERS")
+    adapter_scheduler = adapter.AdapterScheduler(int(workers) if workers else len(ml_adapter_objects))
+
     while True:
-        if os.path.exists(os.getenv("QUEUE_FILE_NAME")) and adapter.new_data:
-            # Apply a lock
-            with adapter.lock_:
-                adapter.new_data = False
-                # Read master queue file
-                queue_df = pd.read_csv(os.getenv("QUEUE_FILE_NAME"))
-            # Only execute if queue reaches optimal length
-            if queue_df.shape[0] == int(os.getenv("QUEUE_LENGTH")):
-                # TODO: Change to customized name
-                file_name = None
-
-                # File paths for local files
-                query_file_name = "data/" + file_name
-                import_file_name = "data/ML_" + file_name
-
-                #Set environment variables
-                os.environ["QUERY_FILE_NAME"] = query_file_name
-                os.environ["IMPORT_FILE_NAME"] = import_file_name
-
-                # Write csv
-                queue_df.to_csv(query_file_name, index=False)
-
-                # Create ML Adapter objects
-                start = time.time()
-                ml_adapter_objects = json.loads(os.getenv("ML_ADAPTER_OBJECTS"))
-                for ml_adapter in ml_adapter_objects:
-                    name = list(ml_adapter.keys())[0]
-                    data = ml_adapter[name]
-                    ml_adapter = ML_Adapter(name, data)
-                end = time.time()
-                print(end - start)
+        # Block until the queue window is full and the scheduler triggers a training cycle
+        queue_df = adapter.scheduler.wait()
+        if queue_df is None:
+            break
+
+        # Write a read-only snapshot of the queue window once for every ML Adapter object
+        dataset_file = adapter.DATASET_FILE
+        queue_df.to_csv(dataset_file, index=False)
+
+        # Run the ML Adapter objects concurrently
+        start = time.time()
+        adapter_scheduler.run(ml_adapter_objects, queue_df, dataset_file)
+        end = time.time()
+        logging.info('Training cycle ran in {0:.2f} seconds'.format(end - start))
+        metrics = utils.get_metrics_registry()
+        metrics["cycles_total"].inc()
+        metrics["cycle_seconds"].observe(end - start)
+
+        # File clean up
+        if os.path.exists(dataset_file):
+            os.remove(dataset_file)
 
 
 if __name__ == "__main__":
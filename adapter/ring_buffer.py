@@ -0,0 +1,365 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+# Python Packages
+import os
+import re
+import logging
+import threading
+import numpy as np
+import pandas as pd
+
+import utils
+
+# Kinds of numpy dtypes that are stored in a typed column, every other column is stored as an object column
+NUMERIC_KINDS = 'biufcmM'
+
+
+class RingBuffer():
+    """
+    A columnar First In First Out (FIFO) window of the most recent rows received from Deep Lynx
+
+        1. Preallocates one NumPy array per column with a length of the window capacity
+        2. Appends incoming rows at the tail and evicts the oldest rows at the head in O(batch) time
+        3. Optionally persists every append to an append-only segment log on disk, from which the window is restored
+           when the ML Adapter starts again
+        4. Keeps the pandas dtype of the columns appended with an extension dtype e.g. category, Int64, string, which
+           are stored as object arrays
+
+    Args
+        capacity (integer): the maximum number of rows in the window e.g. QUEUE_LENGTH
+        spill_path (string): the file path used to name the segment log files e.g. QUEUE_FILE_NAME
+        segment_rows (integer): the number of rows written to a segment file before a new segment is started
+        max_segments (integer): the number of segment files that triggers a compaction of the segment log
+    """
+
+    def __init__(self, capacity: int, spill_path: str = None, segment_rows: int = None, max_segments: int = 8):
+        if capacity <= 0:
+            error = "capacity must be greater than 0, not {0}".format(capacity)
+            raise ValueError(error)
+        self.capacity = capacity
+        self.columns = list()
+        self.offset = 0
+        self._data = dict()
+        # The extension dtype of every column that only received values of that dtype
+        self._dtypes = dict()
+        self._start = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.log = None
+        if spill_path:
+            self.log = SegmentLog(spill_path, segment_rows or capacity, max_segments)
+            self._replay(self.log.recover())
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def head_offset(self):
+        """ The total number of rows evicted from the window, i.e. the logical offset of the oldest row """
+        return self.offset - self._size
+
+    def is_full(self):
+        """ Whether the window holds capacity rows """
+        return self._size == self.capacity
+
+    def append(self, query_df: pd.DataFrame or pd.Series):
+        """
+        Appends rows to the tail of the window and evicts rows from the head once the capacity is reached
+
+        Args
+            query_df (DataFrame or Series): data to add to the window
+        Return
+            rows (integer): the number of rows appended
+        """
+        if isinstance(query_df, pd.Series):
+            query_df = query_df.to_frame().T
+        rows = query_df.shape[0]
+        if rows == 0:
+            return 0
+
+        with self._lock:
+            schema_changed = self._add_columns(query_df)
+            # Only the last capacity rows of a batch can remain in the window
+            batch = query_df.iloc[-self.capacity:] if rows > self.capacity else query_df
+            if rows >= self.capacity:
+                self._start = 0
+                self._size = 0
+            self._write(batch)
+            self.offset += rows
+
+            if self.log is not None:
+                self.log.append(batch.reindex(columns=self.columns), self.offset - batch.shape[0], schema_changed)
+                self.log.evict(self.head_offset)
+                if self.log.needs_compaction():
+                    self.log.compact(self._frame(), self.head_offset)
+        return rows
+
+    def snapshot(self):
+        """
+        Returns a copy of the window ordered from the oldest to the newest row
+
+        Return
+            window (DataFrame): the rows in the window
+        """
+        with self._lock:
+            return self._frame()
+
+    def clear(self):
+        """ Removes every row from the window and the segment log """
+        with self._lock:
+            self._start = 0
+            self._size = 0
+            if self.log is not None:
+                self.log.evict(self.offset)
+
+    def _frame(self):
+        """ Builds a DataFrame of the window. The caller must hold the lock """
+        end = self._start + self._size
+        columns = dict()
+        for column in self.columns:
+            values = self._data[column]
+            if end <= self.capacity:
+                columns[column] = values[self._start:end].copy()
+            else:
+                columns[column] = np.concatenate((values[self._start:], values[:end - self.capacity]))
+        frame = pd.DataFrame(columns, columns=self.columns)
+        for column, dtype in self._dtypes.items():
+            try:
+                frame[column] = frame[column].astype(dtype)
+            except (ValueError, TypeError):
+                logging.warning('Cannot restore the dtype {0} of queue column {1}'.format(dtype, column))
+        return frame
+
+    def _replay(self, rows: pd.DataFrame):
+        """ Fills the window with the rows of the segment log of a previous run, which are not written again """
+        if rows is None or rows.shape[0] == 0:
+            return
+        with self._lock:
+            self._add_columns(rows)
+            self._write(rows.iloc[-self.capacity:])
+            self.offset = rows.shape[0]
+            self.log.evict(self.head_offset)
+        logging.info('Restored {0} rows of the queue window from the segment log'.format(self._size))
+
+    def _add_columns(self, query_df: pd.DataFrame):
+        """
+        Preallocates storage for columns that have not been seen before
+
+        Return
+            schema_changed (boolean): whether a column was added
+        """
+        schema_changed = False
+        for column in query_df.columns:
+            if column in self._data:
+                self._merge_dtype(column, query_df[column].dtype)
+                continue
+            dtype = query_df[column].dtype
+            if not isinstance(dtype, np.dtype):
+                self._dtypes[column] = dtype
+                dtype = np.dtype(object)
+            elif dtype.kind not in NUMERIC_KINDS:
+                dtype = np.dtype(object)
+            if self._size > 0:
+                # Rows already in the window do not have a value for the new column
+                dtype = _missing_dtype(dtype)
+            self._data[column] = np.empty(self.capacity, dtype=dtype)
+            if self._size > 0:
+                self._data[column][:] = _missing_value(dtype)
+            self.columns.append(column)
+            schema_changed = True
+        return schema_changed
+
+    def _merge_dtype(self, column: str, dtype):
+        """ Updates the extension dtype of a column for incoming values of a dtype. The caller must hold the lock """
+        current = self._dtypes.get(column)
+        if current is None or current == dtype:
+            return
+        categorical = isinstance(current, pd.CategoricalDtype) and isinstance(dtype, pd.CategoricalDtype)
+        if categorical and not (current.ordered or dtype.ordered):
+            # New categories are added after the categories of the window
+            categories = current.categories.append(dtype.categories.difference(current.categories))
+            self._dtypes[column] = pd.CategoricalDtype(categories)
+            return
+        del self._dtypes[column]
+
+    def _write(self, batch: pd.DataFrame):
+        """ Copies a batch of at most capacity rows into the window. The caller must hold the lock """
+        rows = batch.shape[0]
+        tail = (self._start + self._size) % self.capacity
+        first = min(rows, self.capacity - tail)
+
+        for column in self.columns:
+            if column in batch.columns:
+                values = batch[column].to_numpy()
+            else:
+                dtype = _missing_dtype(self._data[column].dtype)
+                values = np.full(rows, _missing_value(dtype), dtype=dtype)
+            self._fit(column, values)
+            self._data[column][tail:tail + first] = values[:first]
+            self._data[column][:rows - first] = values[first:]
+
+        overflow = max(0, self._size + rows - self.capacity)
+        self._start = (self._start + overflow) % self.capacity
+        self._size = min(self.capacity, self._size + rows)
+
+    def _fit(self, column: str, values: np.ndarray):
+        """ Upcasts the storage of a column when incoming values cannot be stored with its current dtype """
+        storage = self._data[column]
+        if np.can_cast(values.dtype, storage.dtype, casting='safe'):
+            return
+        dtype = np.dtype(object)
+        if values.dtype.kind in NUMERIC_KINDS and storage.dtype.kind in NUMERIC_KINDS:
+            try:
+                dtype = np.result_type(storage.dtype, values.dtype)
+            except TypeError:
+                pass
+        self._data[column] = storage.astype(dtype)
+
+
+class SegmentLog():
+    """
+    An append-only log of the rows added to a RingBuffer
+
+        1. Appends each batch to the active segment file, e.g. queue.00000001.csv for QUEUE_FILE_NAME queue.csv
+        2. Starts a new segment once the active segment reaches segment_rows or the columns change
+        3. Deletes segments whose rows were all evicted from the window
+        4. Compacts the log into a single segment once there are more than max_segments segments
+        5. Reads the segments left behind by a previous run back into the window, see recover
+
+    Args
+        path (string): the file path used to name the segment files
+        segment_rows (integer): the number of rows written to a segment file before a new segment is started
+        max_segments (integer): the number of segment files that triggers a compaction
+    """
+
+    def __init__(self, path: str, segment_rows: int, max_segments: int = 8):
+        self.directory, name = os.path.split(os.path.abspath(path))
+        self.stem, self.extension = os.path.splitext(name)
+        self.segment_rows = segment_rows
+        self.max_segments = max_segments
+        # Each segment is a list of [file path, first offset, end offset]
+        self.segments = list()
+        self.sequence = 0
+        # Whether rows can be appended to the last segment, which is not the case for a segment of a previous run or
+        # once every segment was deleted
+        self._appendable = False
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def append(self, batch: pd.DataFrame, first_offset: int, new_segment: bool = False):
+        """
+        Appends a batch of rows to the active segment
+
+        Args
+            batch (DataFrame): the rows to append
+            first_offset (integer): the logical offset of the first row in the batch
+            new_segment (boolean): whether to start a new segment, e.g. when the columns changed
+        """
+        if new_segment or not self._appendable or self._rows(self.segments[-1]) >= self.segment_rows:
+            self._start_segment(first_offset)
+        segment = self.segments[-1]
+        write_header = segment[2] == segment[1]
+        batch.to_csv(segment[0], mode='a', header=write_header, index=False)
+        segment[2] = first_offset + batch.shape[0]
+
+    def evict(self, head_offset: int):
+        """
+        Deletes the segments that only contain rows before the head of the window
+
+        Args
+            head_offset (integer): the logical offset of the oldest row in the window
+        """
+        while self.segments and self.segments[0][2] <= head_offset:
+            segment = self.segments.pop(0)
+            if os.path.exists(segment[0]):
+                os.remove(segment[0])
+        self._appendable = self._appendable and bool(self.segments)
+
+    def needs_compaction(self):
+        return len(self.segments) > self.max_segments
+
+    def compact(self, window: pd.DataFrame, head_offset: int):
+        """
+        Rewrites the rows of the window into a single segment and deletes every older segment
+
+        Args
+            window (DataFrame): the rows in the window
+            head_offset (integer): the logical offset of the oldest row in the window
+        """
+        old_segments = self.segments
+        self.segments = list()
+        self._start_segment(head_offset)
+        path = self.segments[-1][0]
+        # Write to a temporary file so a partially written segment is never left behind
+        temp_path = path + '.tmp'
+        window.to_csv(temp_path, index=False)
+        os.replace(temp_path, path)
+        self.segments[-1][2] = head_offset + window.shape[0]
+        for segment in old_segments:
+            if os.path.exists(segment[0]):
+                os.remove(segment[0])
+        logging.info('Compacted queue segment log into ' + path)
+
+    def recover(self):
+        """
+        Reads the segment files left behind by a previous run, which are kept until their rows are evicted from the
+        window. The rows are read with the schema registry of the queue window
+
+        Return
+            rows (DataFrame): the rows of the segments from the oldest to the newest, or None if there are no segments
+        """
+        pattern = re.compile(re.escape(self.stem) + r'\.(\d{8})' + re.escape(self.extension) + r'(\.tmp)?$')
+        files = list()
+        for name in os.listdir(self.directory):
+            match = pattern.match(name)
+            if match is None:
+                continue
+            path = os.path.join(self.directory, name)
+            if match.group(2):
+                # A compaction that did not finish, whose rows are still in the older segments
+                os.remove(path)
+            else:
+                files.append((int(match.group(1)), path))
+
+        frames = list()
+        offset = 0
+        for sequence, path in sorted(files):
+            self.sequence = max(self.sequence, sequence)
+            try:
+                frame = utils.read_csv(path)
+            except (pd.errors.EmptyDataError, pd.errors.ParserError) as error:
+                logging.warning('Removing unreadable queue segment {0}: {1}'.format(path, error))
+                os.remove(path)
+                continue
+            self.segments.append([path, offset, offset + frame.shape[0]])
+            offset += frame.shape[0]
+            frames.append(frame)
+        self._appendable = False
+        if not frames:
+            return None
+        return pd.concat(frames, ignore_index=True)
+
+    def _start_segment(self, first_offset: int):
+        self.sequence += 1
+        name = '{0}.{1:08d}{2}'.format(self.stem, self.sequence, self.extension)
+        self.segments.append([os.path.join(self.directory, name), first_offset, first_offset])
+        self._appendable = True
+
+    def _rows(self, segment: list):
+        return segment[2] - segment[1]
+
+
+def _missing_dtype(dtype: np.dtype):
+    """ Returns a dtype that can hold a missing value """
+    if dtype.kind in 'biu':
+        return np.dtype('float64')
+    if dtype.kind in 'fcmM':
+        return dtype
+    return np.dtype(object)
+
+
+def _missing_value(dtype: np.dtype):
+    if dtype.kind in 'mM':
+        return np.datetime64('NaT') if dtype.kind == 'M' else np.timedelta64('NaT')
+    return np.nan
@@ -0,0 +1,101 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+# Python Packages
+import time
+import threading
+import pandas as pd
+
+# Repository Modules
+from .ring_buffer import RingBuffer
+
+
+class TrainingScheduler():
+    """
+    Producer/consumer scheduler between the threads that ingest data and the machine learning thread
+
+        1. Producers append rows to the queue window and signal a condition variable
+        2. The machine learning thread blocks until the window is full and the retraining policy triggers
+        3. The machine learning thread receives a snapshot of the window
+
+    A training cycle is triggered once the window is full and either min_new_rows rows were appended since the last
+    cycle, or max_latency seconds passed since the first row that has not been trained on was appended.
+
+    Args
+        window (RingBuffer): the queue window
+        min_new_rows (integer): the number of new rows that triggers a training cycle
+        max_latency (float): the number of seconds a new row waits before a training cycle is triggered regardless of
+            min_new_rows. None waits for min_new_rows
+    """
+
+    def __init__(self, window: RingBuffer, min_new_rows: int = 1, max_latency: float = None):
+        self.window = window
+        self.min_new_rows = max(1, min_new_rows)
+        self.max_latency = max_latency
+        self._condition = threading.Condition()
+        self._new_rows = 0
+        self._first_new_row_time = None
+        self._stopped = False
+
+    def append(self, query_df: pd.DataFrame or pd.Series):
+        """
+        Appends rows to the queue window and wakes up the machine learning thread
+
+        Args
+            query_df (DataFrame or Series): data to add to the queue window
+        Return
+            rows (integer): the number of rows appended
+        """
+        with self._condition:
+            rows = self.window.append(query_df)
+            if rows > 0:
+                if self._new_rows == 0:
+                    self._first_new_row_time = time.monotonic()
+                self._new_rows += rows
+                self._condition.notify_all()
+        return rows
+
+    def wait(self, timeout: float = None):
+        """
+        Blocks until a training cycle is triggered
+
+        Args
+            timeout (float): the maximum number of seconds to wait. None waits indefinitely
+        Return
+            window (DataFrame): a snapshot of the queue window, or None if the timeout expired or the scheduler stopped
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while not self._stopped:
+                ready_in = self._ready_in()
+                if ready_in == 0:
+                    self._new_rows = 0
+                    self._first_new_row_time = None
+                    return self.window.snapshot()
+
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    ready_in = remaining if ready_in is None else min(ready_in, remaining)
+                self._condition.wait(ready_in)
+        return None
+
+    def stop(self):
+        """ Wakes up and releases every thread waiting for a training cycle """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def _ready_in(self):
+        """
+        Returns the number of seconds until a training cycle is triggered, 0 if it is triggered now, or None if it
+        waits for more rows. The caller must hold the condition
+        """
+        if self._new_rows == 0 or not self.window.is_full():
+            return None
+        if self._new_rows >= self.min_new_rows:
+            return 0
+        if self.max_latency is None:
+            return None
+        elapsed = time.monotonic() - self._first_new_row_time
+        return max(0, self.max_latency - elapsed)
@@ -0,0 +1 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
@@ -0,0 +1,519 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+"""
+Benchmarks the ML Adapter end to end against a local stand-in for Deep Lynx, see benchmark/fake_deep_lynx.py
+
+    python -m benchmark.end_to_end --rate 20 --duration 30 --rows 100
+
+    1. Starts the stand-in for Deep Lynx and the ML Adapter in its own process, in a temporary directory, with an ML
+       Adapter object whose Jupyter Notebooks fit a linear model of synthetic sensor data
+    2. Fires file_created events at the registered /machinelearning destination at a fixed rate, every event for a new
+       synthetic sensor .csv file stored in the stand-in. Events are sent on schedule whether or not the ML Adapter
+       keeps up, so a rejected event is counted instead of slowing down the load
+    3. Reports the events accepted per second, the latency of the event requests and of the retrieval of the files, the
+       latency from an event to the import of the first model trained on its rows, and the peak memory of the ML
+       Adapter with its Jupyter kernels
+
+Every row of the synthetic files has a sample number, and the model Jupyter Notebook imports the last sample number of
+the queue window it was trained on, so the import of every model is matched to the events whose rows it was trained on.
+Settings of the ML Adapter are changed with --env e.g. --env EVENT_WORKERS=8 --env TRAIN_MIN_NEW_ROWS=600
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import urllib3
+import nbformat
+
+from benchmark.fake_deep_lynx import FakeDeepLynx
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Serves the ML Adapter with a threaded server, which runs the initialization of create_app without the reloader
+SERVE_SCRIPT = """
+import os
+from dotenv import load_dotenv
+load_dotenv(".env")
+from werkzeug.serving import make_server
+import adapter
+app = adapter.create_app()
+make_server(os.environ["FLASK_RUN_HOST"], int(os.environ["FLASK_RUN_PORT"]), app, threaded=True).serve_forever()
+"""
+
+# The Jupyter Notebooks of the ML Adapter object. The kernel starts in the directory of the Jupyter Notebook, and the
+# files of the ML Adapter object are relative to the directory of the ML Adapter
+VARIABLE_SELECTION_NOTEBOOK = """
+import os
+import json
+import pandas as pd
+os.chdir({directory!r})
+with open(os.getenv("ML_ADAPTER_OBJECT_LOCATION")) as fp:
+    data = json.load(fp)
+columns = list(pd.read_csv(data["DATASET"], nrows=0).columns)
+models = [{{"independent_variables": [column for column in columns if column.startswith("x")],
+           "dependent_variables": ["y"]}}]
+with open(data["VARIABLE_SELECTION"]["output_file"], "w") as fp:
+    json.dump(models, fp)
+"""
+
+MODEL_NOTEBOOK = """
+import os
+import json
+import numpy as np
+import pandas as pd
+import utils
+os.chdir({directory!r})
+with open(os.getenv("ML_ADAPTER_OBJECT_LOCATION")) as fp:
+    data = json.load(fp)
+X_train, X_test, y_train, y_test = utils.load_model_sets(os.getenv("MODEL_DIR"))
+A = np.column_stack([np.ones(len(X_train)), X_train.to_numpy(dtype=float)])
+coefficients = np.linalg.lstsq(A, y_train.to_numpy(dtype=float).ravel(), rcond=None)[0]
+yhat = np.column_stack([np.ones(len(X_test)), X_test.to_numpy(dtype=float)]) @ coefficients
+rmse = float(np.sqrt(np.mean((y_test.to_numpy(dtype=float).ravel() - yhat)**2)))
+# The last sample of the queue window identifies the events whose rows the model was trained on
+last_sample = int(pd.read_csv(data["DATASET"], usecols=["sample"])["sample"].max())
+pd.DataFrame([{{"rmse": rmse, "rows": len(X_train) + len(X_test), "last_sample": last_sample}}]).to_csv(
+    data["MODEL"]["output_file"], index=False)
+"""
+
+
+class ProcessMemory():
+    """
+    Samples the resident memory of a process and its descendants, e.g. the ML Adapter and its Jupyter kernels, from
+    /proc. The peak of the process itself is its VmHWM, which is not missed between samples
+
+    Args
+        pid (integer): the id of the process
+        interval (float): the number of seconds between samples
+    """
+
+    def __init__(self, pid: int, interval: float = 0.25):
+        self.pid = pid
+        self.interval = interval
+        self.peak_total = 0
+        self.peak_process = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True, name="memory")
+
+    @property
+    def available(self):
+        return os.path.isdir("/proc/{0}".format(self.pid))
+
+    def start(self):
+        if self.available:
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _sample(self):
+        while not self._stopped.is_set():
+            try:
+                pids = [self.pid] + descendants(self.pid)
+                self.peak_process = max(self.peak_process, _status_kb(self.pid, "VmHWM"))
+                self.peak_total = max(self.peak_total, sum(_status_kb(pid, "VmRSS") for pid in pids))
+            except OSError:
+                pass
+            self._stopped.wait(self.interval)
+
+
+def descendants(pid: int):
+    """ Returns the ids of the descendant processes of a process """
+    children = dict()
+    for name in os.listdir("/proc"):
+        if name.isdigit():
+            try:
+                with open("/proc/{0}/stat".format(name)) as fp:
+                    # The name of the command may contain spaces, so the fields are read after its closing parenthesis
+                    parent = int(fp.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(parent, list()).append(int(name))
+    found = list()
+    pending = [pid]
+    while pending:
+        for child in children.get(pending.pop(), list()):
+            found.append(child)
+            pending.append(child)
+    return found
+
+
+def _status_kb(pid: int, field: str):
+    """ Returns a field of /proc/<pid>/status in kilobytes, or 0 if the process ended """
+    try:
+        with open("/proc/{0}/status".format(pid)) as fp:
+            for line in fp:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def sensor_file(index: int, rows: int, columns: int, rng: np.random.Generator, interval: float = 1.0):
+    """
+    Returns a synthetic sensor .csv file: a sample number and time, columns sensor readings x0, x1, ... and a response y
+    that is linear in the readings with noise
+
+    Args
+        index (integer): the index of the file, which numbers its samples after the samples of the previous files
+        rows (integer): the number of rows of the file
+        columns (integer): the number of sensor readings of a row
+        rng (Generator): the random number generator
+        interval (float): the number of seconds between samples
+    Return
+        content (bytes): the .csv file
+        last_sample (integer): the sample number of the last row
+    """
+    samples = np.arange(index * rows, (index + 1) * rows)
+    readings = rng.normal(size=(rows, columns))
+    weights = np.linspace(1, 2, columns)
+    data = pd.DataFrame(readings, columns=["x{0}".format(i) for i in range(columns)])
+    data.insert(0, "time", samples * interval)
+    data.insert(0, "sample", samples)
+    data["y"] = readings @ weights + rng.normal(scale=0.1, size=rows)
+    return data.to_csv(index=False, float_format="%.6f").encode(), int(samples[-1])
+
+
+def percentiles(values: list):
+    """ Returns the count, 50th, 90th and 99th percentiles and maximum of values, or None for each without values """
+    if not values:
+        return {"count": 0, "p50": None, "p90": None, "p99": None, "max": None}
+    values = np.asarray(values, dtype=float)
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {"count": int(values.size), "p50": p50, "p90": p90, "p99": p99, "max": float(values.max())}
+
+
+def free_port(host: str):
+    with socket.socket() as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+def write_notebook(path: str, source: str):
+    nb = nbformat.v4.new_notebook()
+    nb.cells.append(nbformat.v4.new_code_cell(source.strip()))
+    nb.metadata["kernelspec"] = {"name": "python3", "display_name": "Python 3", "language": "python"}
+    with open(path, "w") as fp:
+        nbformat.write(nb, fp)
+
+
+def adapter_environment(args, directory: str, deep_lynx_url: str, port: int):
+    """ Returns the environment of the ML Adapter process, with the --env settings of the benchmark """
+    ml_adapter_objects = [{
+        "Benchmark": {
+            "DATASET": "data/dataset.csv",
+            "SPLIT_METHOD": "random",
+            "VARIABLE_SELECTION": {
+                "notebook": "notebooks/variable_selection.ipynb",
+                "kernel": "python3",
+                "output_file": "data/models.json"
+            },
+            "MODEL": {
+                "notebook": "notebooks/model.ipynb",
+                "kernel": "python3",
+                "output_file": "data/results.csv"
+            }
+        }
+    }]
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": os.pathsep.join([REPOSITORY] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else [])),
+        "FLASK_APP": "adapter",
+        "FLASK_RUN_HOST": args.host,
+        "FLASK_RUN_PORT": str(port),
+        "WERKZEUG_RUN_MAIN": "true",
+        "DEEP_LYNX_URL": deep_lynx_url,
+        "DEEP_LYNX_API_KEY": "",
+        "CONTAINER_NAME": "DIAMOND",
+        "DATA_SOURCE_NAME": "MLAdapter",
+        "DATA_SOURCES": json.dumps(["Sensors"]),
+        "REGISTER_WAIT_SECONDS": "1",
+        "IMPORT_FILE_WAIT_SECONDS": "1",
+        "METADATA": os.path.join(directory, "data", "metadata.json"),
+        "QUEUE_LENGTH": str(args.queue_length),
+        "ARTIFACT_CACHE_MB": "0",
+        "ML_ADAPTER_OBJECTS": json.dumps(ml_adapter_objects)
+    })
+    for setting in args.env:
+        name, _, value = setting.partition("=")
+        env[name] = value
+    return env
+
+
+def wait_until(condition, timeout: float, interval: float = 0.1):
+    """ Waits until condition returns a true value, and returns the value, or None after timeout seconds """
+    end = time.monotonic() + timeout
+    while True:
+        result = condition()
+        if result or time.monotonic() >= end:
+            return result or None
+        time.sleep(interval)
+
+
+def run(args, directory: str):
+    """ Runs the benchmark in a directory, and returns the report """
+    rng = np.random.default_rng(args.seed)
+    deep_lynx = FakeDeepLynx("DIAMOND", ["Sensors"],
+                             directory=os.path.join(directory, "deep_lynx"),
+                             latency=args.deep_lynx_latency_ms / 1000,
+                             remote_files=args.remote_files)
+    deep_lynx_url = deep_lynx.start(args.host)
+    sensors = deep_lynx.data_source("Sensors")
+
+    # The synthetic files are created before the load, so that creating them does not slow down the events
+    events = args.events or int(args.rate * args.duration)
+    files = list()
+    for index in range(events):
+        content, last_sample = sensor_file(index, args.rows, args.columns, rng)
+        file_id = deep_lynx.add_file(sensors["id"], "sensors_{0:06d}.csv".format(index), content)
+        files.append((file_id, last_sample))
+
+    os.makedirs(os.path.join(directory, "notebooks"))
+    os.makedirs(os.path.join(directory, "data"))
+    write_notebook(os.path.join(directory, "notebooks", "variable_selection.ipynb"),
+                   VARIABLE_SELECTION_NOTEBOOK.format(directory=directory))
+    write_notebook(os.path.join(directory, "notebooks", "model.ipynb"), MODEL_NOTEBOOK.format(directory=directory))
+    with open(os.path.join(directory, "data", "metadata.json"), "w") as fp:
+        json.dump([{"source": "benchmark"}], fp)
+    shutil.copy(os.path.join(REPOSITORY, ".env_sample"), os.path.join(directory, ".env"))
+
+    port = free_port(args.host)
+    http = urllib3.PoolManager(maxsize=args.senders)
+    base_url = "http://{0}:{1}".format(args.host, port)
+    log = open(os.path.join(directory, "adapter.out"), "w")
+    process = subprocess.Popen([sys.executable, "-c", SERVE_SCRIPT],
+                               cwd=directory,
+                               env=adapter_environment(args, directory, deep_lynx_url, port),
+                               stdout=log,
+                               stderr=subprocess.STDOUT)
+    memory = ProcessMemory(process.pid).start()
+    try:
+        start = time.monotonic()
+
+        def ready():
+            try:
+                return http.request("GET", base_url + "/machinelearning/ready", retries=False).status == 200
+            except urllib3.exceptions.HTTPError:
+                return process.poll() is not None
+
+        if not wait_until(ready, args.startup_timeout) or process.poll() is not None:
+            raise RuntimeError("the ML Adapter did not start, see {0}".format(log.name))
+        startup_seconds = time.monotonic() - start
+        # Events are sent to the destination the ML Adapter registered, as by Deep Lynx
+        actions = wait_until(lambda: list(deep_lynx.event_actions.values()), args.startup_timeout)
+        destination = actions[0]["destination"] if actions else base_url + "/machinelearning"
+
+        results = [None] * events
+
+        def send(index: int):
+            file_id, _ = files[index]
+            body = {
+                "containerID": deep_lynx.container["id"],
+                "dataSourceID": sensors["id"],
+                "eventType": "file_created",
+                "query": {
+                    "fileID": file_id
+                }
+            }
+            sent = time.time()
+            try:
+                response = http.request("POST",
+                                        destination,
+                                        body=json.dumps(body).encode(),
+                                        headers={"Content-Type": "application/json"},
+                                        retries=False)
+                status, job_id = response.status, None
+                if status == 202:
+                    job_id = json.loads(response.data)["job_id"]
+            except urllib3.exceptions.HTTPError:
+                status, job_id = None, None
+            results[index] = {"sent": sent, "seconds": time.time() - sent, "status": status, "job_id": job_id}
+
+        # Open loop: the events are sent on schedule, by as many senders as are needed to keep up
+        load_start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=args.senders, thread_name_prefix="sender") as senders:
+            for index in range(events):
+                delay = load_start + index / args.rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                senders.submit(send, index)
+        load_seconds = time.monotonic() - load_start
+
+        # Wait for the model trained on the rows of the last accepted event
+        accepted = [index for index, result in enumerate(results) if result["status"] == 202]
+        last_sample = files[accepted[-1]][1] if accepted else None
+
+        def imported():
+            return last_sample is None or any(model_import["last_sample"] >= last_sample
+                                              for model_import in model_imports(deep_lynx))
+
+        drained = wait_until(imported, args.drain_timeout, interval=0.25) is not None
+
+        jobs = list()
+        for index in accepted:
+            response = http.request("GET", base_url + "/machinelearning/jobs/" + results[index]["job_id"])
+            jobs.append(json.loads(response.data) if response.status == 200 else None)
+        metrics = http.request("GET", base_url + "/metrics").data.decode()
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        memory.stop()
+        log.close()
+        deep_lynx.stop()
+
+    # Every accepted event is matched to the first model imported after its rows were trained on
+    imports = model_imports(deep_lynx)
+    import_latencies = list()
+    for index in accepted:
+        sample = files[index][1]
+        times = [model_import["time"] for model_import in imports if model_import["last_sample"] >= sample]
+        if times:
+            import_latencies.append(min(times) - results[index]["sent"])
+
+    statuses = dict()
+    for result in results:
+        statuses[str(result["status"])] = statuses.get(str(result["status"]), 0) + 1
+    finished = [job for job in jobs if job is not None and job["status"] == "done"]
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {
+        "settings": {
+            "rate": args.rate,
+            "events": events,
+            "rows": args.rows,
+            "columns": args.columns,
+            "queue_length": args.queue_length,
+            "remote_files": args.remote_files,
+            "deep_lynx_latency_ms": args.deep_lynx_latency_ms,
+            "env": args.env
+        },
+        "startup_seconds": startup_seconds,
+        "load_seconds": load_seconds,
+        "statuses": statuses,
+        "accepted_per_second": len(accepted) / load_seconds if load_seconds > 0 else 0.0,
+        "ingested": len(finished),
+        "failed": len([job for job in jobs if job is not None and job["status"] == "failed"]),
+        "drained": drained,
+        "event_request_seconds": percentiles([result["seconds"] for result in results if result["status"]]),
+        "ingest_seconds": percentiles([job["finished_at"] - job["submitted_at"] for job in finished]),
+        "event_to_model_import_seconds": percentiles(import_latencies),
+        "model_imports": len(imports),
+        "training_cycles": metric_value(metrics, "ml_adapter_cycles_total"),
+        "deep_lynx_calls": dict(deep_lynx.calls),
+        "peak_rss_mb": memory.peak_process / 1024 if memory.peak_process else children / 1024,
+        "peak_rss_with_kernels_mb": memory.peak_total / 1024 if memory.peak_total else None
+    }
+
+
+def model_imports(deep_lynx: FakeDeepLynx):
+    """
+    Returns the time and the last trained sample of every model result file uploaded to the stand-in, or imported into
+    it with IMPORT_MODE=manual
+    """
+    imports = list()
+    for record in list(deep_lynx.uploads) + list(deep_lynx.imports):
+        if "last_sample" not in record:
+            try:
+                if "path" in record:
+                    samples = pd.read_csv(record["path"])["last_sample"]
+                else:
+                    samples = pd.DataFrame(record["body"])["last_sample"]
+                record["last_sample"] = int(samples.max())
+            except (OSError, KeyError, ValueError, TypeError):
+                record["last_sample"] = -1
+        imports.append(record)
+    return imports
+
+
+def metric_value(metrics: str, name: str):
+    """ Returns the value of a metric without labels in the Prometheus text format, or None """
+    for line in metrics.splitlines():
+        if line.startswith(name + " "):
+            return float(line.split()[1])
+    return None
+
+
+def print_report(report: dict):
+    settings = report["settings"]
+    print('Offered {0} events of {1} rows at {2:.1f} events/s in {3:.1f} s (ML Adapter started in {4:.2f} s)'.format(
+        settings["events"], settings["rows"], settings["rate"], report["load_seconds"], report["startup_seconds"]))
+    print('Responses: {0}'.format(", ".join("{0}: {1}".format(status, count)
+                                            for status, count in sorted(report["statuses"].items()))))
+    print('Accepted: {0:.1f} events/s. Ingested {1}, failed {2}'.format(report["accepted_per_second"],
+                                                                        report["ingested"], report["failed"]))
+    for name in ["event_request_seconds", "ingest_seconds", "event_to_model_import_seconds"]:
+        values = report[name]
+        if values["count"]:
+            print('{0:<32} p50 {1:8.3f} s  p90 {2:8.3f} s  p99 {3:8.3f} s  max {4:8.3f} s  ({5} events)'.format(
+                name, values["p50"], values["p90"], values["p99"], values["max"], values["count"]))
+        else:
+            print('{0:<32} no events'.format(name))
+    print('Model imports: {0}, training cycles: {1}{2}'.format(
+        report["model_imports"], report["training_cycles"],
+        "" if report["drained"] else " (the last event was not trained on before --drain-timeout)"))
+    print('Peak RSS: {0:.1f} MB, with Jupyter kernels {1}'.format(
+        report["peak_rss_mb"],
+        "{0:.1f} MB".format(report["peak_rss_with_kernels_mb"]) if report["peak_rss_with_kernels_mb"] else "n/a"))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmarks the ML Adapter end to end against a stand-in for Deep Lynx')
+    parser.add_argument('--rate', type=float, default=10, help='the number of events per second')
+    parser.add_argument('--duration', type=float, default=30, help='the number of seconds events are sent')
+    parser.add_argument('--events', type=int, default=None, help='the number of events, defaults to rate * duration')
+    parser.add_argument('--rows', type=int, default=100, help='the number of rows of every file')
+    parser.add_argument('--columns', type=int, default=4, help='the number of sensor readings of a row')
+    parser.add_argument('--queue-length', type=int, default=600, help='QUEUE_LENGTH of the ML Adapter')
+    parser.add_argument('--senders', type=int, default=16, help='the number of events in progress at once')
+    parser.add_argument('--remote-files', action='store_true', help='download files instead of reading them')
+    parser.add_argument('--deep-lynx-latency-ms', type=float, default=0, help='the milliseconds of a Deep Lynx call')
+    parser.add_argument('--env',
+                        action='append',
+                        default=list(),
+                        help='a setting of the ML Adapter e.g. EVENT_WORKERS=8, repeatable')
+    parser.add_argument('--host', default='127.0.0.1', help='the host of the ML Adapter and the stand-in')
+    parser.add_argument('--startup-timeout', type=float, default=60, help='the seconds to wait for the ML Adapter')
+    parser.add_argument('--drain-timeout',
+                        type=float,
+                        default=120,
+                        help='the seconds to wait for the model of the last event after the load')
+    parser.add_argument('--seed', type=int, default=1, help='the random seed of the sensor data')
+    parser.add_argument('--output', default=None, help='a .json file of the report, e.g. to compare runs')
+    parser.add_argument('--keep', action='store_true', help='keep the directory of the run, e.g. for MLAdapter.log')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="ml_adapter_end_to_end_")
+    try:
+        report = run(args, directory)
+    finally:
+        if args.keep:
+            print('The files of the run are in {0}'.format(directory))
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(report, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
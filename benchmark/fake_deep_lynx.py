@@ -0,0 +1,441 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+"""
+A local stand-in for the parts of the Deep Lynx API used by the ML Adapter, so that the ML Adapter can be run and
+benchmarked without a Deep Lynx: containers, data sources, event actions, file information, download and upload,
+manual imports and metatypes. Every object is kept in memory, and files are stored in a directory
+
+    python -m benchmark.fake_deep_lynx --port 8090 --data-source Sensors --file data/example/query_file.csv
+
+With DEEP_LYNX_URL=http://127.0.0.1:8090 and an empty DEEP_LYNX_API_KEY, the ML Adapter initializes and registers for
+events against the stand-in. See benchmark/end_to_end.py for a load benchmark of the ML Adapter
+"""
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import collections
+from datetime import datetime, timezone
+from flask import Flask, request, Response, json, send_file
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+
+class FakeDeepLynx():
+    """
+    An in-memory Deep Lynx of a single container
+
+        1. Serves the routes of the Deep Lynx API called by the ML Adapter with the JSON objects of Deep Lynx, so that
+           the responses are read by the deep_lynx package as they are from Deep Lynx, see app
+        2. Stores the files of add_file and of uploads in directory. The information of a file points to its path in
+           directory, so the ML Adapter reads it from the file system, or to a path that does not exist with
+           remote_files, so the ML Adapter downloads it
+        3. Records the time and the file or nodes of every upload and manual import, and the number of calls of every
+           route, for benchmarks
+
+    Args
+        container_name (string): the name of the container e.g. CONTAINER_NAME
+        data_sources (list): the names of the data sources created with the container e.g. DATA_SOURCES
+        directory (string): the directory of the stored files, defaults to a temporary directory
+        latency (float): the number of seconds every call waits before it is answered, to mimic a remote Deep Lynx
+        remote_files (boolean): whether files are downloaded by the ML Adapter instead of read from directory
+        api_key (string): the api key of the token route, or None if calls are not authenticated
+        api_secret (string): the api secret of the token route
+    """
+
+    def __init__(self,
+                 container_name: str = "DIAMOND",
+                 data_sources: list = None,
+                 directory: str = None,
+                 latency: float = 0.0,
+                 remote_files: bool = False,
+                 api_key: str = None,
+                 api_secret: str = None):
+        self.directory = directory or tempfile.mkdtemp(prefix="fake_deep_lynx_")
+        self.latency = latency
+        self.remote_files = remote_files
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.tokens = set()
+        self.data_sources = dict()
+        self.files = dict()
+        self.event_actions = dict()
+        self.metatypes = dict()
+        # The uploads and manual imports received, in the order they were received
+        self.uploads = list()
+        self.imports = list()
+        self.calls = collections.Counter()
+        self._ids = 0
+        self._lock = threading.Lock()
+        self._server = None
+        os.makedirs(os.path.join(self.directory, "files"), exist_ok=True)
+        os.makedirs(os.path.join(self.directory, "uploads"), exist_ok=True)
+
+        self.container = self._base({"name": container_name, "description": container_name, "config": None})
+        for name in data_sources or list():
+            self.add_data_source(name)
+
+    def _next_id(self):
+        with self._lock:
+            self._ids += 1
+            return str(self._ids)
+
+    def _base(self, fields: dict):
+        """ Returns a Deep Lynx object with an id and the creation and modification fields """
+        now = _timestamp()
+        return dict(fields,
+                    id=self._next_id(),
+                    created_at=now,
+                    modified_at=now,
+                    created_by="fake_deep_lynx",
+                    modified_by="fake_deep_lynx")
+
+    def add_data_source(self, name: str, adapter_type: str = "standard", active: bool = True):
+        """ Creates a data source of the container, and returns it """
+        data_source = self._base({
+            "name": name,
+            "adapter_type": adapter_type,
+            "active": active,
+            "container_id": self.container["id"],
+            "status": "ready",
+            "config": None,
+            "data_format": None,
+            "archived": False,
+            "status_message": None
+        })
+        with self._lock:
+            self.data_sources[data_source["id"]] = data_source
+        return data_source
+
+    def data_source(self, name: str):
+        """ Returns the data source of a name, or None """
+        with self._lock:
+            return next((source for source in self.data_sources.values() if source["name"] == name), None)
+
+    def add_file(self, data_source_id: str, file_name: str, content: bytes = None, path: str = None):
+        """
+        Stores a file of a data source, and returns the id of the file
+
+        Args
+            data_source_id (string): the id of the data source of the file
+            file_name (string): the name of the file
+            content (bytes): the content of the file
+            path (string): a file to copy instead of content
+        """
+        file_id = self._next_id()
+        directory = os.path.join(self.directory, "files", file_id)
+        os.makedirs(directory)
+        stored = os.path.join(directory, file_name)
+        if path is not None:
+            shutil.copyfile(path, stored)
+        else:
+            with open(stored, "wb") as fp:
+                fp.write(content or b"")
+        info = self._base({
+            "file_name": file_name,
+            "file_size": float(os.path.getsize(stored)),
+            "adapter_file_path": directory + os.sep,
+            "adapter": "filesystem",
+            "data_source_id": data_source_id,
+            "container_id": self.container["id"],
+            "metadata": {},
+            "md5hash": None,
+            "short_uuid": None
+        })
+        info["id"] = file_id
+        with self._lock:
+            self.files[file_id] = info
+        return file_id
+
+    def add_metatype(self, name: str, keys: list = None):
+        """
+        Creates a metatype of the container, and returns it
+
+        Args
+            name (string): the name of the metatype
+            keys (list): the keys of the metatype e.g. [{"property_name": "rmse", "data_type": "float", "required": True}]
+        """
+        metatype = self._base({
+            "name": name,
+            "description": name,
+            "container_id": self.container["id"],
+            "archived": False
+        })
+        metatype["keys"] = [
+            self._base(
+                dict(
+                    {
+                        "name": key["property_name"],
+                        "description": key["property_name"],
+                        "required": False,
+                        "options": None,
+                        "default_value": None,
+                        "validation": None,
+                        "archived": False
+                    },
+                    metatype_id=metatype["id"],
+                    **key)) for key in keys or list()
+        ]
+        with self._lock:
+            self.metatypes[metatype["id"]] = metatype
+        return metatype
+
+    def app(self):
+        """ Returns the Flask application of the Deep Lynx routes """
+        app = Flask(__name__)
+
+        @app.before_request
+        def before_request():
+            with self._lock:
+                self.calls[request.endpoint] += 1
+            if self.latency > 0:
+                time.sleep(self.latency)
+            if self.api_key and request.endpoint != "token":
+                if request.headers.get("Authorization", "").replace("Bearer ", "", 1) not in self.tokens:
+                    return error(401, "unauthorized")
+
+        @app.route('/oauth/token', methods=['GET'])
+        def token():
+            if self.api_key and (request.headers.get("x-api-key") != self.api_key
+                                 or request.headers.get("x-api-secret") != self.api_secret):
+                return error(401, "invalid api key or secret")
+            token = "token" + self._next_id()
+            with self._lock:
+                self.tokens.add(token)
+            return Response(json.dumps(token), status=200, mimetype='application/json')
+
+        @app.route('/containers', methods=['GET'])
+        def list_containers():
+            return value([self.container])
+
+        @app.route('/containers/<container_id>/import/datasources', methods=['GET'])
+        def list_data_sources(container_id):
+            self._container(container_id)
+            with self._lock:
+                return value(list(self.data_sources.values()))
+
+        @app.route('/containers/<container_id>/import/datasources', methods=['POST'])
+        def create_data_source(container_id):
+            self._container(container_id)
+            body = request.get_json(force=True)
+            return value(
+                self.add_data_source(body["name"],
+                                     body.get("adapter_type") or "standard", bool(body.get("active"))))
+
+        @app.route('/containers/<container_id>/files/<file_id>', methods=['GET'])
+        def retrieve_file(container_id, file_id):
+            info = dict(self._file(container_id, file_id))
+            if self.remote_files:
+                # A path on another host, so the file is downloaded
+                info["adapter_file_path"] = "/fake_deep_lynx/files/" + file_id + "/"
+            return value(info)
+
+        @app.route('/containers/<container_id>/files/<file_id>/download', methods=['GET'])
+        def download_file(container_id, file_id):
+            info = self._file(container_id, file_id)
+            return send_file(info["adapter_file_path"] + info["file_name"],
+                             mimetype='text/csv',
+                             as_attachment=True,
+                             download_name=info["file_name"])
+
+        @app.route('/containers/<container_id>/import/datasources/<data_source_id>/files', methods=['POST'])
+        def upload_file(container_id, data_source_id):
+            self._data_source(container_id, data_source_id)
+            files = list()
+            for upload in request.files.getlist("file"):
+                path = os.path.join(self.directory, "uploads",
+                                    self._next_id() + "_" + os.path.basename(upload.filename))
+                upload.save(path)
+                info = self._base({
+                    "file_name": os.path.basename(upload.filename),
+                    "file_size": float(os.path.getsize(path)),
+                    "adapter_file_path": os.path.dirname(path) + os.sep,
+                    "adapter": "filesystem",
+                    "data_source_id": data_source_id,
+                    "container_id": container_id
+                })
+                files.append(info)
+                with self._lock:
+                    self.uploads.append({"time": time.time(), "data_source_id": data_source_id, "path": path})
+            return value(files)
+
+        @app.route('/containers/<container_id>/import/datasources/<data_source_id>/imports', methods=['POST'])
+        def create_manual_import(container_id, data_source_id):
+            self._data_source(container_id, data_source_id)
+            body = request.get_json(force=True)
+            nodes = len(body) if isinstance(body, list) else 1
+            with self._lock:
+                self.imports.append({
+                    "time": time.time(),
+                    "data_source_id": data_source_id,
+                    "nodes": nodes,
+                    "body": body
+                })
+            return value({"id": self._next_id(), "nodes": nodes})
+
+        @app.route('/event_actions', methods=['GET'])
+        def list_event_actions():
+            with self._lock:
+                return value(list(self.event_actions.values()))
+
+        @app.route('/event_actions', methods=['POST'])
+        def create_event_action():
+            body = request.get_json(force=True)
+            action = self._base({
+                "container_id": body.get("container_id"),
+                "data_source_id": body.get("data_source_id"),
+                "event_type": body.get("event_type"),
+                "action_type": body.get("action_type"),
+                "action_config": body.get("action_config"),
+                "destination": body.get("destination"),
+                "destination_data_source_id": body.get("destination_data_source_id"),
+                "active": bool(body.get("active")),
+                "deleted_at": None
+            })
+            with self._lock:
+                self.event_actions[action["id"]] = action
+            return value(action)
+
+        @app.route('/containers/<container_id>/metatypes', methods=['GET'])
+        def list_metatypes(container_id):
+            self._container(container_id)
+            # The name is matched as a pattern, as by Deep Lynx
+            name = (request.args.get("name") or "").lower()
+            keys = request.args.get("loadKeys") == "true"
+            with self._lock:
+                metatypes = [
+                    dict(metatype, keys=metatype["keys"] if keys else None) for metatype in self.metatypes.values()
+                    if name in metatype["name"].lower()
+                ]
+            return value(metatypes)
+
+        @app.route('/containers/<container_id>/metatypes/<metatype_id>/keys', methods=['GET'])
+        def list_metatypes_keys(container_id, metatype_id):
+            return value(self._metatype(container_id, metatype_id)["keys"])
+
+        @app.route('/containers/<container_id>/metatypes/<metatype_id>', methods=['POST'])
+        def validate_metatype_properties(container_id, metatype_id):
+            metatype = self._metatype(container_id, metatype_id)
+            properties = request.get_json(force=True) or dict()
+            errors = [
+                "missing required property {0}".format(key["property_name"]) for key in metatype["keys"]
+                if key["required"] and properties.get(key["property_name"]) is None
+            ]
+            return Response(json.dumps({
+                "value": errors or "success",
+                "isError": bool(errors)
+            }),
+                            status=200,
+                            mimetype='application/json')
+
+        @app.errorhandler(LookupError)
+        def not_found(exception):
+            return error(404, str(exception.args[0]) if exception.args else "not found")
+
+        return app
+
+    def _container(self, container_id: str):
+        if container_id != self.container["id"]:
+            raise LookupError("container {0} not found".format(container_id))
+
+    def _data_source(self, container_id: str, data_source_id: str):
+        self._container(container_id)
+        with self._lock:
+            if data_source_id not in self.data_sources:
+                raise LookupError("data source {0} not found".format(data_source_id))
+            return self.data_sources[data_source_id]
+
+    def _file(self, container_id: str, file_id: str):
+        self._container(container_id)
+        with self._lock:
+            if file_id not in self.files:
+                raise LookupError("file {0} not found".format(file_id))
+            return self.files[file_id]
+
+    def _metatype(self, container_id: str, metatype_id: str):
+        self._container(container_id)
+        with self._lock:
+            if metatype_id not in self.metatypes:
+                raise LookupError("metatype {0} not found".format(metatype_id))
+            return self.metatypes[metatype_id]
+
+    def start(self, host: str = "127.0.0.1", port: int = 0):
+        """
+        Serves the routes in a background thread without logging every request
+
+        Args
+            host (string): the host of the server
+            port (integer): the port of the server, 0 for a free port
+        Return
+            url (string): the url of the server e.g. DEEP_LYNX_URL
+        """
+        self._server = make_server(host, port, self.app(), threaded=True, request_handler=QuietRequestHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="fake_deep_lynx").start()
+        return self.url
+
+    @property
+    def url(self):
+        return "http://{0}:{1}".format(self._server.host, self._server.port) if self._server else None
+
+    def stop(self):
+        """ Stops the server started by start """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """ Does not log every request, which would slow down a benchmark and hide its report """
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def value(data):
+    """ Returns a successful Deep Lynx response of a value """
+    return Response(json.dumps({"value": data, "isError": False}), status=200, mimetype='application/json')
+
+
+def error(status: int, message: str):
+    """ Returns a failed Deep Lynx response """
+    return Response(json.dumps({"error": message, "isError": True}), status=status, mimetype='application/json')
+
+
+def _timestamp():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serves a local stand-in for the Deep Lynx API of the ML Adapter')
+    parser.add_argument('--host', default='127.0.0.1', help='the host of the server')
+    parser.add_argument('--port', type=int, default=8090, help='the port of the server e.g. of DEEP_LYNX_URL')
+    parser.add_argument('--container', default='DIAMOND', help='the name of the container e.g. CONTAINER_NAME')
+    parser.add_argument('--data-source',
+                        action='append',
+                        default=list(),
+                        help='the name of a data source to create e.g. of DATA_SOURCES, repeatable')
+    parser.add_argument('--file', action='append', default=list(), help='a file of the first data source, repeatable')
+    parser.add_argument('--directory', default=None, help='the directory of the stored files')
+    parser.add_argument('--latency-ms', type=float, default=0, help='the milliseconds every call waits')
+    parser.add_argument('--remote-files', action='store_true', help='make the ML Adapter download the files')
+    args = parser.parse_args()
+
+    deep_lynx = FakeDeepLynx(args.container,
+                             args.data_source,
+                             directory=args.directory,
+                             latency=args.latency_ms / 1000,
+                             remote_files=args.remote_files)
+    data_sources = list(deep_lynx.data_sources.values())
+    for path in args.file:
+        if not data_sources:
+            parser.error('--file requires a --data-source')
+        file_id = deep_lynx.add_file(data_sources[0]["id"], os.path.basename(path), path=path)
+        print('File {0}: id {1}'.format(path, file_id))
+    print('Container {0}: id {1}. Files are stored in {2}'.format(args.container, deep_lynx.container["id"],
+                                                                  deep_lynx.directory))
+    make_server(args.host, args.port, deep_lynx.app(), threaded=True).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
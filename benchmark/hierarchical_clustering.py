@@ -0,0 +1,61 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+"""
+Benchmarks the hierarchical clustering split on random data
+
+    python -m benchmark.hierarchical_clustering --samples 10000 --features 8
+"""
+
+import time
+import argparse
+import resource
+import numpy as np
+import pandas as pd
+
+from split.minimax_linkage import CondensedDistance, minimax_linkage
+from split.hierarchical_clustering import get_clusters, prune_clusters, assign_clusters, get_training_testing_sets
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the hierarchical clustering split on random data')
+    parser.add_argument('--samples', type=int, default=10000, help='the number of clustered samples (N)')
+    parser.add_argument('--rows', type=int, default=None, help='the number of dataset rows, defaults to samples')
+    parser.add_argument('--features', type=int, default=8, help='the number of numeric columns')
+    parser.add_argument('--max-clusters', type=int, default=10, help='the maximum number of clusters')
+    parser.add_argument('--test-size', type=float, default=0.2, help='the decimal percentage of the testing set')
+    parser.add_argument('--seed', type=int, default=1, help='the random seed of the dataset')
+    args = parser.parse_args()
+
+    rows = max(args.rows or args.samples, args.samples)
+    rng = np.random.default_rng(args.seed)
+    dataset = pd.DataFrame(rng.normal(size=(rows, args.features)),
+                           columns=['x{0}'.format(i) for i in range(args.features)])
+    X = dataset.sample(n=args.samples, random_state=1)
+
+    timings = dict()
+    start = time.perf_counter()
+    dist = CondensedDistance(X.to_numpy())
+    timings['distances'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    linkage = minimax_linkage(dist)
+    timings['linkage'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    clusters = get_clusters(linkage, args.max_clusters)
+    pruned_clusters, prototype_ids = prune_clusters(clusters)
+    assignments = assign_clusters(dataset.to_numpy(), X.index.tolist(), pruned_clusters)
+    training_set, testing_set = get_training_testing_sets(dataset, dist, prototype_ids, assignments, args.test_size)
+    timings['cut and assign'] = time.perf_counter() - start
+
+    print('samples: {0}, rows: {1}, features: {2}'.format(args.samples, rows, args.features))
+    for stage, seconds in timings.items():
+        print('{0:>16}: {1:8.2f} s'.format(stage, seconds))
+    print('{0:>16}: {1:8.2f} s'.format('total', sum(timings.values())))
+    print('{0:>16}: {1:8.1f} MB'.format('distances', dist.values.nbytes / 2**20))
+    print('{0:>16}: {1:8.1f} MB'.format('peak rss', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+    print('clusters: {0}, training rows: {1}, testing rows: {2}'.format(len(pruned_clusters), len(training_set),
+                                                                        len(testing_set)))
+
+
+if __name__ == '__main__':
+    main()
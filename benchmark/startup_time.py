@@ -0,0 +1,85 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+"""
+Measures the startup time of the ML Adapter: the import of the adapter package, and the time until the HTTP server
+answers the readiness endpoint while Deep Lynx is initialized in the background
+
+    python -m benchmark.startup_time --runs 5
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in a fresh interpreter, so that no module is imported before the measurement
+IMPORT_SCRIPT = """
+import time
+start = time.perf_counter()
+import adapter
+print(time.perf_counter() - start)
+"""
+
+SERVE_SCRIPT = """
+import os, sys, json, time
+start = time.perf_counter()
+from dotenv import load_dotenv
+load_dotenv(".env")
+import adapter
+app = adapter.create_app()
+response = app.test_client().get("/machinelearning/ready")
+print(json.dumps({"seconds": time.perf_counter() - start, "status": response.status_code}))
+"""
+
+
+def run(script: str, directory: str, env: dict):
+    """ Runs a script in a new interpreter and returns its last line of output """
+    result = subprocess.run([sys.executable, "-c", script],
+                            cwd=directory,
+                            env=env,
+                            capture_output=True,
+                            text=True,
+                            check=True)
+    return result.stdout.strip().splitlines()[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures the startup time of the ML Adapter')
+    parser.add_argument('--runs', type=int, default=5, help='the number of measurements')
+    parser.add_argument('--deep-lynx-url',
+                        default='http://127.0.0.1:9',
+                        help='the url of Deep Lynx, unreachable by default since the server must not wait for it')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="ml_adapter_startup_")
+    try:
+        shutil.copy(os.path.join(REPOSITORY, ".env_sample"), os.path.join(directory, ".env"))
+        env = dict(os.environ)
+        env.update({
+            "PYTHONPATH": REPOSITORY,
+            "FLASK_APP": "adapter",
+            "FLASK_RUN_HOST": "127.0.0.1",
+            "FLASK_RUN_PORT": "5000",
+            "WERKZEUG_RUN_MAIN": "true",
+            "DEEP_LYNX_URL": args.deep_lynx_url,
+            "DEEP_LYNX_RETRIES": "0",
+        })
+
+        imports = [float(run(IMPORT_SCRIPT, directory, env)) for _ in range(args.runs)]
+        serves = [json.loads(run(SERVE_SCRIPT, directory, env)) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print('import adapter:          median {0:.3f} s, max {1:.3f} s'.format(np.median(imports), max(imports)))
+    seconds = [serve["seconds"] for serve in serves]
+    print('create_app to /ready:    median {0:.3f} s, max {1:.3f} s (status {2})'.format(
+        np.median(seconds), max(seconds), serves[-1]["status"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,5 @@
 # Copyright 2021, Battelle Energy Alliance, LLC
 
 from .ml_model import ML_Model
+from .model_scheduler import ModelScheduler, get_model_scheduler
+from .training_history import TrainingHistory, TrainingPlan
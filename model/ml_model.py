@@ -1,11 +1,19 @@
 # Copyright 2021, Battelle Energy Alliance, LLC
 
 import os
+import copy
 import json
 import pandas as pd
 
 import utils
 import settings
+from .training_history import TrainingPlan
+
+# Files of the MODEL key in an ML Adapter object that are written to the working directory of a model
+MODEL_FILES = ["output_file", "model_serialization_file", "standardization_file"]
+
+# Files of the rows appended to and evicted from the training set since the previous training of an incremental model
+DELTA_FILES = ['X_appended.csv', 'X_evicted.csv', 'y_appended.csv', 'y_evicted.csv']
 
 
 class ML_Model():
@@ -13,17 +21,46 @@ class ML_Model():
     Split into predictors/response for the training and testing datasets that are used by the Jupyter Notebook to create a machine learning model
 
         1. Select independent and dependent variables from the training and testing set
-        2. Creates .csv files of the predictors/response for the training and testing sets e.g. X_train.csv, X_test.csv, y_train.csv, y_test.csv
+        2. Creates .csv files of the predictors/response for the training and testing sets e.g. X_train.csv, X_test.csv, y_train.csv, y_test.csv,
+           or with DATASET_HANDOFF=npy, a JSON file of the variables that utils.load_model_sets maps from the .npy training and testing sets
         3. Run the customized machine learning Jupyter Notebook
-    
+
+    Args
+        independent_variables (list): the names of the independent variables (Features, X, Predictors)
+        dependent_variables (list): the names of the dependent variables (Response, y, Label)
+        training_set (DataFrame): the training set loaded once by the ML Adapter. If None, the TRAINING_SET file of the
+            ML Adapter object (data/training_set.csv) is read
+        testing_set (DataFrame): the testing set loaded once by the ML Adapter. If None, the TESTING_SET file of the
+            ML Adapter object (data/testing_set.csv) is read
+        directory (string): the working directory of the model. A directory other than data isolates the files of the
+            model so that models run concurrently, see isolate
+        pool (KernelPool): the kernel pool to run the Jupyter Notebook on, defaults to the kernel pool of the process
+        data (dictionary): the ML Adapter object of the run. If None, the ML_ADAPTER_OBJECT_LOCATION file is read
+        plan (TrainingPlan): how the model is trained, defaults to the full training set. An incremental plan adds the
+            previous model serialization file to the ML Adapter object of the model and creates the .csv files of the
+            changed rows, see create_delta_files
     Return
         Generates a machine learning serialized model and ML results
 
     """
 
-    def __init__(self, independent_variables, dependent_variables):
+    def __init__(self,
+                 independent_variables,
+                 dependent_variables,
+                 training_set=None,
+                 testing_set=None,
+                 directory="data",
+                 pool=None,
+                 data=None,
+                 plan=None):
         self.independent_variables = independent_variables
         self.dependent_variables = dependent_variables
+        self.training_set = training_set
+        self.testing_set = testing_set
+        self.directory = directory
+        self.pool = pool
+        self.data = data
+        self.plan = plan or TrainingPlan()
 
         self.create_model()
 
@@ -31,16 +68,99 @@ class ML_Model():
         """
         Creates a machine learning model and produces ML results
         """
-        # Preprocess data
-        training_path = os.path.abspath(os.path.join("data", "training_set.csv"))
-        utils.validate_extension('.csv', training_path)
-        utils.validate_paths_exist(training_path)
-        training_set = pd.read_csv(training_path, 'r', delimiter=',')
+        if self.data is None:
+            with open(os.getenv("ML_ADAPTER_OBJECT_LOCATION"), 'r') as fp:
+                self.data = json.load(fp)
+        data = self.data
+        isolated = os.path.abspath(self.directory) != os.path.abspath("data")
+        env = self.isolate(data) if isolated else None
+
+        if os.getenv("DATASET_HANDOFF", "csv") == "npy":
+            # The Jupyter Notebook maps the variables from the .npy training and testing sets
+            training_set_dir = utils.handoff.dataset_directory(self.training_set_file)
+            testing_set_dir = utils.handoff.dataset_directory(self.testing_set_file)
+            utils.validate_paths_exist(training_set_dir)
+            utils.validate_paths_exist(testing_set_dir)
+            utils.write_model_sets(self.independent_variables, self.dependent_variables, self.directory,
+                                   training_set_dir, testing_set_dir)
+        else:
+            self.create_csv_files()
+        if self.plan.mode == "incremental":
+            self.create_delta_files()
+
+        # Run the Jupyter Notebook
+        notebook = os.path.basename(data["MODEL"]["notebook"])
+        with utils.get_metrics_registry()["model_training_seconds"].time(notebook=notebook, mode=self.plan.mode):
+            utils.run_jupyter_notebook(data["MODEL"]["notebook"], data["MODEL"]["kernel"], env=env, pool=self.pool)
 
-        testing_path = os.path.abspath(os.path.join("data", "testing_set.csv"))
-        utils.validate_extension('.csv', testing_path)
-        utils.validate_paths_exist(testing_path)
-        testing_set = pd.read_csv(testing_path, 'r', delimiter=',')
+        # File clean up
+        file_names = [utils.handoff.MODEL_SETS_FILE, 'X_train.csv', 'X_test.csv', 'y_train.csv', 'y_test.csv']
+        for file_name in file_names + DELTA_FILES:
+            if os.path.exists(os.path.join(self.directory, file_name)):
+                os.remove(os.path.join(self.directory, file_name))
+        if not isolated and os.path.exists(data["VARIABLE_SELECTION"]["output_file"]):
+            os.remove(data["VARIABLE_SELECTION"]["output_file"])
+
+    def isolate(self, data: dict):
+        """
+        Writes a copy of the ML Adapter object to the working directory of the model, where the MODEL files e.g.
+        output_file are moved into the working directory
+
+        Args
+            data (dictionary): a single JSON object in the ML_ADAPTER_OBJECTS environment variable
+        Return
+            env (dictionary): the environment variables of the model Jupyter Notebook
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        data = copy.deepcopy(data)
+        for key in MODEL_FILES:
+            if data["MODEL"].get(key):
+                data["MODEL"][key] = os.path.join(self.directory, os.path.basename(data["MODEL"][key]))
+        data["MODEL_DIR"] = self.directory
+        data["MODEL"]["training_mode"] = self.plan.mode
+        data["MODEL"]["previous_model_serialization_file"] = None
+        if self.plan.previous_model:
+            data["MODEL"]["previous_model_serialization_file"] = os.path.abspath(self.plan.previous_model)
+
+        location = os.path.join(self.directory, utils.handoff.OBJECT_FILE)
+        with open(location, 'w') as fp:
+            json.dump(data, fp)
+
+        env = {"ML_ADAPTER_OBJECT_LOCATION": location, "MODEL_DIR": self.directory}
+        if data["MODEL"].get("output_file"):
+            env["IMPORT_FILE_NAME"] = data["MODEL"]["output_file"]
+        return env
+
+    @property
+    def training_set_file(self):
+        """ Returns the .csv file of the training set of the ML Adapter object """
+        return self.data.get("TRAINING_SET") or os.path.join("data", "training_set.csv")
+
+    @property
+    def testing_set_file(self):
+        """ Returns the .csv file of the testing set of the ML Adapter object """
+        return self.data.get("TESTING_SET") or os.path.join("data", "testing_set.csv")
+
+    def create_csv_files(self):
+        """
+        Creates .csv files of the predictors/response from the training and testing sets
+        """
+        # Only the variables of the model are read from the training and testing set files, which share the schema of
+        # the training set file
+        columns = list(self.independent_variables) + list(self.dependent_variables or list())
+        training_path = os.path.abspath(self.training_set_file)
+        training_set = self.training_set
+        if training_set is None:
+            utils.validate_extension('.csv', training_path)
+            utils.validate_paths_exist(training_path)
+            training_set = utils.read_csv(training_path, columns, dataset=training_path, delimiter=',')
+
+        testing_set = self.testing_set
+        if testing_set is None:
+            testing_path = os.path.abspath(self.testing_set_file)
+            utils.validate_extension('.csv', testing_path)
+            utils.validate_paths_exist(testing_path)
+            testing_set = utils.read_csv(testing_path, columns, dataset=training_path, delimiter=',')
 
         # Determine independent variables dataset (Features, X, Predictors)
         X_train = training_set[self.independent_variables]
@@ -57,23 +177,21 @@ class ML_Model():
         # Write X_train, X_test, y_train, y_test to .csv files
         self.create_training_testing_files(X_train, X_test, y_train, y_test)
 
-        # Run the Jupyter Notebook
-        print("Begin forecasting notebook")
-        with open(os.getenv("ML_ADAPTER_OBJECT_LOCATION"), 'r') as fp:
-            data = json.load(fp)
-        utils.run_jupyter_notebook(data["MODEL"]["notebook"], data["MODEL"]["kernel"])
-
-        # File clean up
-        if os.path.exists("data/X_train.csv"):
-            os.remove("data/X_train.csv")
-        if os.path.exists("data/X_test.csv"):
-            os.remove("data/X_test.csv")
-        if os.path.exists("data/y_train.csv"):
-            os.remove("data/y_train.csv")
-        if os.path.exists("data/y_test.csv"):
-            os.remove("data/y_test.csv")
-        if os.path.exists(data["VARIABLE_SELECTION"]["output_file"]):
-            os.remove(data["VARIABLE_SELECTION"]["output_file"])
+    def create_delta_files(self):
+        """
+        Creates .csv files of the predictors/response of the rows appended to and evicted from the training set since
+        the previous training of the model e.g. X_appended.csv, X_evicted.csv, y_appended.csv, y_evicted.csv
+        """
+        sets = {
+            'X_appended.csv': self.plan.appended[self.independent_variables],
+            'X_evicted.csv': self.plan.evicted[self.independent_variables]
+        }
+        # If supervised learning
+        if self.dependent_variables:
+            sets['y_appended.csv'] = self.plan.appended[self.dependent_variables]
+            sets['y_evicted.csv'] = self.plan.evicted[self.dependent_variables]
+        for file_name, subset in sets.items():
+            subset.to_csv(os.path.join(self.directory, file_name))
 
     def create_training_testing_files(self, X_train: pd.DataFrame or pd.Series, X_test: pd.DataFrame or pd.Series,
                                       y_train: pd.DataFrame or pd.Series, y_test: pd.DataFrame or pd.Series):
@@ -98,7 +216,7 @@ class ML_Model():
         # Validate extension and path existance before creation
         for path in paths:
             utils.validate_extension('.csv', path)
-        dir_path = os.path.abspath('data')
+        dir_path = os.path.abspath(self.directory)
         utils.validate_paths_exist(dir_path)
 
         # Write files to .csv file
@@ -0,0 +1,187 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import os
+import json
+import shutil
+import logging
+import threading
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+import utils
+from .ml_model import ML_Model
+from .training_history import TrainingHistory, TrainingPlan, FULL_REFIT_INTERVAL, row_hashes
+
+# Environment variables that limit the CPU threads of numerical libraries in a model kernel
+THREAD_VARIABLES = ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS"]
+
+model_scheduler = None
+model_scheduler_lock = threading.Lock()
+
+
+class ModelScheduler():
+    """
+    Runs the model Jupyter Notebooks of an ML Adapter object concurrently
+
+        1. Creates every ML_Model in its own working directory, so that models do not share the X_train.csv,
+           X_test.csv, y_train.csv, y_test.csv and ML Adapter object files
+        2. Runs up to workers model Jupyter Notebooks at once, each on its own kernel process whose numerical libraries
+           are limited to threads CPU threads
+        3. Collects the output file of every model into the output file of the ML Adapter object for a single import
+        4. With the MODEL incremental key of the ML Adapter object, hands every model the previous model and the rows
+           that changed since its previous training, see TrainingHistory
+
+    Args
+        workers (integer): the number of model Jupyter Notebooks run at once
+        threads (integer): the number of CPU threads of every model kernel (OMP_NUM_THREADS, MKL_NUM_THREADS, ...),
+            or None to leave the number of threads unset
+        max_uses (integer): the number of Jupyter Notebooks run on a model kernel before it is restarted
+    """
+
+    def __init__(self, workers: int = 1, threads: int = None, max_uses: int = 20):
+        self.workers = max(1, workers)
+        env = {name: str(threads) for name in THREAD_VARIABLES} if threads else dict()
+        self.pool = utils.KernelPool(size=self.workers, max_uses=max_uses, timeout=600, env=env)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="model")
+        self.history = TrainingHistory()
+
+    def run(self,
+            models: list,
+            data: dict,
+            training_set=None,
+            testing_set=None,
+            directory: str = "data/models",
+            name: str = None):
+        """
+        Creates the ML_Model objects of the variable selection output concurrently
+
+        A model that fails is logged and left out of the output file.
+
+        Args
+            models (list): the variable selection output e.g. [{"independent_variables": [], "dependent_variables": []}]
+            data (dictionary): a single JSON object in the ML_ADAPTER_OBJECTS environment variable
+            training_set (DataFrame): the training set loaded once by the ML Adapter
+            testing_set (DataFrame): the testing set loaded once by the ML Adapter
+            directory (string): the directory of the working directories of the models, which is removed afterwards
+            name (string): the name of the ML Adapter object, which keys the training history of its models
+        Return
+            ml_models (list): the ML_Model objects that succeeded, in the order of models
+            output_files (list): the files to import into Deep Lynx
+        """
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+
+        # Incremental training needs the training set to find the rows that changed since the previous training
+        incremental = bool(data["MODEL"].get("incremental")) and training_set is not None
+        interval = int(data["MODEL"].get("full_refit_interval", FULL_REFIT_INTERVAL))
+        hashes = row_hashes(training_set) if incremental else None
+
+        futures = list()
+        keys = list()
+        plans = list()
+        for i, variables in enumerate(models):
+            key = (name, tuple(variables["independent_variables"]), tuple(variables["dependent_variables"]))
+            plan = self.history.plan(key, training_set, hashes, interval) if incremental else TrainingPlan()
+            if plan.mode == "incremental":
+                logging.info('Model {0} of {1}: incremental training on {2} appended and {3} evicted rows'.format(
+                    i, name, plan.appended.shape[0], plan.evicted.shape[0]))
+            keys.append(key)
+            plans.append(plan)
+            future = self._executor.submit(ML_Model,
+                                           independent_variables=variables["independent_variables"],
+                                           dependent_variables=variables["dependent_variables"],
+                                           training_set=training_set,
+                                           testing_set=testing_set,
+                                           directory=os.path.join(directory, str(i)),
+                                           pool=self.pool,
+                                           data=data,
+                                           plan=plan)
+            futures.append(future)
+
+        ml_models = list()
+        for i, future in enumerate(futures):
+            try:
+                ml_model = future.result()
+                ml_models.append(ml_model)
+            except Exception:
+                logging.exception('Model {0} of {1} failed'.format(i, data.get("MODEL", {}).get("notebook")))
+                continue
+            if incremental:
+                model_file = data["MODEL"].get("model_serialization_file")
+                if model_file:
+                    model_file = os.path.join(ml_model.directory, os.path.basename(model_file))
+                self.history.update(keys[i], plans[i], training_set, hashes, model_file)
+
+        output_files = collect_model_files(ml_models, data)
+        shutil.rmtree(directory, ignore_errors=True)
+        return ml_models, output_files
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        self.pool.shutdown()
+
+
+def collect_model_files(ml_models: list, data: dict):
+    """
+    Moves the files of the models from their working directories to the MODEL files of the ML Adapter object
+
+    The output files of the models are combined into the MODEL output_file: .csv files are concatenated and .json
+    files are combined into a JSON list. Other output files are moved next to the MODEL output_file with the index of
+    the model in their name. The model serialization and standardization files of the last model are kept, as when
+    models ran one after the other.
+
+    Args
+        ml_models (list): the ML_Model objects that succeeded
+        data (dictionary): a single JSON object in the ML_ADAPTER_OBJECTS environment variable
+    Return
+        output_files (list): the files to import into Deep Lynx
+    """
+    for key in ["model_serialization_file", "standardization_file"]:
+        for ml_model in ml_models:
+            path = os.path.join(ml_model.directory, os.path.basename(data["MODEL"].get(key) or ""))
+            if data["MODEL"].get(key) and os.path.exists(path):
+                os.replace(path, data["MODEL"][key])
+
+    output_file = data["MODEL"]["output_file"]
+    paths = [os.path.join(ml_model.directory, os.path.basename(output_file)) for ml_model in ml_models]
+    paths = [path for path in paths if os.path.exists(path)]
+    if not paths:
+        return list()
+    if len(paths) == 1:
+        os.replace(paths[0], output_file)
+        return [output_file]
+
+    extension = os.path.splitext(output_file)[1].lower()
+    if extension == '.csv':
+        pd.concat([pd.read_csv(path) for path in paths], ignore_index=True).to_csv(output_file, index=False)
+        return [output_file]
+    if extension == '.json':
+        outputs = list()
+        for path in paths:
+            with open(path) as fp:
+                outputs.append(json.load(fp))
+        with open(output_file, 'w') as fp:
+            json.dump(outputs, fp)
+        return [output_file]
+
+    output_files = list()
+    stem, extension = os.path.splitext(output_file)
+    for i, path in enumerate(paths):
+        file_name = "{0}.{1}{2}".format(stem, i, extension)
+        os.replace(path, file_name)
+        output_files.append(file_name)
+    return output_files
+
+
+def get_model_scheduler():
+    """
+    Returns the model scheduler of the process, sized by the MODEL_WORKERS and MODEL_THREADS environment variables
+    """
+    global model_scheduler
+    with model_scheduler_lock:
+        if model_scheduler is None:
+            threads = os.getenv("MODEL_THREADS")
+            model_scheduler = ModelScheduler(workers=int(os.getenv("MODEL_WORKERS", 1)),
+                                             threads=int(threads) if threads else None,
+                                             max_uses=int(os.getenv("KERNEL_MAX_USES", 20)))
+        return model_scheduler
@@ -0,0 +1,163 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import os
+import shutil
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+
+# Directory of the model serialization files of the last training of every model
+HISTORY_DIR = os.path.join("data", "incremental")
+
+# Number of incremental trainings of a model before the model is trained on the full training set again
+FULL_REFIT_INTERVAL = 10
+
+
+class TrainingPlan():
+    """
+    How a model is trained in a training cycle
+
+    Args
+        mode (string): full to train on the full training set, or incremental to update the previous model
+        previous_model (string): the model serialization file of the previous training, None if mode is full
+        appended (DataFrame): the rows of the training set that the previous model was not trained on
+        evicted (DataFrame): the rows the previous model was trained on that left the training set
+    """
+    __slots__ = ('mode', 'previous_model', 'appended', 'evicted')
+
+    def __init__(self, mode: str = "full", previous_model: str = None, appended=None, evicted=None):
+        self.mode = mode
+        self.previous_model = previous_model
+        self.appended = appended
+        self.evicted = evicted
+
+
+class ModelState():
+    """ The training set and model serialization file of the last training of a model """
+    __slots__ = ('training_set', 'hashes', 'schema', 'model_file', 'updates')
+
+    def __init__(self, training_set: pd.DataFrame, hashes: np.ndarray, model_file: str, updates: int):
+        self.training_set = training_set
+        self.hashes = hashes
+        self.schema = schema(training_set)
+        self.model_file = model_file
+        self.updates = updates
+
+
+class TrainingHistory():
+    """
+    Remembers the training set every model was last trained on, so that the next training cycle hands the model
+    Jupyter Notebook the previous model and only the rows that changed instead of the full training set
+
+        1. Rows are identified by a hash of their values, so the rows that were appended to and evicted from the
+           training set are found for any split method and any queue window
+        2. A model is trained on the full training set when it was not trained before, the columns or dtypes of the
+           training set changed, it was updated incrementally full_refit_interval times, or the changed rows are as
+           many as the rows of the training set
+        3. The model serialization file of every model is kept in the directory between training cycles
+
+    The history is kept in memory, so every model is trained on the full training set after a restart.
+
+    Args
+        directory (string): the directory of the model serialization files, which is emptied
+    """
+
+    def __init__(self, directory: str = HISTORY_DIR):
+        self.directory = directory
+        self._states = dict()
+        self._lock = threading.Lock()
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+
+    def plan(self,
+             key: tuple,
+             training_set: pd.DataFrame,
+             hashes: np.ndarray,
+             full_refit_interval: int = FULL_REFIT_INTERVAL):
+        """
+        Returns how a model is trained in this training cycle
+
+        Args
+            key (tuple): the key of the model e.g. (ML Adapter name, independent variables, dependent variables)
+            training_set (DataFrame): the training set of this training cycle
+            hashes (ndarray): the row hashes of the training set, see row_hashes
+            full_refit_interval (integer): the number of incremental trainings before a full training
+        Return
+            plan (TrainingPlan): the training mode, the previous model file and the changed rows
+        """
+        with self._lock:
+            state = self._states.get(key)
+        if state is None or state.updates >= full_refit_interval or state.schema != schema(training_set):
+            return TrainingPlan()
+        if state.model_file is None or not os.path.exists(state.model_file):
+            return TrainingPlan()
+
+        appended = ~_isin(hashes, state.hashes)
+        evicted = ~_isin(state.hashes, hashes)
+        if appended.sum() + evicted.sum() >= training_set.shape[0]:
+            return TrainingPlan()
+        return TrainingPlan("incremental", state.model_file, training_set[appended], state.training_set[evicted])
+
+    def update(self, key: tuple, plan: TrainingPlan, training_set: pd.DataFrame, hashes: np.ndarray, model_file: str):
+        """
+        Remembers the training of a model that succeeded
+
+        Args
+            key (tuple): the key of the model
+            plan (TrainingPlan): the plan the model was trained with
+            training_set (DataFrame): the training set of this training cycle
+            hashes (ndarray): the row hashes of the training set
+            model_file (string): the model serialization file written by the model Jupyter Notebook, or None
+        """
+        stored = None
+        if model_file and os.path.exists(model_file):
+            name = hashlib.sha256(repr(key).encode()).hexdigest()[:16]
+            directory = os.path.join(self.directory, name)
+            os.makedirs(directory, exist_ok=True)
+            stored = os.path.join(directory, os.path.basename(model_file))
+            shutil.copyfile(model_file, stored)
+
+        with self._lock:
+            state = self._states.get(key)
+            updates = state.updates + 1 if plan.mode == "incremental" and state is not None else 0
+            self._states[key] = ModelState(training_set, hashes, stored, updates)
+
+
+def row_hashes(dataset: pd.DataFrame):
+    """
+    Returns a hash of the values of every row of a DataFrame. The index is not hashed
+
+    Args
+        dataset (DataFrame): the rows to hash
+    Return
+        hashes (ndarray): a uint64 hash per row
+    """
+    return pd.util.hash_pandas_object(dataset, index=False).to_numpy()
+
+
+def schema(dataset: pd.DataFrame):
+    """ Returns the names and dtypes of the columns of a DataFrame """
+    return [(str(column), str(dtype)) for column, dtype in dataset.dtypes.items()]
+
+
+def _isin(hashes: np.ndarray, other: np.ndarray):
+    """
+    Returns whether every row of hashes is in other, counting duplicate rows, so that the second copy of a row is
+    not in other when other has only one copy
+    """
+    return np.isin(_occurrences(hashes), _occurrences(other))
+
+
+def _occurrences(hashes: np.ndarray):
+    """ Returns (hash, occurrence) pairs as a structured array, where the occurrence numbers duplicate hashes """
+    order = np.argsort(hashes, kind='stable')
+    ordered = hashes[order]
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    counts = np.diff(np.r_[starts, ordered.shape[0]])
+    occurrence = np.empty(hashes.shape[0], dtype=np.int64)
+    occurrence[order] = np.arange(ordered.shape[0]) - np.repeat(starts, counts)
+    pairs = np.empty(hashes.shape[0], dtype=[('hash', np.uint64), ('occurrence', np.int64)])
+    pairs['hash'] = hashes
+    pairs['occurrence'] = occurrence
+    return pairs
@@ -1,3 +1,21 @@
 # Copyright 2021, Battelle Energy Alliance, LLC
 
-from .ml_prediction import ML_Prediction
+import importlib
+
+# The names of the modules of the package, which import pandas and are imported on first use
+LAZY_MODULES = {
+    "ml_prediction": ["ML_Prediction"],
+    "model_registry": ["ModelRegistry", "ServedModel", "get_model_registry"],
+    "prediction_batcher": ["PredictionBatcher", "get_prediction_batcher"],
+}
+LAZY_NAMES = {name: module for module, names in LAZY_MODULES.items() for name in names}
+
+
+def __getattr__(name: str):
+    """ Imports the module of a name of LAZY_NAMES on first use """
+    if name not in LAZY_NAMES:
+        raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+    module = importlib.import_module("." + LAZY_NAMES[name], __name__)
+    for module_name in LAZY_MODULES[LAZY_NAMES[name]]:
+        globals()[module_name] = getattr(module, module_name)
+    return globals()[name]
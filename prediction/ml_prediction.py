@@ -1,6 +1,7 @@
 # Copyright 2021, Battelle Energy Alliance, LLC
 
 import os
+import copy
 import json
 import pandas as pd
 
@@ -16,11 +17,25 @@ class ML_Prediction():
         1. Select independent variables from the testing set
         2. Write the test file 
         3. Run the customized prediction Jupyter Notebook
+
+    A Python model is predicted in-process by the model registry instead, see ModelRegistry. ML_Prediction is used
+    for the models of other kernels.
+
+    Args
+        ml_model (ML_Model): a model that has the independent variables of the prediction
+        test_data (DataFrame): the incoming data. If None, the incoming data is read from the DATASET file
+        data (dictionary): a single JSON object in the ML_ADAPTER_OBJECTS environment variable. If None, the object is
+            read from the ML_ADAPTER_OBJECT_LOCATION file
+        directory (string): the directory of the test file. Other than data, the ML Adapter object file and the
+            PREDICTION output file are written to the directory too, so that predictions run concurrently
     """
 
-    def __init__(self, ml_model):
+    def __init__(self, ml_model, test_data: pd.DataFrame = None, data: dict = None, directory: str = "data"):
         # Declare variables
         self.ml_model = ml_model
+        self.test_data = test_data
+        self.data = data
+        self.directory = directory
 
         # Make prediction
         self.make_prediction()
@@ -31,17 +46,52 @@ class ML_Prediction():
         """
         # Determine test dataset using the independent variables (Features, X, Predictors) from a model
         independent_variables = self.ml_model.independent_variables
-        with open(os.getenv("ML_ADAPTER_OBJECT_LOCATION"), 'r') as fp:
-            data = json.load(fp)
-        dataset = data["DATASET"]
-        test_data = pd.read_csv(dataset)
+        if self.data is None:
+            with open(os.getenv("ML_ADAPTER_OBJECT_LOCATION"), 'r') as fp:
+                self.data = json.load(fp)
+        test_data = self.test_data
+        if test_data is None:
+            # Only the independent variables of the model are read from the dataset
+            test_data = utils.read_csv(self.data["DATASET"], independent_variables)
         test_data = test_data[independent_variables]
 
         # Write test.csv file
         self.create_test_file(test_data)
 
         # Call Jupyter Notebook
-        utils.run_jupyter_notebook(data["PREDICTION"]["notebook"], data["PREDICTION"]["kernel"])
+        notebook = os.path.basename(self.data["PREDICTION"]["notebook"])
+        with utils.get_metrics_registry()["prediction_seconds"].time(notebook=notebook):
+            utils.run_jupyter_notebook(self.data["PREDICTION"]["notebook"],
+                                       self.data["PREDICTION"]["kernel"],
+                                       env=self.isolate() if self.directory != "data" else None)
+
+    def isolate(self):
+        """
+        Writes the ML Adapter object file of the prediction into the directory, with the TEST_SET file and the
+        PREDICTION output file moved into the directory
+
+        Return
+            env (dictionary): the environment variables of the prediction Jupyter Notebook
+        """
+        self.data = copy.deepcopy(self.data)
+        self.data["TEST_SET"] = os.path.join(self.directory, 'test.csv')
+        self.data["PREDICTION"]["output_file"] = os.path.join(self.directory,
+                                                              os.path.basename(self.data["PREDICTION"]["output_file"]))
+        location = os.path.join(self.directory, utils.handoff.OBJECT_FILE)
+        with open(location, 'w') as fp:
+            json.dump(self.data, fp)
+        return {"ML_ADAPTER_OBJECT_LOCATION": location}
+
+    def result(self):
+        """
+        Returns the PREDICTION output file written by the Jupyter Notebook: the JSON object of a .json file, or the
+        rows of any other file read as a .csv file
+        """
+        output_file = self.data["PREDICTION"]["output_file"]
+        if os.path.splitext(output_file)[1].lower() == '.json':
+            with open(output_file) as fp:
+                return json.load(fp)
+        return pd.read_csv(output_file).to_dict(orient='list')
 
     def create_test_file(self, test_data: pd.DataFrame or pd.Series):
         """
@@ -52,7 +102,8 @@ class ML_Prediction():
         # Validate extension and path existance before creation
         path = 'test.csv'
         utils.validate_extension('.csv', path)
-        dir_path = os.path.abspath('data')
+        dir_path = os.path.abspath(self.directory)
+        os.makedirs(dir_path, exist_ok=True)
         utils.validate_paths_exist(dir_path)
 
         key = path.split('.')[0]
@@ -0,0 +1,260 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import os
+import json
+import pickle
+import logging
+import threading
+import numpy as np
+import pandas as pd
+
+model_registry = None
+model_registry_lock = threading.Lock()
+
+
+class ServedModel():
+    """
+    A model loaded from its model serialization file, with the standardization parameters it was trained with
+
+    Args
+        name (string): the name of the ML Adapter object
+        model (object): the unpickled model, which has a predict method
+        independent_variables (list): the columns of the rows the model predicts from, or None to use every column
+        dependent_variables (list): the names of the predictions
+        standardization (dictionary): the standardization file e.g. {mean: {X_train: [], y_train: []}, std: {...}}
+        version (tuple): the modification time and size of the model serialization and standardization files
+    """
+    __slots__ = ('name', 'model', 'independent_variables', 'dependent_variables', 'x_mean', 'x_std', 'y_mean', 'y_std',
+                 'version')
+
+    def __init__(self,
+                 name: str,
+                 model,
+                 independent_variables: list = None,
+                 dependent_variables: list = None,
+                 standardization: dict = None,
+                 version: tuple = None):
+        self.name = name
+        self.model = model
+        self.independent_variables = independent_variables
+        self.dependent_variables = dependent_variables
+        self.version = version
+        standardization = (standardization or dict()).get("data", standardization or dict())
+        mean = standardization.get("mean", dict())
+        std = standardization.get("std", dict())
+        self.x_mean = _parameter(mean.get("X_train"))
+        self.x_std = _parameter(std.get("X_train"))
+        self.y_mean = _parameter(mean.get("y_train"))
+        self.y_std = _parameter(std.get("y_train"))
+
+    def predict(self, rows: pd.DataFrame):
+        """
+        Standardizes the rows, predicts and unstandardizes the predictions like the prediction Jupyter Notebook
+
+        Args
+            rows (DataFrame): the rows to predict, which have the independent variables as columns
+        Return
+            predictions (ndarray): a row of predictions per row
+        """
+        if self.independent_variables:
+            missing = [column for column in self.independent_variables if column not in rows.columns]
+            if missing:
+                raise ValueError('Rows are missing the independent variables {0}'.format(missing))
+            rows = rows[self.independent_variables]
+        x = rows.to_numpy(dtype=np.float64)
+        if self.x_mean is not None and self.x_std is not None:
+            x = (x - self.x_mean) / self.x_std
+        yhat = np.asarray(self.model.predict(pd.DataFrame(x, columns=rows.columns)), dtype=np.float64)
+        if self.y_mean is not None and self.y_std is not None:
+            yhat = yhat * self.y_std + self.y_mean
+        return yhat
+
+
+class ModelRegistry():
+    """
+    Keeps the model of every ML Adapter object in memory, so that a prediction is made in-process without running
+    the prediction Jupyter Notebook
+
+        1. A model is loaded from the MODEL model_serialization_file and standardization_file of its ML Adapter object
+           on its first prediction
+        2. A model is loaded again when its files are replaced, e.g. by a training cycle, which is found by the
+           modification time and size of the files on every prediction
+        3. A model trained by a non-Python kernel, or whose file cannot be unpickled, is predicted by the PREDICTION
+           Jupyter Notebook of its ML Adapter object instead, see ML_Prediction
+
+    Args
+        ml_adapter_objects (list): the ML_ADAPTER_OBJECTS environment variable e.g. [{"ML_Object_1": {...}}]
+    """
+
+    def __init__(self, ml_adapter_objects: list):
+        self.objects = dict()
+        for ml_adapter_object in ml_adapter_objects:
+            for name, data in ml_adapter_object.items():
+                self.objects[name] = data
+        self._models = dict()
+        self._variables = dict()
+        self._locks = {name: threading.Lock() for name in self.objects}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, independent_variables: list, dependent_variables: list):
+        """
+        Records the variables of the model of an ML Adapter object after a training cycle, so that the columns of the
+        rows are selected and ordered like the training set of the model
+
+        Args
+            name (string): the name of the ML Adapter object
+            independent_variables (list): the independent variables of the model whose files were kept
+            dependent_variables (list): the dependent variables of the model whose files were kept
+        """
+        with self._lock:
+            self._variables[name] = (list(independent_variables), list(dependent_variables))
+
+    def get(self, name: str):
+        """
+        Returns the model of an ML Adapter object, loading it if its files are new or were replaced
+
+        Args
+            name (string): the name of the ML Adapter object
+        Return
+            served_model (ServedModel): the model, or None if the model is predicted by the prediction Jupyter Notebook
+        Raises
+            KeyError: the ML Adapter object does not exist
+            FileNotFoundError: the model serialization file was not written yet
+        """
+        data = self.objects[name]
+        model_file = data["MODEL"].get("model_serialization_file")
+        if not model_file:
+            raise FileNotFoundError('ML Adapter object {0} does not save its model'.format(name))
+        if not data["MODEL"].get("kernel", "python3").startswith("python"):
+            return None
+
+        with self._locks[name]:
+            version = self.version(name)
+            with self._lock:
+                loaded = self._models.get(name)
+                variables = self._variables.get(name)
+            # A model that is predicted by the Jupyter Notebook is remembered as None, so it is not loaded again
+            if loaded is not None and loaded[:2] == (version, variables):
+                return loaded[2]
+            served_model = self.load(name, version, variables)
+            with self._lock:
+                self._models[name] = (version, variables, served_model)
+            return served_model
+
+    def version(self, name: str):
+        """ Returns the modification time and size of the model serialization and standardization files """
+        version = list()
+        for key in ["model_serialization_file", "standardization_file"]:
+            path = self.objects[name]["MODEL"].get(key)
+            if path and os.path.exists(path):
+                stat = os.stat(path)
+                version.append((stat.st_mtime_ns, stat.st_size))
+            elif key == "model_serialization_file":
+                raise FileNotFoundError('The model of ML Adapter object {0} was not trained yet'.format(name))
+        return tuple(version)
+
+    def load(self, name: str, version: tuple, variables: tuple = None):
+        """
+        Loads the model of an ML Adapter object from its files
+
+        The independent variables are the variables registered by the last training cycle, the PREDICTION
+        independent_variables key of the ML Adapter object, or the feature names of a scikit-learn model.
+
+        Args
+            name (string): the name of the ML Adapter object
+            version (tuple): the version of the files, see version
+            variables (tuple): the registered (independent variables, dependent variables), or None
+        Return
+            served_model (ServedModel): the model, or None if the file is not a Python model
+        """
+        data = self.objects[name]
+        try:
+            with open(data["MODEL"]["model_serialization_file"], 'rb') as fp:
+                model = pickle.load(fp)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, ValueError) as error:
+            logging.warning('The model of ML Adapter object {0} is predicted by its Jupyter Notebook: {1}'.format(
+                name, error))
+            return None
+        if not hasattr(model, "predict"):
+            return None
+
+        standardization = None
+        if data["MODEL"].get("standardization_file") and os.path.exists(data["MODEL"]["standardization_file"]):
+            with open(data["MODEL"]["standardization_file"]) as fp:
+                standardization = json.load(fp)
+
+        independent_variables, dependent_variables = variables or (None, None)
+        if independent_variables is None:
+            independent_variables = data.get("PREDICTION", dict()).get("independent_variables")
+        if independent_variables is None and hasattr(model, "feature_names_in_"):
+            independent_variables = [str(column) for column in model.feature_names_in_]
+        if dependent_variables is None:
+            dependent_variables = data.get("PREDICTION", dict()).get("dependent_variables")
+
+        logging.info('Loaded the model of ML Adapter object {0}'.format(name))
+        return ServedModel(name, model, independent_variables, dependent_variables, standardization, version)
+
+    def predict(self, name: str, rows):
+        """
+        Makes a prediction with the model of an ML Adapter object, in-process for a Python model and by the
+        PREDICTION Jupyter Notebook otherwise
+
+        Args
+            name (string): the name of the ML Adapter object
+            rows (DataFrame, list or dictionary): the rows to predict e.g. [{"x1": 1.0, "x2": 2.0}] or
+                {"x1": [1.0], "x2": [2.0]}
+        Return
+            result (dictionary): the predictions e.g. {"dependent_variables": [], "predictions": [[...]]}
+        """
+        rows = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)
+        served_model = self.get(name)
+        if served_model is None:
+            return self.predict_with_notebook(name, rows)
+        predictions = served_model.predict(rows)
+        return {"dependent_variables": served_model.dependent_variables, "predictions": predictions.tolist()}
+
+    def predict_with_notebook(self, name: str, rows: pd.DataFrame):
+        """
+        Makes a prediction with the PREDICTION Jupyter Notebook of an ML Adapter object
+
+        Args
+            name (string): the name of the ML Adapter object
+            rows (DataFrame): the rows to predict
+        Return
+            result (dictionary): the PREDICTION output file of the Jupyter Notebook
+        """
+        from .ml_prediction import ML_Prediction
+
+        data = self.objects[name]
+        if "PREDICTION" not in data:
+            raise FileNotFoundError('ML Adapter object {0} has no PREDICTION Jupyter Notebook'.format(name))
+        with self._lock:
+            variables = self._variables.get(name)
+        independent_variables = variables[0] if variables else \
+            data["PREDICTION"].get("independent_variables", list(rows.columns))
+        with self._locks[name]:
+            ml_prediction = ML_Prediction(ServedModel(name, None, independent_variables),
+                                          test_data=rows,
+                                          data=data,
+                                          directory=os.path.join("data", "predictions", name))
+            return ml_prediction.result()
+
+
+def _parameter(value):
+    """ Returns a standardization parameter as an array, or None if it is not set """
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        value = list(value.values())
+    return np.asarray(value, dtype=np.float64)
+
+
+def get_model_registry():
+    """
+    Returns the model registry of the process for the ML_ADAPTER_OBJECTS environment variable
+    """
+    global model_registry
+    with model_registry_lock:
+        if model_registry is None:
+            model_registry = ModelRegistry(json.loads(os.getenv("ML_ADAPTER_OBJECTS", "[]")))
+        return model_registry
@@ -0,0 +1,220 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import os
+import time
+import bisect
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+import pandas as pd
+
+from .model_registry import get_model_registry
+
+# Number of recent queueing delays kept for the percentiles of the stats
+DELAY_SAMPLES = 10000
+
+prediction_batcher = None
+prediction_batcher_lock = threading.Lock()
+
+
+class PredictionBatcher():
+    """
+    Coalesces the rows of concurrent prediction requests into one vectorized predict call per model
+
+        1. Stages the rows of every request by the ML Adapter object of the request
+        2. Flushes the staged rows of a model once max_rows rows are staged or the oldest request waited max_wait
+           seconds, so that a request waits at most max_wait seconds before its prediction starts
+        3. Builds one DataFrame of the rows of the batch, makes one prediction and resolves the future of every
+           request with its own rows of the predictions
+        4. Records the number of rows and requests of every batch and the queueing delay of every request, see stats
+
+    A model predicted by its Jupyter Notebook is not batched, see ModelRegistry.
+
+    Args
+        registry (ModelRegistry): the model registry of the models
+        max_rows (integer): the number of staged rows of a model that triggers a flush
+        max_wait (float): the number of seconds a request waits before a flush is triggered
+    """
+
+    def __init__(self, registry, max_rows: int = 256, max_wait: float = 0.005):
+        self.registry = registry
+        self.max_rows = max(1, max_rows)
+        self.max_wait = max_wait
+        self._condition = threading.Condition()
+        # The staged requests of every model, as (submit time, rows, number of rows, future)
+        self._staged = dict()
+        self._rows = dict()
+        self._stopped = False
+        self._buckets = [2**i for i in range(int(np.ceil(np.log2(self.max_rows))) + 1)]
+        self._batch_sizes = [0] * (len(self._buckets) + 1)
+        self._delays = deque(maxlen=DELAY_SAMPLES)
+        self._counts = {"batches": 0, "requests": 0, "rows": 0, "errors": 0}
+        self._thread = threading.Thread(target=self._run, daemon=True, name="prediction_batcher")
+        self._thread.start()
+
+    def submit(self, name: str, rows):
+        """
+        Stages the rows of a prediction request
+
+        Args
+            name (string): the name of the ML Adapter object
+            rows (DataFrame, list or dictionary): the rows to predict e.g. [{"x1": 1.0, "x2": 2.0}] or
+                {"x1": [1.0], "x2": [2.0]}
+        Return
+            future (Future): resolved with the predictions of the rows, see ModelRegistry.predict
+        """
+        future = Future()
+        try:
+            served_model = self.registry.get(name)
+            if served_model is None:
+                future.set_result(self.registry.predict(name, rows))
+                return future
+            rows, count = _records(rows)
+        except Exception as error:
+            future.set_exception(error)
+            return future
+
+        with self._condition:
+            if self._stopped:
+                future.set_exception(RuntimeError("Prediction batcher is stopped"))
+                return future
+            self._staged.setdefault(name, list()).append((time.monotonic(), rows, count, future))
+            self._rows[name] = self._rows.get(name, 0) + count
+            self._condition.notify_all()
+        return future
+
+    def predict(self, name: str, rows, timeout: float = None):
+        """ Makes a prediction through the batcher and waits for its result, see submit """
+        return self.submit(name, rows).result(timeout)
+
+    def stats(self):
+        """
+        Returns the metrics of the batches
+
+        Return
+            stats (dictionary): the number of batches, requests, rows and failed requests, the number of batches per
+                batch size bucket e.g. {"<=1": 10, "<=2": 3, ...}, and the queueing delay percentiles in milliseconds
+        """
+        with self._condition:
+            stats = dict(self._counts)
+            labels = ["<=" + str(bucket) for bucket in self._buckets] + [">" + str(self._buckets[-1])]
+            stats["batch_sizes"] = dict(zip(labels, self._batch_sizes))
+            delays = np.array(self._delays)
+        stats["queueing_delay_ms"] = dict()
+        if delays.size:
+            for percentile in [50, 95, 99, 100]:
+                stats["queueing_delay_ms"]["p" + str(percentile)] = float(np.percentile(delays, percentile) * 1000)
+        return stats
+
+    def stop(self):
+        """ Predicts the staged rows and stops the flush thread """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    flush_in, names = self._flush_in()
+                    if names:
+                        break
+                    self._condition.wait(flush_in)
+                if self._stopped:
+                    names = list(self._staged)
+                batches = [(name, self._staged.pop(name)) for name in names]
+                for name in names:
+                    self._rows.pop(name, None)
+                stopped = self._stopped
+            for name, batch in batches:
+                self._flush(name, batch)
+            if stopped:
+                return
+
+    def _flush_in(self):
+        """
+        Returns the number of seconds until the next flush or None to wait for a request, and the models to flush
+        now. The caller must hold the condition
+        """
+        now = time.monotonic()
+        flush_in = None
+        names = list()
+        for name, batch in self._staged.items():
+            wait = max(0, self.max_wait - (now - batch[0][0]))
+            if self._rows[name] >= self.max_rows or wait == 0:
+                names.append(name)
+            else:
+                flush_in = wait if flush_in is None else min(flush_in, wait)
+        return flush_in, names
+
+    def _flush(self, name: str, batch: list):
+        start = time.monotonic()
+        counts = [item[2] for item in batch]
+        try:
+            served_model = self.registry.get(name)
+            if served_model is None:
+                raise ValueError('The model of ML Adapter object {0} is not a Python model'.format(name))
+            predictions = served_model.predict(_frame([item[1] for item in batch]))
+            results = np.split(predictions, np.cumsum(counts)[:-1])
+        except Exception:
+            # Predict every request on its own, so that a request with bad rows does not fail the others
+            results = [None] * len(batch)
+        errors = 0
+        for i, item in enumerate(batch):
+            future = item[3]
+            try:
+                if results[i] is None:
+                    result = self.registry.predict(name, item[1])
+                else:
+                    result = {
+                        "dependent_variables": served_model.dependent_variables,
+                        "predictions": results[i].tolist()
+                    }
+                future.set_result(result)
+            except Exception as error:
+                errors += 1
+                future.set_exception(error)
+
+        with self._condition:
+            self._counts["batches"] += 1
+            self._counts["requests"] += len(batch)
+            self._counts["rows"] += sum(counts)
+            self._counts["errors"] += errors
+            self._batch_sizes[bisect.bisect_left(self._buckets, sum(counts))] += 1
+            self._delays.extend(start - item[0] for item in batch)
+
+
+def _records(rows):
+    """ Returns the rows of a request as a DataFrame or a list of records, and the number of rows """
+    if isinstance(rows, pd.DataFrame):
+        return rows, rows.shape[0]
+    if isinstance(rows, dict):
+        rows = pd.DataFrame(rows)
+        return rows, rows.shape[0]
+    if not isinstance(rows, list) or any(not isinstance(row, dict) for row in rows):
+        raise ValueError('Rows must be a list of records or an object of columns')
+    return rows, len(rows)
+
+
+def _frame(rows: list):
+    """ Returns a single DataFrame of the rows of the requests of a batch """
+    if all(isinstance(records, list) for records in rows):
+        return pd.DataFrame([record for records in rows for record in records])
+    return pd.concat([pd.DataFrame(records) for records in rows], ignore_index=True)
+
+
+def get_prediction_batcher():
+    """
+    Returns the prediction batcher of the process, sized by the PREDICTION_BATCH_ROWS and PREDICTION_BATCH_MS
+    environment variables
+    """
+    global prediction_batcher
+    with prediction_batcher_lock:
+        if prediction_batcher is None:
+            prediction_batcher = PredictionBatcher(get_model_registry(),
+                                                   max_rows=int(os.getenv("PREDICTION_BATCH_ROWS", 256)),
+                                                   max_wait=float(os.getenv("PREDICTION_BATCH_MS", 5)) / 1000)
+        return prediction_batcher
@@ -0,0 +1,6 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+from .splitter import Splitter, SPLITTERS, register_splitter, get_splitter
+from .hierarchical_clustering import HierarchicalClusteringSplitter
+from .kennard_stone import KennardStoneSplitter, kennard_stone
+from .assign import nearest_prototypes, label_clusters
@@ -0,0 +1,57 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import numpy as np
+import pandas as pd
+
+# Default number of rows assigned at once
+BLOCK_SIZE = 65536
+
+
+def nearest_prototypes(data: np.ndarray, prototypes: np.ndarray, block_size: int = BLOCK_SIZE, rows: np.ndarray = None):
+    """
+    Returns the index of the nearest prototype (Euclidean distance) of every row
+
+    The rows are assigned in blocks, so the temporary distances take block_size * number of prototypes values
+    whatever the number of rows.
+
+    Args
+        data (ndarray): the rows to assign, one row per sample
+        prototypes (ndarray): the prototype rows with the same columns as data
+        block_size (integer): the number of rows assigned at once
+        rows (integer array): the indices of the rows of data to assign, defaults to every row
+    Return
+        nearest (ndarray): an integer array with the index of the nearest prototype of every assigned row
+    """
+    prototypes = np.asarray(prototypes, dtype=np.float64)
+    block_size = max(1, int(block_size))
+    count = data.shape[0] if rows is None else len(rows)
+    nearest = np.zeros(count, dtype=np.int64)
+    if prototypes.shape[0] == 0:
+        return nearest
+
+    # ||x - p||^2 = ||x||^2 - 2 x.p + ||p||^2, where ||x||^2 does not change the nearest prototype of a row
+    prototype_norms = np.einsum('ij,ij->i', prototypes, prototypes)
+    for begin in range(0, count, block_size):
+        if rows is None:
+            block = np.asarray(data[begin:begin + block_size], dtype=np.float64)
+        else:
+            block = np.asarray(data[rows[begin:begin + block_size]], dtype=np.float64)
+        distances = prototype_norms - 2 * (block @ prototypes.T)
+        nearest[begin:begin + block_size] = np.argmin(distances, axis=1)
+    return nearest
+
+
+def label_clusters(dataset: pd.DataFrame, prototypes: pd.DataFrame, block_size: int = BLOCK_SIZE):
+    """
+    Labels every row of a dataset, e.g. incoming prediction data, with the cluster of its nearest prototype
+
+    Args
+        dataset (DataFrame): the rows to label
+        prototypes (DataFrame): the prototype rows of the clusters, indexed by cluster id
+        block_size (integer): the number of rows assigned at once
+    Return
+        labels (Series): the cluster id of every row, with the index of dataset
+    """
+    columns = list(prototypes.columns)
+    nearest = nearest_prototypes(dataset[columns].to_numpy(), prototypes.to_numpy(), block_size)
+    return pd.Series(prototypes.index.to_numpy()[nearest], index=dataset.index, name='cluster_id')
@@ -0,0 +1,331 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+from collections import namedtuple
+from statistics import mode
+import numpy as np
+import pandas as pd
+
+from .splitter import Splitter, register_splitter
+from .minimax_linkage import CondensedDistance, Linkage, minimax_linkage
+from .assign import BLOCK_SIZE, nearest_prototypes
+
+ProtoTuple = namedtuple('ProtoTuple', ['proto_dist', 'proto_index'])
+
+
+class Cluster():
+    """
+    This class contains all of the information for a given cluster.
+
+    Args:
+        id (str): The unique identifier of the cluster.  As clusters are merged, the index increases in size.
+        previous_link_id (list): This list contains the pair of previous clusters ids that were merged. When empty, there is no prior cluster (single point of information).
+        next_link_id (list): This list contains the next cluster (filled in after applying hierarchical clustering).
+        proto (ProtoTuple): This includes the proto_dist and proto_index.
+        sample_indices (int list): A list of ints that describe which sample indicies are contained within this cluster.
+    """
+    # using slots to save time and memory
+    __slots__ = ('id', 'previous_id', 'next_id', 'proto', 'sample_indices')
+
+    def __init__(self) -> None:
+        self.id = 1
+        self.previous_id = []
+        self.next_id = -1
+        self.proto = None
+        self.sample_indices = []
+
+
+@register_splitter("hierarchical_clustering")
+class HierarchicalClusteringSplitter(Splitter):
+    """
+    Splits the dataset by minimax linkage hierarchical clustering. Clusters furthest from the other clusters are
+    assigned to the testing set
+
+    Parameters
+        N (integer): the number of samples used in the hierarchical clustering algorithm
+        max_clusters (integer): the maximum number of clusters to create
+        test_size (float): an approximate decimal percentage of the dataset to include in the testing set
+        block_size (integer, optional): the number of rows assigned to their nearest prototype at once
+    """
+
+    def split(self, dataset: pd.DataFrame):
+        N = self.parameters["N"]
+        max_clusters = self.parameters["max_clusters"]
+        test_size = self.parameters["test_size"]
+        block_size = self.parameters.get("block_size", BLOCK_SIZE)
+
+        # Rows are referenced by position
+        dataset = dataset.reset_index(drop=True)
+
+        # Filter dataset to contain only numeric columns
+        numeric_columns = [col for col in dataset.columns if pd.api.types.is_numeric_dtype(dataset[col])]
+        dataset_numeric = dataset[numeric_columns]
+
+        dataset_array = dataset_numeric.to_numpy()
+        if dataset_numeric.shape[0] > N:
+            X = dataset_numeric.sample(n=N, random_state=1)
+        else:
+            X = dataset_numeric
+        X_index = X.index.tolist()
+        dist = CondensedDistance(X.to_numpy())
+
+        # Perform hierarchical clustering by determining the minimax distance between two different clusters.
+        linkage = nearest_neighbor(dist)
+
+        # Cut the tree to a specified number of clusters
+        clusters = get_clusters(linkage, max_clusters)
+
+        # Prunes clusters to contain unique sample indices for every cluster (no repeats)
+        pruned_clusters, prototype_ids = prune_clusters(clusters)
+
+        # Assign each row in the dataset to a cluster
+        assignments = assign_clusters(dataset_array, X_index, pruned_clusters, block_size)
+
+        # Assign clusters to the training and testing set
+        return get_training_testing_sets(dataset, dist, prototype_ids, assignments, test_size)
+
+
+def nearest_neighbor(dist: CondensedDistance):
+    """
+    This function performs hierarchical clustering by determining the minimax distance between clusters.
+
+    From Wikipedia:
+    Initialize the set of active clusters to consist of n one-point clusters, one for each input point.
+    Let S be a stack data structure, initially empty, the elements of which will be active clusters.
+    While there is more than one cluster in the set of clusters:
+        If S is empty, choose an active cluster arbitrarily and push it onto S.
+        Let C be the active cluster on the top of S. Compute the distances from C to all other clusters, and let D be the nearest other cluster.
+        If D is already in S, it must be the immediate predecessor of C. Pop both clusters from S and merge them.
+        Otherwise, if D is not already in S, push it onto S.
+
+    Minimax linkage is not reducible, so D may be found deeper in S. The clusters above D are then popped back to the
+    active clusters and C is merged with D.
+
+    Args:
+        dist (CondensedDistance): The distances between all samples.
+
+    Return:
+        linkage (Linkage): The merged clusters in arrays indexed by cluster id, see minimax_linkage.
+    """
+    return minimax_linkage(dist)
+
+
+def linkage_cluster(linkage: Linkage, cluster_id: int) -> Cluster:
+    """
+    This function creates a Cluster object for a cluster of the linkage
+
+    Args:
+        linkage (Linkage): The merged clusters in arrays indexed by cluster id.
+        cluster_id (int): The id of the cluster.
+
+    Return:
+        cluster (Cluster): The cluster with its sample indices.
+    """
+    cluster = Cluster()
+    cluster.id = int(cluster_id)
+    cluster.previous_id = [int(i) for i in linkage.children[cluster_id] if i >= 0]
+    cluster.next_id = int(linkage.parent[cluster_id])
+    cluster.proto = ProtoTuple(float(linkage.proto_dist[cluster_id]), int(linkage.proto_index[cluster_id]))
+    cluster.sample_indices = linkage.members(cluster_id)
+    return cluster
+
+
+def get_clusters(linkage: Linkage, k_clusters: int):
+    """
+    This function cuts the tree to a specified number of clusters
+
+    Args:
+        linkage (Linkage): The merged clusters in arrays indexed by cluster id.
+        k_clusters (int): the number of clusters desired
+
+    Return:
+        clusters (Cluster list): A list of chosen clusters after cutting of the tree
+    """
+    clusters = list()
+    cluster_options = list()
+    retired_clusters = list(linkage.retired)
+    while len(clusters) < k_clusters and retired_clusters:
+        # Delete last cluster in retired clusters
+        retired_clust = retired_clusters.pop()
+        # Add previous ids clusters to cluster options list
+        cluster_options.extend(int(i) for i in linkage.children[retired_clust] if i >= 0)
+        if not cluster_options:
+            clusters.append(retired_clust)
+            break
+
+        # Pick the cluster with the max distance, the first one on ties
+        max_index = int(np.argmax(linkage.proto_dist[cluster_options]))
+        # Add max distance cluster to clusters list
+        clusters.append(cluster_options.pop(max_index))
+    return [linkage_cluster(linkage, i) for i in clusters]
+
+
+def prune_clusters(clusters: list):
+    """
+    This function prunes clusters to contain unique sample indices for every cluster (no repeats)
+
+    Args:
+        clusters (Cluster list): A list of chosen clusters after cutting of the tree
+
+    Return:
+        pruned_clusters (Cluster list): A list of pruned clusters where each cluster has a unique set of sample indices
+        prototype_ids (integer list): A list of row indices of the prototype (center point in a cluster)
+    """
+    pruned_clusters = list()
+    prototype_ids = list()
+    # Order the clusters by id
+    ordered_clusters = sorted(clusters, key=lambda clust: clust.id)
+
+    size = max((int(np.max(clust.sample_indices)) + 1 for clust in clusters if len(clust.sample_indices)), default=0)
+    assigned = np.zeros(size, dtype=bool)
+    for clust in ordered_clusters:
+        # Filter out indices assigned to a previous cluster
+        indices = np.asarray(clust.sample_indices, dtype=np.int64)
+        sample_indices = indices[~assigned[indices]]
+        if sample_indices.size:
+            assigned[sample_indices] = True
+            # Create cluster and add the cluster to a list
+            cluster = Cluster()
+            cluster.id = clust.id
+            cluster.previous_id = clust.previous_id
+            cluster.next_id = clust.next_id
+            cluster.proto = clust.proto
+            cluster.sample_indices = sample_indices
+            pruned_clusters.append(cluster)
+    for i in pruned_clusters:
+        prototype_ids.append(i.proto[1])
+    return pruned_clusters, prototype_ids
+
+
+def assign_clusters(dataset: np.ndarray, sample_index: list, clusters: list, block_size: int = BLOCK_SIZE):
+    """
+    This function assigns each row in the dataset to a cluster
+
+    Args:
+        dataset (ndarray): dataset to assign clusters to
+        sample_index (integer list): a list of indices of the sample dataset used in the prototypical clustering
+        clusters (Cluster list): A list of pruned clusters where each cluster has a unique set of sample indices
+        block_size (int): the number of rows assigned to their nearest prototype at once
+
+    Return:
+        assignments (DataFrame): contains information about the cluster assigned to each row in the dataset
+            columns: cluster_id, prototype_id, assigned_id
+                cluster_id: the id of the Cluster object
+                prototype_id: the row index of the prototype (center point in a cluster)
+                assigned_id: assign a numerical id beginning at 0 ranging to the number of clusters
+    """
+    N_dataset = dataset.shape[0]
+
+    # Arrays indexed by assigned id
+    clusters_id = np.array([clust.id for clust in clusters], dtype=np.int64)
+    clusters_prototype = np.array([clust.proto[1] for clust in clusters], dtype=np.int64)
+
+    # Populate the assigned id of the rows assigned by prototypical clustering
+    sample_index = np.asarray(sample_index, dtype=np.int64)
+    assigned_id = np.zeros(N_dataset, dtype=np.int64)
+    clustered = np.zeros(N_dataset, dtype=bool)
+    for i, clust in enumerate(clusters):
+        rows = sample_index[np.asarray(clust.sample_indices, dtype=np.int64)]
+        assigned_id[rows] = i
+        clustered[rows] = True
+
+    # Assign the prototype with the minimum Euclidean distance to every other row in the dataset
+    unclustered = np.flatnonzero(~clustered)
+    if unclustered.size and clusters:
+        prototypes = dataset[sample_index[clusters_prototype], :]
+        assigned_id[unclustered] = nearest_prototypes(dataset, prototypes, block_size, unclustered)
+
+    assignments = pd.DataFrame({
+        "cluster_id": clusters_id[assigned_id] if clusters else assigned_id,
+        "prototype_id": clusters_prototype[assigned_id] if clusters else assigned_id,
+        "assigned_id": assigned_id
+    })
+    return assignments
+
+
+def get_training_testing_sets(dataset: pd.DataFrame, dist: CondensedDistance, prototype_ids: list,
+                              assignments: pd.DataFrame, test_size: float):
+    """
+    This function assigns clusters to the training and testing set
+
+    Args:
+        dataset (DataFrame): dataset to assign training and testing sets
+        dist (CondensedDistance): The distances between all samples.
+        prototype_ids (integer list): A list of row indices of the prototype (center point in a cluster)
+        assignments (DataFrame): contains information about the cluster assigned to each row in the dataset
+            columns: cluster_id, prototype_id, assigned_id
+                cluster_id: the id of the Cluster object
+                prototype_id: the row index of the prototype (center point in a cluster)
+                assigned_id: assign a numerical id beginning at 0 ranging to the number of clusters
+        test_size (float): a precentage of the testing set size (decimal form)
+
+    Return:
+        training_set (DataFrame): A DataFrame of the training set
+        testing_set (DataFrame): A DataFrame of the testing set
+    """
+    testing_indices = list()
+    training_set_clusters = list()
+    testing_set_clusters = list()
+    testing_percent = 0.0
+
+    # Determine the cluster that is furthest distance away from all other clusters
+    iterations = 0
+    while not testing_set_clusters:
+        subset_prototype_ids = list(set(prototype_ids) - set(training_set_clusters))
+        prototype_dist = dist.block(subset_prototype_ids, subset_prototype_ids)
+        max_distance = np.argmax(prototype_dist, axis=1)
+        max_dist_id = prototype_ids[mode(max_distance)]
+
+        # Get the cluster from the dataset
+        max_dist_indices = assignments.index[assignments['prototype_id'] == max_dist_id].tolist()
+        cluster_percentage = float(len(max_dist_indices)) / len(dataset)
+
+        # Find a cluster whose size is less than the testing size
+        if cluster_percentage < test_size:
+            testing_indices.extend(max_dist_indices)
+            testing_set_clusters.append(max_dist_id)
+            testing_percent = float(len(testing_indices)) / len(dataset)
+        else:
+            prototype_ids.remove(max_dist_id)
+            training_set_clusters.append(max_dist_id)
+
+        # Catch if infinite loop
+        iterations += 1
+        if iterations > len(prototype_ids):
+            break
+
+    # Determine the distances between prototypes and initialize previously selected prototypes to extremely high number (for min)
+    assigned_indices = list()
+    for index, val in enumerate(prototype_ids):
+        if val in training_set_clusters or val in testing_set_clusters:
+            assigned_indices.append(index)
+
+    test_prototype_dist = dist.block(assigned_indices, prototype_ids)
+    test_prototype_dist[:, assigned_indices] = 1e10
+
+    # Add clusters to the testing set until bigger than the testing size
+    iterations = 0
+    while testing_percent < test_size and test_prototype_dist.size > 0:
+        # Find prototype with the minimum distance from other prototypes in the testing set
+        minimum_index = np.unravel_index(np.argmin(test_prototype_dist, axis=None), test_prototype_dist.shape)
+
+        # Add the prototype cluster that is the closest distance to the previously selected prototypes to the testing set
+        min_dist_indices = assignments.index[assignments['assigned_id'] == minimum_index[1]].tolist()
+        testing_indices.extend(min_dist_indices)
+        testing_percent = float(len(testing_indices)) / len(dataset)
+
+        # Update the distance matrix and list of selected prototypes
+        assigned_indices.append(minimum_index[1])
+        test_prototype_dist = dist.block(assigned_indices, prototype_ids)
+        test_prototype_dist[:, assigned_indices] = 1e10
+
+        # Catch if infinite loop
+        iterations += 1
+        if iterations > len(prototype_ids):
+            break
+
+    # Assign clusters to training set
+    testing_set = dataset.iloc[testing_indices, :]
+    training_indices = sorted(set(range(len(dataset))) - set(testing_indices))
+    training_set = dataset.iloc[training_indices, :]
+
+    return training_set, testing_set
@@ -0,0 +1,142 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import math
+import numpy as np
+import pandas as pd
+
+from .splitter import Splitter, register_splitter
+from .r_random import r_sample
+
+# Default number of rows whose distances to every sample are computed at once
+BLOCK_SIZE = 1024
+
+
+@register_splitter("kennard_stone")
+class KennardStoneSplitter(Splitter):
+    """
+    Splits the dataset by the Kennard Stone algorithm. The selected samples are assigned to the training set
+
+    Reproduces split/kennard_stone.ipynb (prospectr::kenStone with the euclid metric) without an R kernel, including
+    the set.seed(10000) sampling of N rows.
+
+    Parameters
+        N (integer): the number of samples used in the kennard stone algorithm
+        k (integer): the number of samples to select for the training set
+        seed (integer, optional): the seed of the sampling of N rows, 10000 by default
+        dtype (string, optional): the dtype of the distances, float64 by default or float32
+        block_size (integer, optional): the number of rows whose distances are computed at once when searching for
+            the most distant pair of samples
+    """
+
+    def split(self, dataset: pd.DataFrame):
+        N = self.parameters["N"]
+        k = self.parameters["k"]
+        seed = self.parameters.get("seed", 10000)
+        dtype = np.dtype(self.parameters.get("dtype", "float64"))
+        block_size = self.parameters.get("block_size", BLOCK_SIZE)
+
+        # Filter dataset to contain only numeric columns, where logical columns are not numeric in R
+        numeric_columns = [
+            col for col in dataset.columns
+            if pd.api.types.is_numeric_dtype(dataset[col]) and not pd.api.types.is_bool_dtype(dataset[col])
+        ]
+
+        # Take a sample of the dataset
+        rows = dataset.shape[0]
+        if rows > N:
+            sample_index = r_sample(rows, N, seed) - 1
+        else:
+            sample_index = np.arange(rows)
+
+        # Determine k proportionately if N is greater than the rows of X
+        if N > sample_index.shape[0]:
+            k = math.ceil(sample_index.shape[0] * k / N)
+
+        X = dataset[numeric_columns].to_numpy(dtype=dtype)[sample_index]
+        selection = kennard_stone(X, k, block_size)
+
+        training_indices = sample_index[selection]
+        testing_mask = np.ones(rows, dtype=bool)
+        testing_mask[training_indices] = False
+        return dataset.iloc[training_indices, :], dataset.iloc[np.flatnonzero(testing_mask), :]
+
+
+def kennard_stone(X: np.ndarray, k: int, block_size: int = BLOCK_SIZE):
+    """
+    Selects k samples by the Kennard Stone algorithm
+
+    Starts with the two samples furthest apart, then repeatedly selects the sample whose distance to its nearest
+    selected sample is the largest. Only the distance of every sample to its nearest selected sample is kept, so
+    memory is O(N) instead of the N * N distance matrix. Ties are broken like which.max in R, by the first index.
+
+    The distances are computed from the uncentered samples, so they are exact for integer valued data and the ties
+    are the same as in split/kennard_stone.ipynb. For other data, distances that differ only by rounding error may
+    be ordered differently than by prospectr::kenStone, which can select different samples after such a near tie.
+
+    Args
+        X (ndarray): the samples, one row per sample, in the dtype of the distances
+        k (integer): the number of samples to select
+        block_size (integer): the number of rows whose distances are computed at once
+    Return
+        selection (ndarray): the indices of the selected samples in the order of selection
+    """
+    n = X.shape[0]
+    k = min(int(k), n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if n == 1:
+        return np.zeros(1, dtype=np.int64)
+
+    buffer = np.empty_like(X)
+    first, second = _most_distant_pair(X, max(1, int(block_size)), buffer)
+    selection = [second, first]
+    min_dist = np.minimum(_squared_distances(X, first, buffer), _squared_distances(X, second, buffer))
+    min_dist[selection] = -np.inf
+
+    for _ in range(2, k):
+        chosen = int(np.argmax(min_dist))
+        selection.append(chosen)
+        np.minimum(min_dist, _squared_distances(X, chosen, buffer), out=min_dist)
+        min_dist[chosen] = -np.inf
+    return np.asarray(selection[:k], dtype=np.int64)
+
+
+def _squared_distances(X: np.ndarray, i: int, buffer: np.ndarray):
+    """ Returns the squared Euclidean distances between every row of X and row i """
+    np.subtract(X, X[i], out=buffer)
+    np.multiply(buffer, buffer, out=buffer)
+    return buffer.sum(axis=1)
+
+
+def _most_distant_pair(X: np.ndarray, block_size: int, buffer: np.ndarray):
+    """
+    Returns the most distant pair of samples (i, j) where i is the smallest index of any most distant pair and j is
+    the smallest index paired with i, which is the pair which.max finds in the column-major distance matrix of R
+
+    Rows are searched in blocks by decreasing norm and the search stops once ||x_i|| + max ||x|| (an upper bound of
+    the distance of the remaining rows) is less than the largest distance found.
+    """
+    norms = np.einsum('ij,ij->i', X, X)
+    lengths = np.sqrt(norms)
+    order = np.argsort(-lengths, kind='stable')
+    row_max = np.full(X.shape[0], -np.inf, dtype=np.float64)
+    best = -np.inf
+    # Relative rounding error allowed for the matrix products
+    tolerance = 1e3 * np.finfo(X.dtype).eps
+    for begin in range(0, X.shape[0], block_size):
+        rows = order[begin:begin + block_size]
+        if (lengths[rows[0]] + lengths[order[0]])**2 * (1 + tolerance) < best:
+            break
+        # ||x_i - x_j||^2 = ||x_i||^2 - 2 x_i.x_j + ||x_j||^2
+        distances = X[rows] @ X.T
+        distances *= -2
+        distances += norms
+        row_max[rows] = distances.max(axis=1) + norms[rows]
+        best = max(best, row_max[rows].max())
+
+    # The matrix products find the candidate rows, the exact distances of the candidate rows break the ties
+    candidates = np.flatnonzero(row_max >= best * (1 - tolerance))
+    exact_max = np.array([_squared_distances(X, i, buffer).max() for i in candidates])
+    first = int(candidates[np.argmax(exact_max)])
+    second = int(np.argmax(_squared_distances(X, first, buffer)))
+    return first, second
@@ -0,0 +1,278 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import numpy as np
+
+# Maximum number of elements in a temporary block of distances
+BLOCK_ELEMENTS = 1 << 22
+
+
+class CondensedDistance():
+    """
+    Euclidean distances between the rows of a matrix stored as a condensed (upper triangle) vector
+
+    For N samples the distances take N * (N - 1) / 2 values instead of the N * N values of a square distance matrix,
+    e.g. 200 MB for N = 10,000 with float32.
+
+    Args
+        X (ndarray): the samples, one row per sample
+        dtype (dtype): the dtype of the stored distances
+        block_size (integer): the number of samples whose distances are computed at once
+    """
+
+    def __init__(self, X: np.ndarray, dtype=np.float32, block_size: int = 1024):
+        from scipy.spatial.distance import cdist
+
+        X = np.asarray(X, dtype=np.float64)
+        self.n = X.shape[0]
+        self.dtype = np.dtype(dtype)
+        # Position of the distance between sample i and sample i + 1 in the condensed vector
+        index = np.arange(self.n, dtype=np.int64)
+        self.starts = index * (2 * self.n - index - 1) // 2
+        self.values = np.empty(self.n * (self.n - 1) // 2, dtype=self.dtype)
+
+        for begin in range(0, self.n, block_size):
+            end = min(self.n, begin + block_size)
+            block = cdist(X[begin:end], X[begin:], 'euclidean')
+            for i in range(begin, end):
+                self.values[self.starts[i]:self.starts[i] + self.n - i - 1] = block[i - begin, i - begin + 1:]
+
+    def row(self, i: int):
+        """
+        Returns the distances between sample i and every sample
+
+        Args
+            i (integer): the index of the sample
+        Return
+            row (ndarray): an array of length N
+        """
+        row = np.empty(self.n, dtype=self.dtype)
+        before = np.arange(i, dtype=np.int64)
+        row[:i] = self.values[self.starts[:i] + i - before - 1]
+        row[i] = 0
+        row[i + 1:] = self.values[self.starts[i]:self.starts[i] + self.n - i - 1]
+        return row
+
+    def block(self, rows, columns):
+        """
+        Returns the distances between two sets of samples
+
+        Args
+            rows (integer array): the indices of the samples of the rows
+            columns (integer array): the indices of the samples of the columns
+        Return
+            block (ndarray): an array of shape (len(rows), len(columns))
+        """
+        rows = np.asarray(rows, dtype=np.int64)[:, None]
+        columns = np.asarray(columns, dtype=np.int64)[None, :]
+        low = np.minimum(rows, columns)
+        high = np.maximum(rows, columns)
+        same = low == high
+        if not self.values.size:
+            return np.zeros(same.shape, dtype=self.dtype)
+        # The diagonal is not stored, point it at a valid position and zero it afterwards
+        positions = np.where(same, 0, self.starts[low] + high - low - 1)
+        block = self.values[positions]
+        block[same] = 0
+        return block
+
+
+class Linkage():
+    """
+    The result of hierarchical clustering, stored in arrays indexed by cluster id
+
+    Samples are the clusters 0 to N - 1 and merged clusters are numbered from N + 1 in the order they were created.
+
+    Args
+        n (integer): the number of samples
+    """
+
+    def __init__(self, n: int):
+        self.n = n
+        size = 2 * n + 1
+        # The pair of clusters that were merged into each cluster, -1 for samples
+        self.children = np.full((size, 2), -1, dtype=np.int64)
+        # The minimax radius and prototype sample of each cluster
+        self.proto_dist = np.zeros(size, dtype=np.float64)
+        self.proto_index = np.arange(size, dtype=np.int64)
+        # The cluster that each cluster was merged into, -1 for the root
+        self.parent = np.full(size, -1, dtype=np.int64)
+        # Cluster ids in the order they were retired from the nearest neighbor chain, ending with the root
+        self.retired = list()
+
+    def members(self, cluster_id: int):
+        """
+        Returns the samples contained within a cluster
+
+        Args
+            cluster_id (integer): the id of the cluster
+        Return
+            sample_indices (ndarray): the sorted indices of the samples
+        """
+        samples = list()
+        stack = [cluster_id]
+        while stack:
+            current = stack.pop()
+            if current < self.n:
+                samples.append(current)
+            else:
+                stack.extend(self.children[current])
+        return np.sort(np.asarray(samples, dtype=np.int64))
+
+
+def minimax_linkage(dist: CondensedDistance):
+    """
+    Hierarchical clustering with minimax linkage by a nearest neighbor chain
+
+    The minimax distance between clusters G and H is min over x in G + H of max over y in G + H of d(x, y), and the
+    sample x that attains it is the prototype of the merged cluster. For each merged cluster G the row
+    r_G(x) = max over y in G of d(x, y) is cached for every sample x, so that
+        d(G, H) = min over x in G + H of max(r_G(x), r_H(x))
+    A merge updates the cached row with an element-wise maximum, r_(G + H) = max(r_G, r_H), and the distance from the
+    top of the chain to every active cluster costs O(N + number of active clusters * size of the top cluster).
+
+    Args
+        dist (CondensedDistance): the distances between the samples
+    Return
+        linkage (Linkage): the merged clusters
+    """
+    n = dist.n
+    linkage = Linkage(n)
+    if n == 0:
+        return linkage
+    size = 2 * n + 1
+
+    # Array-backed cluster membership: the active cluster id of every sample
+    label = np.arange(n, dtype=np.int64)
+    # r_G(x) of every sample x for its own cluster G
+    own = np.zeros(n, dtype=dist.dtype)
+    active = np.zeros(size, dtype=bool)
+    active[:n] = True
+    in_stack = np.zeros(size, dtype=bool)
+    # Samples ordered so the members of every active cluster are contiguous
+    order = np.arange(n, dtype=np.int64)
+    groups = _groups(label, order)
+
+    # Cached rows of merged clusters, stored in reusable slots
+    slot = np.full(size, -1, dtype=np.int64)
+    rows = np.empty((min(n, 64), n), dtype=dist.dtype)
+    free_slots = list(range(rows.shape[0] - 1, -1, -1))
+
+    def cluster_row(cluster_id):
+        if cluster_id < n:
+            return dist.row(cluster_id)
+        return rows[slot[cluster_id]]
+
+    stack = list()
+    next_id = n
+    n_active = n
+    while n_active > 1:
+        if not stack:
+            first = int(np.flatnonzero(active)[0])
+            stack.append(first)
+            in_stack[first] = True
+
+        top = stack[-1]
+        members = np.flatnonzero(label == top)
+        top_row = cluster_row(top)
+        active_ids = np.flatnonzero(active)
+        distances = _distances_to_active(dist, top, members, top_row, active_ids, order, groups, own, rows, slot)
+
+        # Prefer the predecessor in the chain on ties so the chain terminates
+        nearest = int(active_ids[np.argmin(distances)])
+        if len(stack) > 1:
+            predecessor = stack[-2]
+            position = np.searchsorted(active_ids, predecessor)
+            if distances[position] <= distances.min():
+                nearest = predecessor
+
+        if not in_stack[nearest]:
+            stack.append(nearest)
+            in_stack[nearest] = True
+            continue
+
+        # Merge the top of the chain with its nearest cluster, which is below it in the chain
+        while stack[-1] != nearest:
+            in_stack[stack.pop()] = False
+        stack.pop()
+        in_stack[top] = False
+        in_stack[nearest] = False
+        linkage.retired.extend([top, nearest])
+
+        next_id += 1
+        merged_row = np.maximum(top_row, cluster_row(nearest))
+        for cluster_id in (top, nearest):
+            if slot[cluster_id] >= 0:
+                free_slots.append(slot[cluster_id])
+                slot[cluster_id] = -1
+        if not free_slots:
+            rows = _grow(rows, free_slots)
+        slot[next_id] = free_slots.pop()
+        rows[slot[next_id]] = merged_row
+
+        merged_members = np.flatnonzero((label == top) | (label == nearest))
+        label[merged_members] = next_id
+        order = np.concatenate((order[label[order] != next_id], merged_members))
+        groups = _groups(label, order)
+        own[merged_members] = merged_row[merged_members]
+        prototype = merged_members[np.argmin(merged_row[merged_members])]
+
+        linkage.children[next_id] = (nearest, top)
+        linkage.parent[[top, nearest]] = next_id
+        linkage.proto_dist[next_id] = merged_row[prototype]
+        linkage.proto_index[next_id] = prototype
+        active[[top, nearest]] = False
+        active[next_id] = True
+        n_active -= 1
+
+    linkage.retired.append(int(np.flatnonzero(active)[0]))
+    return linkage
+
+
+def _groups(label: np.ndarray, order: np.ndarray):
+    """ Returns the first position in order and the cluster id of every active cluster """
+    ordered = label[order]
+    starts = np.flatnonzero(np.concatenate(([True], ordered[1:] != ordered[:-1])))
+    return starts, ordered[starts]
+
+
+def _distances_to_active(dist, top, members, top_row, active_ids, order, groups, own, rows, slot):
+    """
+    Returns the minimax distance between the top of the chain and every active cluster, inf for the top itself
+    """
+    n = dist.n
+    top_members_row = top_row[members]
+
+    # Prototypes outside of the top cluster: min over x in H of max(r_top(x), r_H(x))
+    outside = np.maximum(top_row, own)
+    outside[members] = np.inf
+    starts, group_ids = groups
+    outside_min = np.full(2 * n + 1, np.inf, dtype=np.float64)
+    outside_min[group_ids] = np.minimum.reduceat(outside[order], starts)
+
+    # Prototypes inside of the top cluster: min over x in top of max(r_top(x), r_H(x))
+    inside_min = np.full(active_ids.shape[0], np.inf, dtype=np.float64)
+    samples = active_ids < n
+    merged = ~samples
+    chunk = max(1, BLOCK_ELEMENTS // max(1, active_ids.shape[0]))
+    for begin in range(0, members.shape[0], chunk):
+        columns = members[begin:begin + chunk]
+        bound = top_members_row[begin:begin + chunk]
+        if samples.any():
+            block = np.maximum(dist.block(active_ids[samples], columns), bound)
+            inside_min[samples] = np.minimum(inside_min[samples], block.min(axis=1))
+        if merged.any():
+            block = np.maximum(rows[np.ix_(slot[active_ids[merged]], columns)], bound)
+            inside_min[merged] = np.minimum(inside_min[merged], block.min(axis=1))
+
+    distances = np.minimum(inside_min, outside_min[active_ids])
+    distances[active_ids == top] = np.inf
+    return distances
+
+
+def _grow(rows: np.ndarray, free_slots: list):
+    """ Doubles the number of cached row slots """
+    count = rows.shape[0]
+    grown = np.empty((count * 2, rows.shape[1]), dtype=rows.dtype)
+    grown[:count] = rows
+    free_slots.extend(range(count * 2 - 1, count - 1, -1))
+    return grown
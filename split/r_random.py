@@ -0,0 +1,110 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import numpy as np
+
+# Number of 32-bit integers drawn from the Mersenne Twister at once
+BUFFER_SIZE = 4096
+
+
+class RRandom():
+    """
+    Reproduces the default random number generator of R (version 3.6 and later): the Mersenne Twister seeded by
+    set.seed and the "Rejection" sample.kind, so that Python code draws the same samples as an R Jupyter Notebook
+
+    Args
+        seed (integer): the seed given to set.seed in R
+    """
+
+    def __init__(self, seed: int):
+        # set.seed scrambles the seed 50 times and then fills the 625 integers of .Random.seed, where the first
+        # integer is the position in the Mersenne Twister state and the other 624 integers are the state
+        seed = int(seed) & 0xFFFFFFFF
+        for _ in range(50):
+            seed = (69069 * seed + 1) & 0xFFFFFFFF
+        state = np.zeros(625, dtype=np.uint32)
+        for j in range(625):
+            seed = (69069 * seed + 1) & 0xFFFFFFFF
+            state[j] = seed
+        self._generator = np.random.MT19937()
+        self._generator.state = {'bit_generator': 'MT19937', 'state': {'key': state[1:], 'pos': 624}}
+        self._buffer = np.empty(0, dtype=np.float64)
+        self._position = 0
+
+    def unif_rand(self):
+        """ Returns a uniform random number in (0, 1) like unif_rand in R """
+        if self._position >= self._buffer.shape[0]:
+            raw = self._generator.random_raw(BUFFER_SIZE).astype(np.uint32)
+            buffer = raw * 2.3283064365386963e-10
+            # fixup keeps the number within the open interval (0, 1)
+            buffer[buffer <= 0.0] = 0.5 * 2.328306437080797e-10
+            buffer[1.0 - buffer <= 0.0] = 1.0 - 0.5 * 2.328306437080797e-10
+            self._buffer = buffer
+            self._position = 0
+        value = self._buffer[self._position]
+        self._position += 1
+        return value
+
+    def unif_index(self, n: int):
+        """ Returns a uniform random integer in [0, n) by rejection sampling like R_unif_index in R """
+        if n <= 0:
+            return 0
+        bits = int(np.ceil(np.log2(n)))
+        while True:
+            value = self._rbits(bits)
+            if value < n:
+                return value
+
+    def sample(self, n: int, size: int):
+        """
+        Returns a random sample without replacement of size integers from 1 to n like sample(n, size) in R
+
+        Args
+            n (integer): the number of integers to sample from
+            size (integer): the number of integers to sample
+        Return
+            sample (ndarray): the sampled integers, starting at 1 like R
+        """
+        if size > n:
+            raise ValueError('cannot take a sample larger than the population when replace = FALSE')
+        sample = np.empty(size, dtype=np.int64)
+
+        # sample.int uses a hash set for large populations
+        if n > 1e7 and size <= n / 2:
+            drawn = set()
+            i = 0
+            while i < size:
+                value = self.unif_index(n)
+                if value not in drawn:
+                    drawn.add(value)
+                    sample[i] = value + 1
+                    i += 1
+            return sample
+
+        x = np.arange(n, dtype=np.int64)
+        for i in range(size):
+            j = self.unif_index(n)
+            sample[i] = x[j] + 1
+            n -= 1
+            x[j] = x[n]
+        return sample
+
+    def _rbits(self, bits: int):
+        """ Returns a random integer of bits bits built from 16 bits per uniform random number """
+        value = 0
+        for _ in range(0, bits + 1, 16):
+            value = 65536 * value + int(self.unif_rand() * 65536)
+        return value & ((1 << bits) - 1)
+
+
+def r_sample(n: int, size: int, seed: int):
+    """
+    Returns the integers from 1 to n sampled by set.seed(seed); sample(n, size) in R
+
+    Args
+        n (integer): the number of integers to sample from
+        size (integer): the number of integers to sample
+        seed (integer): the seed given to set.seed in R
+    Return
+        sample (ndarray): the sampled integers, starting at 1 like R
+    """
+    return RRandom(seed).sample(n, size)
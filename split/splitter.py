@@ -0,0 +1,112 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import pandas as pd
+
+# Registered split methods where the (key, value) is (SPLIT_METHOD name, Splitter class)
+SPLITTERS = dict()
+
+
+def register_splitter(name: str):
+    """
+    Class decorator that registers a Splitter class for a SPLIT_METHOD name
+
+    Args
+        name (string): the name of the split method e.g. random, sequential
+    """
+
+    def decorator(cls):
+        cls.name = name
+        SPLITTERS[name] = cls
+        return cls
+
+    return decorator
+
+
+def get_splitter(name: str, parameters: dict = None):
+    """
+    Returns a Splitter object for a split method
+
+    Args
+        name (string): the name of the split method e.g. random, sequential
+        parameters (dictionary): the parameters of the split method from the SPLIT environment variable
+    Return
+        splitter (Splitter): the Splitter object, or None if the split method is not registered
+    """
+    if name not in SPLITTERS:
+        return None
+    return SPLITTERS[name](parameters)
+
+
+class Splitter():
+    """
+    Splits a dataset into training and testing sets in-process
+
+    Args
+        parameters (dictionary): the parameters of the split method from the SPLIT environment variable
+    """
+    name = None
+
+    def __init__(self, parameters: dict = None):
+        self.parameters = parameters or dict()
+
+    def split(self, dataset: pd.DataFrame):
+        """
+        Splits a dataset into training and testing sets
+
+        Args
+            dataset (DataFrame): the dataset to split
+        Return
+            training_set (DataFrame): A DataFrame of the training set
+            testing_set (DataFrame): A DataFrame of the testing set
+        """
+        raise NotImplementedError
+
+
+@register_splitter("none")
+class NoneSplitter(Splitter):
+    """
+    Does not split the dataset. The entire dataset becomes the training set and the testing set is empty
+    """
+
+    def split(self, dataset: pd.DataFrame):
+        return dataset, dataset.iloc[0:0]
+
+
+@register_splitter("random")
+class RandomSplitter(Splitter):
+    """
+    Splits the dataset into random training and testing sets
+
+    Parameters
+        test_size (float or integer): a decimal percentage of the dataset to include in the test set or the absolute
+            number of test samples
+    """
+
+    def split(self, dataset: pd.DataFrame):
+        from sklearn.model_selection import train_test_split
+        training_set, testing_set = train_test_split(dataset, test_size=self.parameters["test_size"])
+        return training_set, testing_set
+
+
+@register_splitter("sequential")
+class SequentialSplitter(Splitter):
+    """
+    Splits the dataset sequentially into training and testing sets. The testing set is composed of the last rows of
+    the dataset
+
+    Parameters
+        test_size (dictionary):
+            N (integer): the number of samples in the testing set if the rows in the dataset > N
+            percent (float): the percentage of samples in the testing set if the rows in the dataset <= N
+    """
+
+    def split(self, dataset: pd.DataFrame):
+        rows = dataset.shape[0]
+        test_size_N = self.parameters["test_size"]["N"]
+        test_size_percent = self.parameters["test_size"]["percent"]
+
+        if rows > test_size_N:
+            training_rows = rows - test_size_N
+        else:
+            training_rows = int(rows * (1 - test_size_percent))
+        return dataset.iloc[:training_rows, :], dataset.iloc[training_rows:, :]
@@ -0,0 +1,113 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import os
+
+import pandas as pd
+
+from utils.artifact_cache import ArtifactCache, hash_file
+
+
+def write(path, content: bytes):
+    with open(str(path), 'wb') as fp:
+        fp.write(content)
+    return str(path)
+
+
+def test_key_changes_with_inputs(tmp_path):
+    dataset = pd.DataFrame({"x": [1.0, 2.0], "y": [3, 4]})
+    notebook = write(tmp_path / "model.ipynb", b'{"cells": []}')
+    model = {"notebook": "model.ipynb", "kernel": "python3", "alpha": 0.1}
+    key = ArtifactCache.key(dataset, hash_file(notebook), model)
+
+    # The index of the DataFrame and the order of the keys of a dictionary are not inputs
+    assert ArtifactCache.key(dataset.set_index(pd.Index([5, 6])), hash_file(notebook),
+                             dict(reversed(list(model.items())))) == key
+
+    changed = dataset.copy()
+    changed.loc[1, "x"] = 2.5
+    assert ArtifactCache.key(changed, hash_file(notebook), model) != key
+    assert ArtifactCache.key(dataset.astype({"y": "float64"}), hash_file(notebook), model) != key
+    write(tmp_path / "model.ipynb", b'{"cells": [1]}')
+    assert ArtifactCache.key(dataset, hash_file(notebook), model) != key
+    write(tmp_path / "model.ipynb", b'{"cells": []}')
+    assert ArtifactCache.key(dataset, hash_file(notebook), dict(model, alpha=0.2)) != key
+    assert ArtifactCache.key(dataset, hash_file(notebook), model) == key
+
+
+def test_hit_restores_files(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"), 1024)
+    files = {"output.csv": write(tmp_path / "output.csv", b'a,b\n1,2\n'), "model.pkl": write(tmp_path / "m", b'\x00')}
+    assert cache.get("model", "k1", str(tmp_path / "run")) is None
+    assert cache.put("model", "k1", files)
+
+    restored = cache.get("model", "k1", str(tmp_path / "run"))
+    assert sorted(restored) == ["model.pkl", "output.csv"]
+    with open(restored["output.csv"], 'rb') as fp:
+        assert fp.read() == b'a,b\n1,2\n'
+    assert (cache.hits, cache.misses) == ({"model": 1}, {"model": 1})
+
+    # A new process finds the entries of a previous run
+    assert ArtifactCache(str(tmp_path / "cache"), 1024).get("model", "k1", str(tmp_path / "again")) is not None
+
+
+def test_put_skips_missing_and_large_files(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"), 4)
+    assert not cache.put("split", "k1", {"missing.csv": str(tmp_path / "missing.csv")})
+    assert not cache.put("split", "k2", {"large.csv": write(tmp_path / "large.csv", b'12345')})
+    assert cache.size() == 0
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"), 25)
+    for key in ["k1", "k2"]:
+        cache.put("split", key, {"set.csv": write(tmp_path / (key + ".csv"), b'0123456789')})
+    assert cache.get("split", "k1", str(tmp_path / "run")) is not None
+    cache.put("split", "k3", {"set.csv": write(tmp_path / "k3.csv", b'0123456789')})
+
+    assert cache.size() == 20
+    assert sorted(os.listdir(str(tmp_path / "cache"))) == ["k1", "k3"]
+    assert cache.get("split", "k2", str(tmp_path / "run")) is None
+
+
+def test_partial_entries_are_discarded(tmp_path):
+    directory = tmp_path / "cache"
+    partial = directory / ".k1.1234"
+    partial.mkdir(parents=True)
+    write(partial / "set.csv", b'0123')
+    incomplete = directory / "k2"
+    incomplete.mkdir()
+
+    cache = ArtifactCache(str(directory), 1024)
+    assert cache.size() == 0
+    assert os.listdir(str(directory)) == list()
+
+
+def test_entry_stored_by_another_process(tmp_path):
+    directory = str(tmp_path / "cache")
+    files = {"set.csv": write(tmp_path / "set.csv", b'0123')}
+    cache = ArtifactCache(directory, 1024)
+    assert cache.size() == 0
+    assert ArtifactCache(directory, 1024).put("split", "k1", files)
+
+    # The entry is on disk but was not loaded by this cache
+    assert cache.put("split", "k1", files)
+    assert cache.size() == 4
+    assert sorted(os.listdir(directory)) == ["k1"]
+    assert cache.get("split", "k1", str(tmp_path / "run")) is not None
+
+
+def test_model_parameters_key(tmp_path):
+    from adapter.adapter_config import AdapterConfig
+    from adapter.ml_adapter import ML_Adapter
+
+    def parameters(data: dict, directory: str):
+        ml_adapter = ML_Adapter.__new__(ML_Adapter)
+        ml_adapter.data = AdapterConfig("object", data, directory=directory).data
+        return ml_adapter.model_parameters()
+
+    data = {"MODEL": {"notebook": "model.ipynb", "kernel": "python3", "model_serialization_file": "data/model.pkl"}}
+    first = ArtifactCache.key(parameters(data, str(tmp_path / "run1")))
+    # The scratch directories of the runs are not inputs of the models, the parameters of the MODEL key are
+    assert ArtifactCache.key(parameters(data, str(tmp_path / "run2"))) == first
+    data["MODEL"]["n_estimators"] = 10
+    assert ArtifactCache.key(parameters(data, str(tmp_path / "run1"))) != first
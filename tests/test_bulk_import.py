@@ -0,0 +1,27 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import json
+
+from adapter.bulk_import import read_records
+
+
+def test_read_records_csv(tmp_path):
+    path = tmp_path / "results.csv"
+    path.write_text("id,value,label\n1,0.5,a\n2,,b\n3,1.5,\n")
+    records = read_records(str(path), chunk_rows=2)
+    # The rows are streamed one chunk at a time
+    assert next(records) == {"id": 1, "value": 0.5, "label": "a"}
+    assert list(records) == [{"id": 2, "value": None, "label": "b"}, {"id": 3, "value": 1.5, "label": None}]
+
+
+def test_read_records_json(tmp_path):
+    rows = [{"id": 1, "value": 0.5}, {"id": 2, "value": None}]
+    jsonl = tmp_path / "results.jsonl"
+    jsonl.write_text("\n".join(json.dumps(row) for row in rows) + "\n\n")
+    assert list(read_records(str(jsonl))) == rows
+
+    document = tmp_path / "results.json"
+    document.write_text(json.dumps(rows))
+    assert list(read_records(str(document))) == rows
+    document.write_text(json.dumps(rows[0]))
+    assert list(read_records(str(document))) == rows[:1]
@@ -0,0 +1,126 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import time
+import threading
+
+import pytest
+import urllib3
+from deep_lynx.rest import ApiException
+
+from adapter import deep_lynx_client
+from adapter.deep_lynx_client import DeepLynxClient, parse_expiry
+
+
+class Stub():
+    """ A method of an API object that raises the given errors before it returns ok """
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+        self.__name__ = "stub"
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = DeepLynxClient("http://127.0.0.1:9", api_key="key", api_secret="secret", retries=3, backoff=0.5)
+    client.refreshes = 0
+
+    def refresh_token():
+        client.refreshes += 1
+
+    client.refresh_token = refresh_token
+    client.waits = list()
+    monkeypatch.setattr(deep_lynx_client.time, "sleep", client.waits.append)
+    return client
+
+
+@pytest.mark.parametrize("error", [ApiException(status=503), ApiException(status=429), urllib3.exceptions.HTTPError()])
+def test_idempotent_call_is_retried(client, error):
+    function = Stub(error, error)
+    assert client.call(function) == "ok"
+    assert function.calls == 3
+    # Exponential backoff with jitter of 0.5 to 1.5 times
+    assert len(client.waits) == 2
+    assert 0.25 <= client.waits[0] <= 0.75 and 0.5 <= client.waits[1] <= 1.5
+
+
+def test_retries_are_bounded(client):
+    function = Stub(*[ApiException(status=503)] * 10)
+    with pytest.raises(ApiException):
+        client.call(function)
+    assert function.calls == client.retries + 1
+
+
+@pytest.mark.parametrize("error", [ApiException(status=503), urllib3.exceptions.HTTPError()])
+def test_non_idempotent_call_is_not_retried(client, error):
+    function = Stub(error)
+    with pytest.raises(type(error)):
+        client.call(function, idempotent=False)
+    assert function.calls == 1
+    assert client.waits == list()
+
+
+@pytest.mark.parametrize("status", [400, 404])
+def test_client_errors_are_not_retried(client, status):
+    function = Stub(ApiException(status=status))
+    with pytest.raises(ApiException):
+        client.call(function)
+    assert function.calls == 1
+
+
+@pytest.mark.parametrize("idempotent", [True, False])
+def test_unauthorized_refreshes_the_token_once(client, idempotent):
+    function = Stub(ApiException(status=401))
+    assert client.call(function, idempotent=idempotent) == "ok"
+    assert (function.calls, client.refreshes) == (2, 1)
+
+    function = Stub(ApiException(status=401), ApiException(status=401))
+    with pytest.raises(ApiException) as error:
+        client.call(function, idempotent=idempotent)
+    assert error.value.status == 401
+    assert (function.calls, client.refreshes) == (2, 2)
+    assert client.waits == list()
+
+
+def test_unauthorized_without_api_key_is_raised(client):
+    client.api_key = None
+    function = Stub(ApiException(status=401))
+    with pytest.raises(ApiException):
+        client.call(function)
+    assert (function.calls, client.refreshes) == (1, 0)
+
+
+def test_token_is_refreshed_before_it_expires(client):
+    # A failed refresh is tried again after max(1, backoff) seconds
+    failures = [ApiException(status=503)]
+
+    def refresh_token():
+        if failures:
+            raise failures.pop(0)
+        client.refreshes += 1
+        client.expires_at = time.time() + client.expiry_seconds
+        client.stop()
+
+    client.refresh_token = refresh_token
+    client.expires_at = time.time() + client.refresh_margin
+    refresher = threading.Thread(target=client._refresh, daemon=True)
+    start = time.monotonic()
+    refresher.start()
+    refresher.join(10)
+    assert not refresher.is_alive()
+    assert client.refreshes == 1
+    assert 1 <= time.monotonic() - start < 10
+
+
+def test_parse_expiry():
+    assert parse_expiry("12h") == 12 * 3600
+    assert parse_expiry("30m") == 1800
+    assert parse_expiry("3600") == 3600
+    with pytest.raises(ValueError):
+        parse_expiry("soon")
@@ -0,0 +1,40 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import io
+
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+from adapter.deep_lynx_query import tail_csv, tail_chunks
+
+
+def write_csv(path, ending: str, trailing: str):
+    lines = ["a,b"] + ["{0},{1}".format(i, i * 1000) for i in range(100)]
+    with open(str(path), 'w', newline='') as fp:
+        fp.write(ending.join(lines) + trailing)
+
+
+@pytest.mark.parametrize("trailing", ["", "\n", "\n\n\n", "\r\n\r\n"])
+@pytest.mark.parametrize("block_size", [1, 3, 16, 1 << 16])
+@pytest.mark.parametrize("rows", [1, 5, 100, 150])
+def test_tail_csv(tmp_path, trailing, block_size, rows):
+    path = tmp_path / "file.csv"
+    write_csv(path, "\r\n" if "\r" in trailing else "\n", trailing)
+    header, data = tail_csv(str(path), rows, block_size)
+
+    expected = pd.read_csv(str(path)).tail(rows).reset_index(drop=True)
+    pdt.assert_frame_equal(pd.read_csv(io.BytesIO(header + data)), expected)
+
+
+def test_tail_csv_quoted_values(tmp_path):
+    path = tmp_path / "file.csv"
+    path.write_text('a,b\n1,"x\ny"\n2,z\n')
+    assert tail_csv(str(path), 1, 4)[1] is None
+
+
+def test_tail_chunks():
+    dataset = pd.DataFrame({"a": range(10)})
+    chunks = (dataset.iloc[i:i + 3] for i in range(0, 10, 3))
+    assert tail_chunks(chunks, 4)["a"].tolist() == [6, 7, 8, 9]
+    assert tail_chunks(iter(list()), 4).empty
@@ -0,0 +1,173 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import threading
+
+import pytest
+from deep_lynx import MetatypeKey, KeyValidation
+
+from adapter.metatype_cache import MetatypeSchema, MetatypeCache, _valid_value
+
+
+def key(data_type: str, name: str = "value", required: bool = False, **kwargs):
+    return MetatypeKey(name=name,
+                       description=name,
+                       property_name=name,
+                       data_type=data_type,
+                       required=required,
+                       metatype_id="1",
+                       **kwargs)
+
+
+@pytest.mark.parametrize(
+    "data_type, options, value, valid",
+    [
+        # number and number64 are integers, float and float64 are any number
+        ("number", dict(), 3, True),
+        ("number", dict(), "3", True),
+        ("number", dict(), 3.0, True),
+        ("number", dict(), 3.5, False),
+        ("number", dict(), "3.5", False),
+        ("number64", dict(), 2**40, True),
+        ("number64", dict(), 0.1, False),
+        ("number", dict(), "three", False),
+        ("number", dict(), True, False),
+        ("float", dict(), 3.5, True),
+        ("float64", dict(), "-1e3", True),
+        ("float", dict(), "x", False),
+        ("float", dict(), False, False),
+        ("float", dict(), [1.0], False),
+        # min and max validations
+        ("number", dict(validation=KeyValidation(min=0, max=10)), 0, True),
+        ("number", dict(validation=KeyValidation(min=0, max=10)), 10, True),
+        ("number", dict(validation=KeyValidation(min=0, max=10)), -1, False),
+        ("float", dict(validation=KeyValidation(min=0, max=10)), 10.5, False),
+        ("float", dict(validation=KeyValidation(min=None, max=10)), -1e9, True),
+        # regex validations
+        ("string", dict(), "abc", True),
+        ("string", dict(), 1, False),
+        ("string", dict(validation=KeyValidation(regex="^[A-Z]{2}[0-9]+$")), "AB12", True),
+        ("string", dict(validation=KeyValidation(regex="^[A-Z]{2}[0-9]+$")), "ab12", False),
+        ("string", dict(validation=KeyValidation(regex="")), "anything", True),
+        # enumeration options
+        ("enumeration", dict(options=["on", "off"]), "on", True),
+        ("enumeration", dict(options=["on", "off"]), "standby", False),
+        ("enumeration", dict(options=[1, 2]), "2", True),
+        ("enumeration", dict(options=None), "any", True),
+        ("boolean", dict(), True, True),
+        ("boolean", dict(), "False", True),
+        ("boolean", dict(), "yes", False),
+        ("date", dict(), "2021-06-01T12:00:00Z", True),
+        ("date", dict(), "not a date", False),
+        ("list", dict(), [1, 2], True),
+        ("list", dict(), "1,2", False),
+        ("file", dict(), "anything", True),
+        ("unknown", dict(), object(), True),
+        # data types that are not checked locally are validated by Deep Lynx
+        ("relationship", dict(), "x", None),
+        ("geometry", dict(), "x", None),
+    ])
+def test_valid_value(data_type, options, value, valid):
+    assert _valid_value(key(data_type, **options), value) is valid
+
+
+def test_schema_validate():
+    schema = MetatypeSchema("Sensor", "1", [
+        key("string", "name", required=True),
+        key("number", "count", validation=KeyValidation(min=0, max=None)),
+        key("float", "reading", required=True),
+        key("number", "retired", archived=True),
+    ])
+    assert schema.required == ["name", "reading"]
+    assert schema.validate({"name": "a", "reading": 1.5}) == list()
+    # Optional properties may be missing or null, and properties without a key are not checked
+    assert schema.validate({"name": "a", "reading": 1.5, "count": None, "other": "x", "retired": "x"}) == list()
+
+    errors = schema.validate({"reading": None, "count": -1})
+    assert errors == [
+        "Sensor: missing required property name",
+        "Sensor: missing required property reading",
+        "Sensor: property count of value -1 is not a valid number",
+    ]
+
+    # A property of a data type that is not checked locally sends the node to Deep Lynx
+    schema = MetatypeSchema("Sensor", "1", [key("string", "name", required=True), key("geometry", "shape")])
+    assert schema.validate({"name": "a", "shape": "POINT(0 0)"}) is None
+    assert schema.validate({"name": "a"}) == list()
+
+
+class Metatype():
+
+    def __init__(self, name: str, id: str, keys: list):
+        self.name = name
+        self.id = id
+        self.keys = keys
+
+
+class Client():
+    """ A Deep Lynx client whose validation endpoint rejects the nodes of the invalid list """
+
+    def __init__(self, metatypes: list, invalid: list = None):
+        self.pool_size = 2
+        self.metatypes = self
+        self.listed = list()
+        self.validated = list()
+        self._metatypes = metatypes
+        self._invalid = invalid or list()
+        self._lock = threading.Lock()
+
+    def call(self, function, *args, **kwargs):
+        return function(*args, **kwargs)
+
+    def list_metatypes(self, container_id: str, name: str, load_keys: str):
+        self.listed.append(name)
+        return [metatype for metatype in self._metatypes if name in metatype.name]
+
+    def validate_metatype_properties(self, container_id: str, metatype_id: str, body: dict):
+        with self._lock:
+            self.validated.append(body)
+        if body in self._invalid:
+            return {"isError": True, "error": "invalid " + str(body)}
+        return {"isError": False, "value": None}
+
+
+def test_cache_validates_locally_and_remotely():
+    sensor = Metatype("Sensor", "1", [key("number", "count", required=True), key("geometry", "shape")])
+    client = Client([sensor, Metatype("SensorReading", "2", list())], invalid=[{"count": 1, "shape": "bad"}])
+    cache = MetatypeCache(client, "container", ttl=300, sample_rate=0)
+
+    payload = {
+        "Sensor": [{
+            "count": 1
+        }, {
+            "count": 1.5
+        }, {
+            "count": 1,
+            "shape": "bad"
+        }, {
+            "count": 2,
+            "shape": "ok"
+        }],
+        "Missing": [{
+            "x": 1
+        }]
+    }
+    errors = cache.validate(payload)
+    assert errors == [
+        "Sensor: property count of value 1.5 is not a valid number", "invalid {'count': 1, 'shape': 'bad'}",
+        "Missing: metatype not found"
+    ]
+    # Only the nodes with a property that is not checked locally are validated by Deep Lynx
+    assert sorted(node["shape"] for node in client.validated) == ["bad", "ok"]
+    # The schema of every metatype name, or that it is not found, is retrieved once
+    assert client.listed == ["Sensor", "Missing"]
+    assert cache.get("Sensor").id == "1"
+    assert cache.get("Missing") is None
+    assert client.listed == ["Sensor", "Missing"]
+
+
+def test_sampled_node_rejected_by_deep_lynx_drops_the_schema():
+    client = Client([Metatype("Sensor", "1", [key("number", "count")])], invalid=[{"count": 1}])
+    cache = MetatypeCache(client, "container", ttl=300, sample_rate=1.0)
+    assert cache.validate({"Sensor": [{"count": 1}]}) == ["invalid {'count': 1}"]
+    cache.validate({"Sensor": [{"count": 2}]})
+    assert client.listed == ["Sensor", "Sensor"]
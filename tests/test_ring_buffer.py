@@ -0,0 +1,55 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import os
+
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+
+from adapter.ring_buffer import RingBuffer
+
+
+def batch(start: int, rows: int):
+    return pd.DataFrame({
+        "x": np.arange(start, start + rows, dtype=np.float64),
+        "n": np.arange(start, start + rows, dtype=np.int64),
+        "state": ["s" + str(i % 3) for i in range(start, start + rows)]
+    })
+
+
+def test_window_keeps_last_rows():
+    window = RingBuffer(5)
+    for start in range(0, 12, 3):
+        window.append(batch(start, 3))
+    assert window.is_full()
+    assert window.snapshot()["n"].tolist() == [7, 8, 9, 10, 11]
+    assert window.head_offset == 7
+
+
+def test_extension_dtypes_are_kept():
+    window = RingBuffer(4)
+    window.append(pd.DataFrame({"state": pd.Categorical(["a", "b"]), "count": pd.array([1, None], dtype="Int64")}))
+    window.append(pd.DataFrame({"state": pd.Categorical(["c", "a", "c"]), "count": pd.array([3, 4, 5], dtype="Int64")}))
+    snapshot = window.snapshot()
+    assert snapshot["state"].dtype == pd.CategoricalDtype(["a", "b", "c"])
+    assert snapshot["state"].tolist() == ["b", "c", "a", "c"]
+    assert str(snapshot["count"].dtype) == "Int64"
+    assert snapshot["count"].isna().tolist() == [True, False, False, False]
+
+
+def test_window_is_restored_from_segments(tmp_path):
+    path = str(tmp_path / "queue.csv")
+    window = RingBuffer(6, spill_path=path, segment_rows=4)
+    for start in range(0, 10, 2):
+        window.append(batch(start, 2))
+    expected = window.snapshot()
+
+    restored = RingBuffer(6, spill_path=path, segment_rows=4)
+    pdt.assert_frame_equal(restored.snapshot(), expected)
+
+    # New rows go to new segments, and the segments of the previous run are deleted once their rows are evicted
+    segments = set(os.listdir(str(tmp_path)))
+    restored.append(batch(10, 6))
+    assert restored.snapshot()["n"].tolist() == list(range(10, 16))
+    assert not segments & set(os.listdir(str(tmp_path)))
+    pdt.assert_frame_equal(RingBuffer(6, spill_path=path, segment_rows=4).snapshot(), restored.snapshot())
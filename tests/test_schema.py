@@ -0,0 +1,31 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import io
+
+import numpy as np
+import pytest
+
+from utils import schema
+
+
+@pytest.fixture(autouse=True)
+def schema_registries(monkeypatch):
+    monkeypatch.setattr(schema, "schema_registries", dict())
+    monkeypatch.delenv("DATASET_SCHEMA", raising=False)
+    monkeypatch.delenv("DATASET_COMPACT_DTYPES", raising=False)
+    monkeypatch.delenv("DATASET_FLOAT_DTYPE", raising=False)
+
+
+def test_default_dtypes():
+    dataset = schema.read_csv(io.BytesIO(b"x,y\n1.5,2.25\n2.0,3.0\n"))
+    assert dataset.dtypes.tolist() == [np.dtype(np.float64)] * 2
+    assert schema.get_schema_registry() is None
+
+
+def test_schema_per_dataset(monkeypatch):
+    monkeypatch.setenv("DATASET_COMPACT_DTYPES", "true")
+    queue = schema.read_csv(io.BytesIO(b"x\n1\n2\n"))
+    training_set = schema.read_csv(io.BytesIO(b"x\na\na\n"), dataset="object")
+    assert queue["x"].dtype == np.dtype(np.int32)
+    assert str(training_set["x"].dtype) == "category"
+    assert schema.get_schema_registry() is not schema.get_schema_registry("object")
@@ -0,0 +1,112 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from split.r_random import RRandom, r_sample
+from split.kennard_stone import KennardStoneSplitter, kennard_stone
+
+
+@pytest.mark.parametrize("seed, n, size, expected", [
+    (1, 10, 10, [9, 4, 7, 1, 2, 5, 3, 10, 6, 8]),
+    (42, 10, 10, [1, 5, 10, 8, 2, 4, 6, 9, 7, 3]),
+    (123, 10, 10, [3, 10, 2, 8, 6, 9, 1, 7, 5, 4]),
+    (1, 100, 3, [68, 39, 1]),
+    (42, 100, 5, [49, 65, 25, 74, 18]),
+    (123, 100, 5, [31, 79, 51, 14, 67]),
+])
+def test_r_sample(seed, n, size, expected):
+    """ set.seed(seed); sample(n, size) in R 3.6 and later """
+    assert r_sample(n, size, seed).tolist() == expected
+
+
+@pytest.mark.parametrize("seed, expected", [
+    (1, [0.2655087, 0.3721239, 0.5728534]),
+    (42, [0.9148060, 0.9370754, 0.2861395]),
+    (123, [0.2875775, 0.7883051, 0.4089769]),
+])
+def test_unif_rand(seed, expected):
+    """ set.seed(seed); runif(3) in R """
+    generator = RRandom(seed)
+    assert [generator.unif_rand() for _ in expected] == pytest.approx(expected, abs=1e-7)
+
+
+def test_r_sample_larger_than_population():
+    with pytest.raises(ValueError):
+        r_sample(5, 6, 1)
+
+
+# A fixture without ties or near ties, so the selection of prospectr::kenStone does not depend on rounding
+KENNARD_STONE_X = np.array([[0, 0], [1, 5], [4, 1], [9, 9], [2, 8], [7, 3], [5, 6], [8, 0]], dtype=np.float64)
+# prospectr::kenStone(X, k = 6, metric = "euclid")$model, which starts with arrayInd(which.max(D)) = c(4, 1)
+KENNARD_STONE_MODEL = [4, 1, 8, 5, 3, 7]
+
+
+def test_kennard_stone_r_fixture():
+    assert (kennard_stone(KENNARD_STONE_X, 6) + 1).tolist() == KENNARD_STONE_MODEL
+
+
+def test_kennard_stone_splitter_r_fixture():
+    dataset = pd.DataFrame(KENNARD_STONE_X, columns=["x1", "x2"])
+    dataset["label"] = list("abcdefgh")
+    training_set, testing_set = KennardStoneSplitter({"N": 8, "k": 6}).split(dataset)
+    assert (training_set.index + 1).tolist() == KENNARD_STONE_MODEL
+    assert (testing_set.index + 1).tolist() == [2, 6]
+
+
+def brute_force_kennard_stone(X: np.ndarray, k: int):
+    """ prospectr::kenStone with the euclid metric: the full distance matrix and which.max in column-major order """
+    m = X.shape[0]
+    D = ((X[:, None, :] - X[None, :, :])**2).sum(axis=2)
+    index = int(np.argmax(D.flatten(order="F")))
+    selection = [index % m, index // m]
+    while len(selection) < min(k, m):
+        remaining = [i for i in range(m) if i not in selection]
+        nearest = D[np.ix_(remaining, selection)].min(axis=1)
+        selection.append(remaining[int(np.argmax(nearest))])
+    return selection[:k]
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 1024])
+def test_kennard_stone_float(block_size):
+    X = np.random.default_rng(0).normal(size=(200, 4))
+    assert kennard_stone(X, 50, block_size).tolist() == brute_force_kennard_stone(X, 50)
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 1024])
+def test_kennard_stone_integer_ties(block_size):
+    # Few distinct integer values give many exactly tied distances
+    X = np.random.default_rng(1).integers(0, 4, size=(150, 3)).astype(np.float64)
+    assert kennard_stone(X, 40, block_size).tolist() == brute_force_kennard_stone(X, 40)
+
+
+def test_kennard_stone_decimal_ties():
+    # Centering the samples before computing the distances breaks some of these ties differently than R
+    rng = np.random.default_rng(1)
+    m, high, columns = rng.integers(7, 40), rng.integers(3, 10), rng.integers(2, 8)
+    X = (rng.integers(0, high, size=(m, columns)) * 0.1).round(1)
+    assert kennard_stone(X, m // 2).tolist() == brute_force_kennard_stone(X, m // 2)
+
+
+def test_kennard_stone_small():
+    X = np.array([[0.0, 0.0], [1.0, 1.0], [3.0, 0.0]])
+    assert kennard_stone(X, 0).tolist() == list()
+    assert kennard_stone(X[:1], 2).tolist() == [0]
+    assert kennard_stone(X, 5).tolist() == brute_force_kennard_stone(X, 3)
+
+
+def test_kennard_stone_splitter():
+    rng = np.random.default_rng(2)
+    dataset = pd.DataFrame({
+        "a": rng.integers(0, 10, size=300),
+        "b": rng.normal(size=300),
+        "flag": rng.integers(0, 2, size=300).astype(bool),
+        "label": ["x"] * 300
+    })
+    training_set, testing_set = KennardStoneSplitter({"N": 100, "k": 30}).split(dataset)
+
+    sample_index = r_sample(300, 100, 10000) - 1
+    X = dataset[["a", "b"]].to_numpy(dtype=np.float64)[sample_index]
+    assert training_set.index.tolist() == sample_index[brute_force_kennard_stone(X, 30)].tolist()
+    assert sorted(training_set.index.tolist() + testing_set.index.tolist()) == list(range(300))
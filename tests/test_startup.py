@@ -0,0 +1,103 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import os
+import sys
+import json
+import shutil
+import importlib
+import threading
+import subprocess
+
+import pytest
+from dotenv import load_dotenv
+
+from benchmark.startup_time import SERVE_SCRIPT
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds within which the readiness endpoint answers. Waiting for Deep Lynx would take REGISTER_WAIT_SECONDS (30)
+STARTUP_SECONDS = 10
+
+
+def test_import_adapter_is_lazy(tmp_path):
+    """ The HTTP server starts before pandas, deep_lynx and the Jupyter packages are imported """
+    code = "import sys, json, adapter; print(json.dumps([name for name in {0!r} if name in sys.modules]))".format(
+        ["pandas", "deep_lynx", "nbconvert", "nbclient"])
+    environment = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, "-c", code],
+                            cwd=str(tmp_path),
+                            env=environment,
+                            stdout=subprocess.PIPE,
+                            check=True,
+                            universal_newlines=True)
+    assert json.loads(result.stdout.splitlines()[-1]) == list()
+
+
+def test_startup_time(tmp_path):
+    """ create_app answers /machinelearning/ready at once while an unreachable Deep Lynx is retried """
+    shutil.copy(os.path.join(ROOT, ".env_sample"), str(tmp_path / ".env"))
+    environment = dict(os.environ,
+                       PYTHONPATH=ROOT,
+                       FLASK_APP="adapter",
+                       FLASK_RUN_HOST="127.0.0.1",
+                       FLASK_RUN_PORT="5000",
+                       WERKZEUG_RUN_MAIN="true",
+                       DEEP_LYNX_URL="http://127.0.0.1:9",
+                       DEEP_LYNX_RETRIES="0")
+    # A server that blocks on Deep Lynx never answers, so the process is stopped after a few times the bound
+    result = subprocess.run([sys.executable, "-c", SERVE_SCRIPT],
+                            cwd=str(tmp_path),
+                            env=environment,
+                            stdout=subprocess.PIPE,
+                            check=True,
+                            universal_newlines=True,
+                            timeout=3 * STARTUP_SECONDS)
+    result = json.loads(result.stdout.splitlines()[-1])
+    assert result["status"] == 503
+    assert result["seconds"] < STARTUP_SECONDS
+
+
+@pytest.fixture
+def app_environment(tmp_path, monkeypatch):
+    """ Runs create_app in a directory of its own with the .env_sample settings, as the reloaded process of flask run """
+    shutil.copy(os.path.join(ROOT, ".env_sample"), str(tmp_path / ".env"))
+    monkeypatch.chdir(tmp_path)
+    environment = dict(os.environ)
+    load_dotenv(".env")
+    os.environ.update({"FLASK_APP": "adapter", "WERKZEUG_RUN_MAIN": "true"})
+    yield
+    os.environ.clear()
+    os.environ.update(environment)
+
+
+def test_ready_after_initialization(app_environment, monkeypatch):
+    import adapter
+    deep_lynx_startup = importlib.import_module("adapter.deep_lynx_startup")
+
+    # Deep Lynx is found at once, and the initialization waits until it is released
+    release = threading.Event()
+    initialized = list()
+
+    def initialize(api):
+        assert release.wait(10)
+        initialized.append(api)
+
+    api_client = object()
+    monkeypatch.setattr(adapter, "initialize", initialize)
+    monkeypatch.setattr(deep_lynx_startup, "deep_lynx_init", lambda: ("container", "data source", api_client))
+    monkeypatch.setattr(deep_lynx_startup, "register_for_event", lambda api, iterations: True)
+
+    client = adapter.create_app().test_client()
+    response = client.get("/machinelearning/ready")
+    assert response.status_code == 503
+    assert response.get_json()["ready"] is False
+    response = client.post("/machinelearning", json={"query": {"fileID": "1"}})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+
+    release.set()
+    assert adapter.startup.wait(10)
+    assert initialized == [api_client]
+    response = client.get("/machinelearning/ready")
+    assert response.status_code == 200
+    assert response.get_json()["ready"] is True
@@ -1,4 +1,29 @@
 # Copyright 2021, Battelle Energy Alliance, LLC
 
+import importlib
+
 from .validate import validate_extension, validate_paths_exist
-from .run_jupyter_notebook import run_jupyter_notebook
+from .file_watcher import InotifyWatcher, PollingWatcher, get_file_watcher, wait_for_file
+from .metrics import Counter, Gauge, Histogram, MetricsRegistry, get_metrics_registry
+
+# The names of the modules that import pandas or the Jupyter packages, which are imported on first use
+LAZY_MODULES = {
+    "run_jupyter_notebook": ["run_jupyter_notebook", "get_kernel_pool"],
+    "kernel_pool": ["KernelPool"],
+    "handoff": ["write_dataset", "load_dataset", "write_model_sets", "load_model_sets", "load_model_deltas"],
+    "artifact_cache": ["ArtifactCache", "get_artifact_cache", "hash_dataframe", "hash_file", "hash_package"],
+    "schema": ["SchemaRegistry", "get_schema_registry", "read_csv", "read_csv_chunks"],
+}
+LAZY_NAMES = {name: module for module, names in LAZY_MODULES.items() for name in names}
+
+
+def __getattr__(name: str):
+    """ Imports the module of a name of LAZY_NAMES, or a module of LAZY_MODULES e.g. utils.handoff, on first use """
+    if name not in LAZY_NAMES and name not in LAZY_MODULES:
+        raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+    module_name = LAZY_NAMES.get(name, name)
+    module = importlib.import_module("." + module_name, __name__)
+    # Every name of the module is bound, since importing a module binds its own name e.g. run_jupyter_notebook
+    for lazy_name in LAZY_MODULES[module_name]:
+        globals()[lazy_name] = getattr(module, lazy_name)
+    return globals()[name] if name in LAZY_NAMES else module
@@ -0,0 +1,247 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+from .metrics import get_metrics_registry
+
+# File of an entry that lists the files and the stage of the entry
+ENTRY_FILE = "entry.json"
+
+artifact_cache = None
+artifact_cache_lock = threading.Lock()
+
+
+class ArtifactCache():
+    """
+    A content-addressed cache of the files produced by the stages of an ML Adapter object (split, variable selection,
+    model), so that a stage whose inputs did not change is not run again
+
+        1. A stage is keyed by a hash of its inputs e.g. the queue window, the bytes of the Jupyter Notebook, the kernel
+           and the parameters of the stage, see key
+        2. An entry is a directory <directory>/<key>/ of copies of the files of the stage
+        3. Entries are evicted least recently used first once the entries take more than max_bytes
+
+    Args
+        directory (string): the directory of the entries, which is kept between runs of the ML Adapter
+        max_bytes (integer): the number of bytes the entries may take
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = dict()
+        self.misses = dict()
+        self._lock = threading.Lock()
+        # The size of every entry, from least to most recently used
+        self._entries = None
+
+    @staticmethod
+    def key(*parts):
+        """
+        Returns the key of the inputs of a stage
+
+        Args
+            parts: the inputs of the stage. A DataFrame is hashed by its content and any other value by its JSON
+                representation, so files are given as their hash_file digest
+        Return
+            key (string): a sha256 hex digest of the inputs
+        """
+        digest = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, pd.DataFrame):
+                digest.update(b'dataframe')
+                digest.update(hash_dataframe(part).encode())
+            else:
+                digest.update(b'value')
+                digest.update(json.dumps(part, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def get(self, stage: str, key: str, directory: str):
+        """
+        Copies the files of an entry to a directory
+
+        Args
+            stage (string): the name of the stage e.g. split, variable_selection, model
+            key (string): the key of the inputs of the stage
+            directory (string): the directory the files are copied to
+        Return
+            files (dictionary): the copied files where the (key, value) is (name, path), or None on a cache miss
+        """
+        entry = os.path.join(self.directory, key)
+        with self._lock:
+            self._load()
+            found = key in self._entries
+            if found:
+                self._entries.move_to_end(key)
+        files = None
+        if found:
+            try:
+                with open(os.path.join(entry, ENTRY_FILE)) as fp:
+                    names = json.load(fp)["files"]
+                os.makedirs(directory, exist_ok=True)
+                files = dict()
+                for name in names:
+                    files[name] = os.path.join(directory, name)
+                    shutil.copyfile(os.path.join(entry, name), files[name])
+                os.utime(entry)
+            except (OSError, ValueError, KeyError):
+                # The entry was evicted by another thread or is incomplete
+                files = None
+
+        with self._lock:
+            counts = self.hits if files is not None else self.misses
+            counts[stage] = counts.get(stage, 0) + 1
+        get_metrics_registry()["artifact_cache_total"].inc(stage=stage, result='hit' if files is not None else 'miss')
+        logging.info('Artifact cache {0} for {1} {2}'.format('hit' if files is not None else 'miss', stage, key[:12]))
+        return files
+
+    def put(self, stage: str, key: str, files: dict):
+        """
+        Stores copies of the files of a stage, evicting the least recently used entries if the cache is full
+
+        Args
+            stage (string): the name of the stage e.g. split, variable_selection, model
+            key (string): the key of the inputs of the stage
+            files (dictionary): the files of the stage where the (key, value) is (name, path)
+        Return
+            stored (boolean): True if the files were stored
+        """
+        if any(not os.path.isfile(path) for path in files.values()):
+            return False
+        size = sum(os.path.getsize(path) for path in files.values())
+        if size > self.max_bytes:
+            logging.info('Artifact cache skipped {0} {1}: {2} bytes is larger than the cache'.format(
+                stage, key[:12], size))
+            return False
+
+        with self._lock:
+            self._load()
+        entry = os.path.join(self.directory, key)
+        temporary = os.path.join(self.directory, '.{0}.{1}'.format(key, threading.get_ident()))
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+        for name, path in files.items():
+            shutil.copyfile(path, os.path.join(temporary, name))
+        with open(os.path.join(temporary, ENTRY_FILE), 'w') as fp:
+            json.dump({"stage": stage, "files": list(files), "size": size}, fp)
+
+        with self._lock:
+            stored = key in self._entries
+            if not stored:
+                try:
+                    os.replace(temporary, entry)
+                except OSError:
+                    if not os.path.isdir(entry):
+                        raise
+                    # Another ML Adapter process stored the entry, which holds the same files
+                    stored = True
+            if stored:
+                shutil.rmtree(temporary, ignore_errors=True)
+            self._entries[key] = size
+            self._entries.move_to_end(key)
+            self._evict()
+        return True
+
+    def size(self):
+        """ Returns the number of bytes the entries take """
+        with self._lock:
+            self._load()
+            return sum(self._entries.values())
+
+    def _load(self):
+        """ Reads the entries in the directory, ordered by the time they were last used """
+        if self._entries is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        entries = list()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith('.'):
+                # A partially written entry of a previous run
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            try:
+                with open(os.path.join(path, ENTRY_FILE)) as fp:
+                    size = json.load(fp)["size"]
+            except (OSError, ValueError, KeyError):
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            entries.append((os.path.getmtime(path), name, size))
+        self._entries = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self._evict()
+
+    def _evict(self):
+        """ Removes the least recently used entries until the entries take at most max_bytes """
+        total = sum(self._entries.values())
+        while total > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+            total -= size
+            logging.info('Artifact cache evicted {0}'.format(key[:12]))
+
+
+def hash_dataframe(dataset: pd.DataFrame):
+    """
+    Returns a sha256 hex digest of the columns, dtypes and values of a DataFrame. The index is not hashed
+
+    Args
+        dataset (DataFrame): the DataFrame to hash
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(column) for column in dataset.columns]).encode())
+    digest.update(json.dumps([str(dtype) for dtype in dataset.dtypes]).encode())
+    digest.update(pd.util.hash_pandas_object(dataset, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def hash_file(path: str, chunk_size: int = 1 << 20):
+    """
+    Returns a sha256 hex digest of the bytes of a file
+
+    Args
+        path (string): the path of the file
+        chunk_size (integer): the number of bytes read at once
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_package(package):
+    """
+    Returns a sha256 hex digest of the Python files of a package, so that the key of a stage that runs the code of the
+    package in-process changes with the code
+
+    Args
+        package (module): the package e.g. split
+    """
+    directory = os.path.dirname(package.__file__)
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.py'):
+            digest.update(name.encode())
+            digest.update(hash_file(os.path.join(directory, name)).encode())
+    return digest.hexdigest()
+
+
+def get_artifact_cache():
+    """
+    Returns the artifact cache of the process in the ARTIFACT_CACHE_DIR directory, sized by the ARTIFACT_CACHE_MB
+    environment variable, or None if ARTIFACT_CACHE_MB is 0 or unset
+    """
+    global artifact_cache
+    with artifact_cache_lock:
+        megabytes = float(os.getenv("ARTIFACT_CACHE_MB") or 0)
+        if artifact_cache is None and megabytes > 0:
+            artifact_cache = ArtifactCache(
+                os.getenv("ARTIFACT_CACHE_DIR") or os.path.join("data", "cache"), int(megabytes * 1024 * 1024))
+        return artifact_cache
@@ -0,0 +1,134 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+
+# Seconds between the checks of the polling watcher
+POLL_SECONDS = 0.25
+
+# inotify events of a file that was closed after writing or moved into the directory
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+EVENT_HEADER = struct.Struct('iIII')
+
+_libc = None
+
+
+class PollingWatcher():
+    """ Waits for a file by checking whether it exists every POLL_SECONDS seconds """
+
+    def wait(self, path: str, timeout: float):
+        """
+        Waits until a file exists
+
+        Args
+            path (string): the file
+            timeout (float): the number of seconds to wait
+        Return
+            found (boolean): True if the file exists, False if the timeout passed
+        """
+        deadline = time.monotonic() + timeout
+        while not os.path.exists(path):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(POLL_SECONDS, remaining))
+        return True
+
+
+class InotifyWatcher():
+    """
+    Waits for a file with Linux inotify, so that a file is found the moment it is closed after writing or moved into
+    its directory instead of at the next check of a polling loop
+    """
+
+    def wait(self, path: str, timeout: float):
+        """
+        Waits until a file is closed after writing or moved into its directory. A file that already exists is found
+        at once
+
+        Args
+            path (string): the file
+            timeout (float): the number of seconds to wait
+        Return
+            found (boolean): True if the file exists, False if the timeout passed
+        """
+        directory, name = os.path.split(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            return PollingWatcher().wait(path, timeout)
+
+        fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return PollingWatcher().wait(path, timeout)
+        try:
+            if _libc.inotify_add_watch(fd, directory.encode(), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+                return PollingWatcher().wait(path, timeout)
+            # The file may have been written before the watch was added
+            if os.path.exists(path):
+                return True
+            deadline = time.monotonic() + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return os.path.exists(path)
+                readable, _, _ = select.select([fd], [], [], remaining)
+                if readable and name in _read_names(fd):
+                    return True
+        finally:
+            os.close(fd)
+
+
+def _read_names(fd: int):
+    """ Returns the file names of the pending inotify events """
+    names = list()
+    try:
+        data = os.read(fd, 64 * 1024)
+    except OSError as error:
+        if error.errno == errno.EAGAIN:
+            return names
+        raise
+    offset = 0
+    while offset + EVENT_HEADER.size <= len(data):
+        _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+        offset += EVENT_HEADER.size
+        names.append(data[offset:offset + length].rstrip(b'\0').decode(errors='replace'))
+        offset += length
+    return names
+
+
+def get_file_watcher():
+    """
+    Returns an InotifyWatcher on Linux, or a PollingWatcher if inotify is not available
+    """
+    global _libc
+    if sys.platform.startswith('linux'):
+        try:
+            if _libc is None:
+                _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            if hasattr(_libc, 'inotify_init1') and hasattr(_libc, 'inotify_add_watch'):
+                return InotifyWatcher()
+        except (OSError, AttributeError):
+            logging.warning('inotify is not available. Waiting for files by polling')
+    return PollingWatcher()
+
+
+def wait_for_file(path: str, timeout: float):
+    """
+    Waits until a file is written
+
+    Args
+        path (string): the file
+        timeout (float): the number of seconds to wait
+    Return
+        found (boolean): True if the file exists, False if the timeout passed
+    """
+    return get_file_watcher().wait(path, timeout)
@@ -0,0 +1,205 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+
+# File names of the dataset handoff
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.npy"
+MODEL_SETS_FILE = "model_sets.json"
+# File name of the ML Adapter object in the working directory of an ML Adapter object or ML Model
+OBJECT_FILE = "ml_adapter_object.json"
+
+# Directories of the training and testing sets stored as .npy files
+TRAINING_SET_DIR = os.path.join("data", "training_set")
+TESTING_SET_DIR = os.path.join("data", "testing_set")
+
+
+def write_dataset(dataset: pd.DataFrame, directory: str):
+    """
+    Writes a DataFrame to a directory with a .npy file per column and a JSON manifest of the columns, so that
+    readers memory-map only the columns they need
+
+    Numeric, boolean and datetime columns are stored in their dtype. Other columns are stored as fixed-width strings
+    with a mask of the missing values.
+
+    Args
+        dataset (DataFrame): the dataset to write
+        directory (string): the directory of the dataset, which is replaced if it exists
+    """
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.makedirs(directory)
+
+    columns = list()
+    for position, name in enumerate(dataset.columns):
+        series = dataset.iloc[:, position]
+        column = {"name": _json_name(name), "file": "{0}.npy".format(position)}
+        if _is_native(series):
+            values = series.to_numpy()
+            column["kind"] = "native"
+        elif pd.api.types.is_numeric_dtype(series):
+            # Nullable numeric columns e.g. Int64 are stored as float64 with NaN
+            values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+            column["kind"] = "native"
+        else:
+            missing = series.isna().to_numpy()
+            values = series.astype(str).to_numpy(dtype=str)
+            column["kind"] = "string"
+            if missing.any():
+                column["mask"] = "{0}.mask.npy".format(position)
+                np.save(os.path.join(directory, column["mask"]), missing, allow_pickle=False)
+        np.save(os.path.join(directory, column["file"]), values, allow_pickle=False)
+        columns.append(column)
+
+    index = dataset.index.to_numpy()
+    if index.dtype == object:
+        index = index.astype(str)
+    np.save(os.path.join(directory, INDEX_FILE), index, allow_pickle=False)
+
+    manifest = {"rows": int(dataset.shape[0]), "index": INDEX_FILE, "columns": columns}
+    with open(os.path.join(directory, MANIFEST_FILE), 'w') as fp:
+        json.dump(manifest, fp)
+
+
+def load_dataset(directory: str, columns: list = None, mmap_mode: str = 'c'):
+    """
+    Loads columns of a dataset written by write_dataset. Numeric columns are memory-mapped and not read into memory
+
+    Args
+        directory (string): the directory of the dataset
+        columns (list): the names of the columns to load, defaults to every column
+        mmap_mode (string): the numpy memory-map mode. The default copy-on-write mode never modifies the files
+    Return
+        dataset (DataFrame): the columns of the dataset
+    """
+    with open(os.path.join(directory, MANIFEST_FILE)) as fp:
+        manifest = json.load(fp)
+    stored = {column["name"]: column for column in manifest["columns"]}
+    if columns is None:
+        columns = [column["name"] for column in manifest["columns"]]
+
+    data = dict()
+    for name in columns:
+        if name not in stored:
+            error = "column {0} is not in the dataset {1}".format(name, directory)
+            raise KeyError(error)
+        column = stored[name]
+        if column["kind"] == "string":
+            values = np.load(os.path.join(directory, column["file"])).astype(object)
+            if "mask" in column:
+                values[np.load(os.path.join(directory, column["mask"]))] = None
+        else:
+            values = np.load(os.path.join(directory, column["file"]), mmap_mode=mmap_mode)
+        data[name] = values
+
+    index = np.load(os.path.join(directory, manifest["index"]), mmap_mode=mmap_mode)
+    return pd.DataFrame(data, index=index, columns=columns, copy=False)
+
+
+def dataset_directory(file_path: str):
+    """
+    Returns the directory of the .npy files of a dataset that is otherwise stored as a .csv file
+    e.g. data/training_set.csv -> data/training_set
+
+    Args
+        file_path (string): the .csv file of the dataset
+    """
+    return os.path.splitext(file_path)[0]
+
+
+def write_model_sets(independent_variables: list,
+                     dependent_variables: list,
+                     directory: str = "data",
+                     training_set: str = TRAINING_SET_DIR,
+                     testing_set: str = TESTING_SET_DIR):
+    """
+    Writes the JSON file that tells load_model_sets the columns of the current ML Model
+
+    Args
+        independent_variables (list): the names of the independent variables (Features, X, Predictors)
+        dependent_variables (list): the names of the dependent variables (Response, y, Label)
+        directory (string): the directory of the JSON file
+        training_set (string): the directory of the .npy training set
+        testing_set (string): the directory of the .npy testing set
+    """
+    model_sets = {
+        "training_set": os.path.abspath(training_set),
+        "testing_set": os.path.abspath(testing_set),
+        "independent_variables": independent_variables,
+        "dependent_variables": dependent_variables
+    }
+    with open(os.path.join(directory, MODEL_SETS_FILE), 'w') as fp:
+        json.dump(model_sets, fp)
+
+
+def load_model_sets(directory: str = "data"):
+    """
+    Loads the predictors/response for the training and testing sets of the current ML Model in a Jupyter Notebook
+
+    Reads the .npy dataset handoff when the ML Adapter wrote it (DATASET_HANDOFF=npy), otherwise the
+    X_train.csv, X_test.csv, y_train.csv and y_test.csv files
+
+    Args
+        directory (string): the directory of the handoff files
+    Return
+        X_train (DataFrame): a subset of the Features, X, Predictors dataset used for training
+        X_test (DataFrame): a subset of the Features, X, Predictors dataset used for testing
+        y_train (DataFrame): a subset of the Response, y, Label dataset used for training, None if unsupervised
+        y_test (DataFrame): a subset of the Response, y, Label dataset used for testing, None if unsupervised
+    """
+    model_sets_path = os.path.join(directory, MODEL_SETS_FILE)
+    if os.path.exists(model_sets_path):
+        with open(model_sets_path) as fp:
+            model_sets = json.load(fp)
+        X_train = load_dataset(model_sets["training_set"], model_sets["independent_variables"])
+        X_test = load_dataset(model_sets["testing_set"], model_sets["independent_variables"])
+        y_train = None
+        y_test = None
+        if model_sets["dependent_variables"]:
+            y_train = load_dataset(model_sets["training_set"], model_sets["dependent_variables"])
+            y_test = load_dataset(model_sets["testing_set"], model_sets["dependent_variables"])
+        return X_train, X_test, y_train, y_test
+
+    sets = list()
+    for name in ['X_train.csv', 'X_test.csv', 'y_train.csv', 'y_test.csv']:
+        path = os.path.join(directory, name)
+        sets.append(pd.read_csv(path, index_col=0) if os.path.exists(path) else None)
+    return tuple(sets)
+
+
+def load_model_deltas(directory: str = "data"):
+    """
+    Loads the predictors/response of the rows appended to and evicted from the training set since the previous training
+    of the current ML Model in a Jupyter Notebook, when the ML Model is trained incrementally
+
+    Args
+        directory (string): the directory of the handoff files
+    Return
+        X_appended (DataFrame): the Features, X, Predictors of the rows appended to the training set
+        X_evicted (DataFrame): the Features, X, Predictors of the rows evicted from the training set
+        y_appended (DataFrame): the Response, y, Label of the rows appended to the training set, None if unsupervised
+        y_evicted (DataFrame): the Response, y, Label of the rows evicted from the training set, None if unsupervised
+    """
+    sets = list()
+    for name in ['X_appended.csv', 'X_evicted.csv', 'y_appended.csv', 'y_evicted.csv']:
+        path = os.path.join(directory, name)
+        sets.append(pd.read_csv(path, index_col=0) if os.path.exists(path) else None)
+    return tuple(sets)
+
+
+def _is_native(series: pd.Series):
+    """ Returns True if the column is stored in its own numpy dtype """
+    return isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biufcmM'
+
+
+def _json_name(name):
+    """ Returns a column name that is stored unchanged in JSON """
+    if isinstance(name, np.generic):
+        name = name.item()
+    if isinstance(name, (str, int, float, bool)) or name is None:
+        return name
+    return str(name)
@@ -0,0 +1,229 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from nbclient import NotebookClient
+from jupyter_client import KernelManager
+
+from .metrics import get_metrics_registry
+
+# Code that clears the namespace and sets the working directory of a pooled kernel, by kernel language
+RESET_CODE = {
+    'python': 'get_ipython().run_line_magic("reset", "-f")\nimport os as _os\n_os.chdir({path!r})\ndel _os',
+    'R': 'rm(list = ls(all.names = TRUE))\nsetwd({path!r})'
+}
+
+
+def environment_code(language: str, variables: dict, unset: list):
+    """
+    Returns code that sets and unsets environment variables of a kernel, or None if the language is not supported
+
+    Args
+        language (string): the language of the kernel e.g. python, R
+        variables (dictionary): the environment variables to set where the (key, value) is (name, value)
+        unset (list): the names of the environment variables to unset
+    """
+    if language == 'python':
+        return 'import os as _os\n_os.environ.update({0!r})\nfor _name in {1!r}:\n    _os.environ.pop(_name, None)\ndel _os'.format(
+            variables, list(unset))
+    if language == 'R':
+        lines = list()
+        if variables:
+            pairs = ', '.join('{0} = {1}'.format(json.dumps(k), json.dumps(v)) for k, v in variables.items())
+            lines.append('Sys.setenv({0})'.format(pairs))
+        if unset:
+            lines.append('Sys.unsetenv(c({0}))'.format(', '.join(json.dumps(name) for name in unset)))
+        return '\n'.join(lines)
+    return None
+
+
+class PooledKernel():
+    """
+    A running Jupyter kernel and its client
+
+    Args
+        kernel_name (string): name of Jupyter Notebook kernel e.g. (python3, ir)
+        env (dictionary): environment variables of the kernel process in addition to the environment of this process
+    """
+    __slots__ = ('kernel_name', 'km', 'kc', 'uses', 'env', 'run_env')
+
+    def __init__(self, kernel_name: str, env: dict = None):
+        self.kernel_name = kernel_name
+        self.env = env or dict()
+        # Environment variables set for the current Jupyter Notebook
+        self.run_env = dict()
+        self.km = KernelManager(kernel_name=kernel_name)
+        self.km.start_kernel(cwd=os.getcwd(), env=dict(os.environ, **self.env))
+        self.kc = self.km.client()
+        self.kc.start_channels()
+        self.kc.wait_for_ready(timeout=60)
+        self.uses = 0
+
+    @property
+    def language(self):
+        return self.km.kernel_spec.language
+
+    def restart(self, run_env: dict = None):
+        """ Restarts the kernel process, which clears every imported module """
+        self.run_env = run_env or dict()
+        self.km.restart_kernel(now=True, env=dict(os.environ, **self.env, **self.run_env))
+        self.kc.wait_for_ready(timeout=60)
+        self.uses = 0
+
+    def shutdown(self):
+        self.kc.stop_channels()
+        self.km.shutdown_kernel(now=True)
+
+
+class KernelPool():
+    """
+    Keeps warm Jupyter kernels alive to run Jupyter Notebooks without a kernel cold start
+
+        1. Starts up to size kernels per kernel name on demand
+        2. Clears the namespace, sets the working directory and the environment variables of a Jupyter Notebook in a
+           kernel before each Jupyter Notebook
+        3. Restarts a kernel after max_uses Jupyter Notebooks or when a Jupyter Notebook fails
+
+    Kernels of a language without reset code are restarted before every reuse.
+
+    Args
+        size (integer): the maximum number of kernels per kernel name
+        max_uses (integer): the number of Jupyter Notebooks run on a kernel before it is restarted
+        timeout (integer): the number of seconds a cell may run
+        env (dictionary): environment variables of every kernel process e.g. {"OMP_NUM_THREADS": "2"}
+    """
+
+    def __init__(self, size: int = 1, max_uses: int = 20, timeout: int = 600, env: dict = None):
+        self.size = max(1, size)
+        self.max_uses = max(1, max_uses)
+        self.timeout = timeout
+        self.env = env or dict()
+        self._condition = threading.Condition()
+        self._idle = dict()
+        self._count = dict()
+
+    def run(self, nb, path: str, kernel_name: str, env: dict = None):
+        """
+        Runs a Jupyter Notebook on a pooled kernel
+
+        Args
+            nb (NotebookNode): the Jupyter Notebook
+            path (string): the working directory of the Jupyter Notebook
+            kernel_name (string): name of Jupyter Notebook kernel e.g. (python3, ir)
+            env (dictionary): environment variables set for this Jupyter Notebook only
+        Return
+            nb (NotebookNode): the executed Jupyter Notebook
+        """
+        kernel = self._acquire(kernel_name)
+        failed = True
+        try:
+            self._reset(kernel, path, env or dict())
+            client = NotebookClient(nb,
+                                    km=kernel.km,
+                                    timeout=self.timeout,
+                                    kernel_name=kernel_name,
+                                    record_timing=True,
+                                    resources={'metadata': {
+                                        'path': path
+                                    }})
+            client.kc = kernel.kc
+            client.execute()
+            failed = False
+        finally:
+            self._release(kernel, failed)
+        return nb
+
+    def shutdown(self):
+        """ Shuts down every idle kernel """
+        with self._condition:
+            kernels = [kernel for idle in self._idle.values() for kernel in idle]
+            for kernel_name in self._idle:
+                self._count[kernel_name] -= len(self._idle[kernel_name])
+                self._idle[kernel_name] = list()
+        for kernel in kernels:
+            kernel.shutdown()
+
+    def _acquire(self, kernel_name: str):
+        """ Returns an idle kernel, starts a new kernel, or waits for a kernel to be released """
+        with self._condition:
+            idle = self._idle.setdefault(kernel_name, list())
+            while not idle and self._count.get(kernel_name, 0) >= self.size:
+                self._condition.wait()
+            if idle:
+                return idle.pop()
+            self._count[kernel_name] = self._count.get(kernel_name, 0) + 1
+
+        start = time.time()
+        try:
+            kernel = PooledKernel(kernel_name, self.env)
+        except Exception:
+            with self._condition:
+                self._count[kernel_name] -= 1
+                self._condition.notify()
+            raise
+        logging.info('Started {0} kernel in {1:.2f} seconds'.format(kernel_name, time.time() - start))
+        get_metrics_registry()["kernel_start_seconds"].observe(time.time() - start, kernel=kernel_name)
+        return kernel
+
+    def _release(self, kernel: PooledKernel, failed: bool):
+        """ Returns a kernel to the pool, restarting it when it failed or reached max_uses """
+        kernel.uses += 1
+        try:
+            if failed or kernel.uses >= self.max_uses:
+                kernel.restart()
+        except Exception:
+            logging.exception('Failed to restart ' + kernel.kernel_name + ' kernel')
+            with self._condition:
+                self._count[kernel.kernel_name] -= 1
+                self._condition.notify()
+            return
+        with self._condition:
+            self._idle[kernel.kernel_name].append(kernel)
+            self._condition.notify()
+
+    def _reset(self, kernel: PooledKernel, path: str, env: dict):
+        """
+        Clears the namespace of a previously used kernel and sets its working directory and environment variables
+        """
+        code = RESET_CODE.get(kernel.language)
+        if code is None:
+            if kernel.uses > 0 or env != kernel.run_env:
+                kernel.restart(env)
+            return
+        # Variables of the previous Jupyter Notebook are restored to the environment of the kernel process
+        base = dict(os.environ, **kernel.env)
+        restore = {name: base[name] for name in kernel.run_env if name not in env and name in base}
+        unset = [name for name in kernel.run_env if name not in env and name not in base]
+        code = code.format(path=path) + '\n' + environment_code(kernel.language, dict(restore, **env), unset)
+        reply = kernel.kc.execute_interactive(code, silent=True, timeout=60)
+        if reply['content']['status'] != 'ok':
+            kernel.restart(env)
+        kernel.run_env = dict(env)
+
+
+def cell_execution_times(nb):
+    """
+    Returns the number of seconds each code cell of an executed Jupyter Notebook took to run
+
+    Args
+        nb (NotebookNode): the executed Jupyter Notebook
+    Return
+        times (list): a list of (cell index, seconds) tuples
+    """
+    times = list()
+    for index, cell in enumerate(nb.cells):
+        execution = cell.get('metadata', {}).get('execution', {})
+        started = execution.get('iopub.execute_input')
+        finished = execution.get('shell.execute_reply')
+        if cell.cell_type == 'code' and started and finished:
+            seconds = (_parse_time(finished) - _parse_time(started)).total_seconds()
+            times.append((index, seconds))
+    return times
+
+
+def _parse_time(timestamp: str):
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
@@ -0,0 +1,212 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+# Upper bounds in seconds of the buckets of a histogram, from a fast Deep Lynx call to a slow model
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# The metrics of the ML Adapter as (type, name, help, labels)
+PIPELINE_METRICS = [
+    ("counter", "events_total", "Deep Lynx events received by response status", ["status"]),
+    ("histogram", "event_seconds", "Seconds to handle a Deep Lynx event request", ["status"]),
+    ("histogram", "ingest_seconds", "Seconds to retrieve and read the file of an event", []),
+    ("histogram", "deep_lynx_seconds", "Seconds of a Deep Lynx API call by operation and outcome",
+     ["operation", "outcome"]),
+    ("histogram", "queue_append_seconds", "Seconds to append rows to the queue window", []),
+    ("gauge", "window_rows", "Rows in the queue window", []),
+    ("histogram", "kernel_start_seconds", "Seconds to start a Jupyter kernel", ["kernel"]),
+    ("histogram", "notebook_seconds", "Seconds to run a Jupyter Notebook", ["notebook", "kernel"]),
+    ("counter", "notebook_failures_total", "Jupyter Notebooks that failed", ["notebook", "kernel"]),
+    ("counter", "cycles_total", "Training cycles run", []),
+    ("histogram", "cycle_seconds", "Seconds of a training cycle", []),
+    ("counter", "adapter_runs_total", "Runs of ML Adapter objects by outcome", ["object", "outcome"]),
+    ("histogram", "stage_seconds", "Seconds of a stage of an ML Adapter object", ["object", "stage"]),
+    ("histogram", "model_training_seconds", "Seconds to train a model", ["notebook", "mode"]),
+    ("histogram", "prediction_seconds", "Seconds of a prediction by its Jupyter Notebook", ["notebook"]),
+    ("counter", "artifact_cache_total", "Artifact cache lookups by stage and result", ["stage", "result"]),
+    ("counter", "imports_total", "Imports of result files into Deep Lynx by outcome", ["outcome"]),
+    ("histogram", "import_seconds", "Seconds to import a result file into Deep Lynx", ["mode"]),
+]
+
+metrics_registry = None
+metrics_registry_lock = threading.Lock()
+
+
+class Metric():
+    """
+    A metric of the Prometheus text format, with a value for every combination of its label values
+
+    Args
+        name (string): the name of the metric e.g. ml_adapter_events_total
+        help (string): the description of the metric
+        labels (list): the names of the labels of the metric
+    """
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: list = None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels or list())
+        self._values = dict()
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict):
+        """ Returns the label values of a sample in the order of the labels of the metric """
+        if set(labels) != set(self.labels):
+            error = "metric {0} has labels {1}, not {2}".format(self.name, list(self.labels), sorted(labels))
+            raise ValueError(error)
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def samples(self):
+        """ Returns the samples of the metric as a list of (suffix, label values, extra labels, value) """
+        with self._lock:
+            return [("", key, (), value) for key, value in self._values.items()]
+
+    def render(self):
+        """ Returns the lines of the metric in the Prometheus text format """
+        lines = ["# HELP {0} {1}".format(self.name, self.help), "# TYPE {0} {1}".format(self.name, self.type)]
+        for suffix, key, extra, value in self.samples():
+            pairs = list(zip(self.labels, key)) + list(extra)
+            labels = ",".join('{0}="{1}"'.format(name, _escape(value)) for name, value in pairs)
+            lines.append("{0}{1}{2} {3}".format(self.name, suffix, "{" + labels + "}" if labels else "",
+                                                _format(value)))
+        return lines
+
+
+class Counter(Metric):
+    """ A value that only increases, e.g. the number of training cycles """
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """ A value that goes up and down, e.g. the number of rows in the queue window """
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    """
+    The distribution of observed values, e.g. latencies, as cumulative bucket counts, a sum and a count
+
+    Args
+        buckets (tuple): the upper bounds of the buckets
+    """
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: list = None, buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """ Observes the number of seconds of a block of code, also when it raises an exception """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        samples = list()
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf, ), counts):
+                cumulative += count
+                samples.append(("_bucket", key, (("le", _format(bound)), ), cumulative))
+            samples.append(("_sum", key, (), total))
+            samples.append(("_count", key, (), cumulative))
+        return samples
+
+
+class MetricsRegistry():
+    """
+    The metrics of the process, rendered in the Prometheus text format for the /metrics route
+
+    Args
+        prefix (string): the prefix of the names of the metrics e.g. ml_adapter_
+    """
+    types = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}
+
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self._metrics = dict()
+        self._lock = threading.Lock()
+
+    def register(self, type: str, name: str, help: str, labels: list = None, **kwargs):
+        """
+        Returns the metric of a name, created if it does not exist
+
+        Args
+            type (string): counter, gauge or histogram
+            name (string): the name of the metric without the prefix
+            help (string): the description of the metric
+            labels (list): the names of the labels of the metric
+            kwargs: other arguments of the metric e.g. the buckets of a histogram
+        """
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = self.types[type](self.prefix + name, help, labels, **kwargs)
+            return self._metrics[name]
+
+    def __getitem__(self, name: str):
+        """ Returns the metric of a name without the prefix e.g. metrics["events_total"] """
+        with self._lock:
+            return self._metrics[name]
+
+    def render(self):
+        """ Returns the metrics in the Prometheus text format """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = list()
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format(value: float):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(float(value))
+    return repr(float(value))
+
+
+def get_metrics_registry():
+    """ Returns the metrics registry of the process with the metrics of the ML Adapter, see PIPELINE_METRICS """
+    global metrics_registry
+    with metrics_registry_lock:
+        if metrics_registry is None:
+            metrics_registry = MetricsRegistry(prefix="ml_adapter_")
+            for type, name, help, labels in PIPELINE_METRICS:
+                metrics_registry.register(type, name, help, labels)
+        return metrics_registry
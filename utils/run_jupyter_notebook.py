@@ -1,20 +1,54 @@
 # Copyright 2021, Battelle Energy Alliance, LLC
 
 import os
+import logging
+import threading
 import nbformat
-from nbconvert.preprocessors import ExecutePreprocessor
 
+from .kernel_pool import KernelPool, cell_execution_times
+from .metrics import get_metrics_registry
 
-def run_jupyter_notebook(file_path: str, kernel: str):
+kernel_pool = None
+kernel_pool_lock = threading.Lock()
+
+
+def run_jupyter_notebook(file_path: str, kernel: str, env: dict = None, pool: KernelPool = None):
     """
-    Runs a Jupyter Notebook programmatically
+    Runs a Jupyter Notebook programmatically on a warm kernel from the kernel pool
 
     Args
         file_path (string): the file path to the Jupyter Notebook
-        kernel (string): name of Jupyter Notebook kernel e.g. (python3, ir) 
+        kernel (string): name of Jupyter Notebook kernel e.g. (python3, ir)
+        env (dictionary): environment variables set for this Jupyter Notebook only e.g. {"ML_ADAPTER_OBJECT_LOCATION": ""}
+        pool (KernelPool): the kernel pool to run the Jupyter Notebook on, defaults to the kernel pool of the process
+    Return
+        nb (NotebookNode): the executed Jupyter Notebook
     """
-    path = os.path.split(file_path)
+    path = os.path.split(os.path.abspath(file_path))
     with open(file_path) as f:
         nb = nbformat.read(f, as_version=4)
-    ep = ExecutePreprocessor(timeout=600, kernel_name=kernel)
-    ep.preprocess(nb, {'metadata': {'path': path[0]}})
\ No newline at end of file
+    pool = pool or get_kernel_pool()
+    metrics = get_metrics_registry()
+    try:
+        with metrics["notebook_seconds"].time(notebook=path[1], kernel=kernel):
+            nb = pool.run(nb, path[0], kernel, env)
+    except Exception:
+        metrics["notebook_failures_total"].inc(notebook=path[1], kernel=kernel)
+        raise
+
+    for index, seconds in cell_execution_times(nb):
+        logging.info('{0} cell {1} ran in {2:.3f} seconds'.format(path[1], index, seconds))
+    return nb
+
+
+def get_kernel_pool():
+    """
+    Returns the kernel pool of the process, sized by the KERNEL_POOL_SIZE and KERNEL_MAX_USES environment variables
+    """
+    global kernel_pool
+    with kernel_pool_lock:
+        if kernel_pool is None:
+            kernel_pool = KernelPool(size=int(os.getenv("KERNEL_POOL_SIZE", 1)),
+                                     max_uses=int(os.getenv("KERNEL_MAX_USES", 20)),
+                                     timeout=600)
+        return kernel_pool
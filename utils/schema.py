@@ -0,0 +1,259 @@
+# Copyright 2021, Battelle Energy Alliance, LLC
+
+import os
+import json
+import logging
+import threading
+import numpy as np
+import pandas as pd
+
+# Share of distinct values below which a text column is read as a categorical column
+CATEGORY_RATIO = 0.5
+
+# The name of the dataset of the queue window: the DeepLynx files, the queue window snapshot and the prediction dataset
+QUEUE_DATASET = "queue"
+
+# The schema registry of every dataset, or None for a dataset read with the default pandas dtypes
+schema_registries = dict()
+schema_registry_lock = threading.Lock()
+
+
+class SchemaRegistry():
+    """
+    The columns and dtypes of a dataset of the ML Adapter, so that every .csv file of the dataset is read with compact
+    dtypes and only the columns that are used
+
+        1. The schema is declared by the DATASET_SCHEMA environment variable, in which case only the declared columns
+           are read, or learned from the first file of the dataset that is read
+        2. A learned schema stores floats as float32 (DATASET_FLOAT_DTYPE), integers as the smallest of int32 and int64
+           that holds them, and text columns with few distinct values as categorical columns
+        3. Columns that are not in the schema are learned when they are first read. A column whose values no longer
+           fit its dtype, e.g. an integer column that receives a float, is widened
+        4. A reader passes the columns it uses, e.g. the variables of a model, so that the other columns are not parsed
+
+    Args
+        columns (dictionary): the declared schema where the (key, value) is (column, dtype) e.g. {"x1": "float32"}, or
+            None to learn the schema
+        float_dtype (string): the dtype of the float columns of a learned schema, float32 or float64
+    """
+
+    def __init__(self, columns: dict = None, float_dtype: str = "float32"):
+        self.declared = columns is not None
+        self.float_dtype = np.dtype(float_dtype)
+        self._dtypes = {column: pandas_dtype(dtype) for column, dtype in (columns or dict()).items()}
+        self._lock = threading.Lock()
+
+    @property
+    def dtypes(self):
+        """ Returns a copy of the schema where the (key, value) is (column, dtype) """
+        with self._lock:
+            return dict(self._dtypes)
+
+    def read_csv(self, path: str, columns: list = None, **kwargs):
+        """
+        Reads a .csv file with the dtypes of the schema
+
+        Args
+            path (string): the .csv file
+            columns (list): the columns to read, or None to read every column of the schema. Columns that are not in
+                the file are left out
+            kwargs: other arguments of pandas.read_csv
+        Return
+            dataset (DataFrame): the columns of the file in the order of the file
+        """
+        usecols = self._usecols(columns)
+        # Integers are parsed as int64 and downcast by apply, because pandas.read_csv wraps integers that overflow
+        dtypes = {column: np.dtype(np.int64) if _is_integer(dtype) else dtype for column, dtype in self.dtypes.items()}
+        try:
+            dataset = pd.read_csv(path, usecols=usecols, dtype=dtypes, **kwargs)
+        except (ValueError, TypeError, OverflowError) as error:
+            # A value of the file does not fit the dtype of its column, which is widened by apply
+            logging.warning('Reading {0} without the schema: {1}'.format(path, error))
+            if hasattr(path, 'seek'):
+                path.seek(0)
+            dataset = pd.read_csv(path, usecols=usecols, **kwargs)
+        return self.apply(dataset)
+
+    def read_csv_chunks(self, path, chunk_rows: int, columns: list = None, **kwargs):
+        """
+        Reads a .csv file in chunks of rows with the dtypes of the schema
+
+        The chunks are parsed with the default dtypes and cast by apply, because a stream cannot be read again when a
+        value does not fit the dtype of its column.
+
+        Args
+            path (string or file): the .csv file, or a file-like object e.g. a response streamed from Deep Lynx
+            chunk_rows (integer): the number of rows of a chunk
+            columns (list): the columns to read, or None to read every column of the schema
+            kwargs: other arguments of pandas.read_csv
+        Return
+            chunks (iterator): a DataFrame of at most chunk_rows rows per chunk
+        """
+        with pd.read_csv(path, usecols=self._usecols(columns), chunksize=chunk_rows, **kwargs) as reader:
+            for chunk in reader:
+                yield self.apply(chunk)
+
+    def apply(self, dataset: pd.DataFrame):
+        """
+        Casts the columns of a DataFrame to the dtypes of the schema. Columns that are not in a learned schema are
+        learned, and columns whose values do not fit their dtype are widened
+
+        Args
+            dataset (DataFrame): e.g. the data of a file read without the schema
+        Return
+            dataset (DataFrame): the DataFrame with the dtypes of the schema
+        """
+        casts = dict()
+        with self._lock:
+            if self.declared:
+                dataset = dataset[[column for column in dataset.columns if column in self._dtypes]]
+            for column in dataset.columns:
+                series = dataset[column]
+                dtype = self._dtypes.get(column)
+                if dtype is None:
+                    dtype = self._dtypes[column] = self.learn(series)
+                elif not _fits(series, dtype):
+                    dtype = self._dtypes[column] = self._widen(column, series)
+                if str(series.dtype) != str(dtype):
+                    casts[column] = dtype
+        if not casts:
+            return dataset
+        try:
+            return dataset.astype(casts)
+        except (ValueError, TypeError):
+            casts = {column: np.dtype(object) for column in casts}
+            with self._lock:
+                self._dtypes.update(casts)
+            return dataset.astype(casts)
+
+    def _widen(self, column: str, series: pd.Series):
+        """ Returns a dtype that holds the dtype of a column and the values of series. The caller must hold the lock """
+        current = self._dtypes[column]
+        learned = self.learn(series)
+        if _is_numeric(current) and _is_numeric(learned):
+            dtype = np.promote_types(current, learned)
+        else:
+            dtype = np.dtype(object)
+        logging.info('Widened column {0} from {1} to {2}'.format(column, current, dtype))
+        return dtype
+
+    def learn(self, series: pd.Series):
+        """
+        Returns the compact dtype of a column
+
+        Args
+            series (Series): the values of the column read with the default dtypes
+        """
+        dtype = series.dtype
+        if pd.api.types.is_bool_dtype(dtype):
+            return np.dtype(bool)
+        if pd.api.types.is_integer_dtype(dtype):
+            info = np.iinfo(np.int32)
+            if series.empty or (series.min() >= info.min and series.max() <= info.max):
+                return np.dtype(np.int32)
+            return np.dtype(np.int64)
+        if pd.api.types.is_float_dtype(dtype):
+            return self.float_dtype
+        if pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+            values = series.dropna()
+            if not values.empty and values.nunique() <= CATEGORY_RATIO * values.shape[0]:
+                return pd.CategoricalDtype()
+        return dtype
+
+    def _usecols(self, columns: list = None):
+        """ Returns the usecols argument of pandas.read_csv for the columns of a reader and the declared schema """
+        if columns is None and not self.declared:
+            return None
+        dtypes = self.dtypes
+        wanted = set(columns if columns is not None else dtypes)
+        if self.declared:
+            wanted &= set(dtypes)
+        return lambda column: column in wanted
+
+
+def _is_integer(dtype):
+    return isinstance(dtype, np.dtype) and dtype.kind in 'iu'
+
+
+def _is_numeric(dtype):
+    return isinstance(dtype, np.dtype) and dtype.kind in 'biuf'
+
+
+def _fits(series: pd.Series, dtype):
+    """ Returns whether the values of a column can be cast to a dtype without losing values """
+    if _is_integer(dtype):
+        if not pd.api.types.is_integer_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+            return False
+        info = np.iinfo(dtype)
+        return series.empty or (series.min() >= info.min and series.max() <= info.max)
+    if isinstance(dtype, np.dtype) and dtype.kind == 'f':
+        return pd.api.types.is_numeric_dtype(series.dtype)
+    if isinstance(dtype, np.dtype) and dtype.kind == 'b':
+        return pd.api.types.is_bool_dtype(series.dtype)
+    return True
+
+
+def pandas_dtype(dtype: str):
+    """ Returns the dtype of a declared schema e.g. float32, int32, category, object """
+    if dtype == "category":
+        return pd.CategoricalDtype()
+    return np.dtype(dtype)
+
+
+def get_schema_registry(dataset: str = QUEUE_DATASET):
+    """
+    Returns the schema registry of a dataset, declared by the DATASET_SCHEMA environment variable or, if
+    DATASET_COMPACT_DTYPES is true, learned from the first file of the dataset that is read
+
+    Args
+        dataset (string): the name of the dataset, queue for the queue window or the name of an ML Adapter object for
+            its training and testing sets
+    Return
+        registry (SchemaRegistry): the schema registry, or None if DATASET_SCHEMA is unset and DATASET_COMPACT_DTYPES
+            is false
+    """
+    with schema_registry_lock:
+        if dataset not in schema_registries:
+            columns = os.getenv("DATASET_SCHEMA")
+            compact = os.getenv("DATASET_COMPACT_DTYPES", "false").lower() in ["true", "1", "yes", "y"]
+            registry = None
+            if columns or compact:
+                registry = SchemaRegistry(json.loads(columns) if columns else None,
+                                          float_dtype=os.getenv("DATASET_FLOAT_DTYPE") or "float32")
+            schema_registries[dataset] = registry
+        return schema_registries[dataset]
+
+
+def read_csv_chunks(path, chunk_rows: int, columns: list = None, dataset: str = QUEUE_DATASET, **kwargs):
+    """
+    Reads a .csv file in chunks of rows with the schema registry of a dataset, or with the default dtypes if the
+    dataset has no schema registry, see SchemaRegistry.read_csv_chunks
+    """
+    registry = get_schema_registry(dataset)
+    if registry is not None:
+        yield from registry.read_csv_chunks(path, chunk_rows, columns, **kwargs)
+        return
+    wanted = set(columns) if columns is not None else None
+    usecols = (lambda column: column in wanted) if wanted is not None else None
+    with pd.read_csv(path, usecols=usecols, chunksize=chunk_rows, **kwargs) as reader:
+        yield from reader
+
+
+def read_csv(path: str, columns: list = None, dataset: str = QUEUE_DATASET, **kwargs):
+    """
+    Reads a .csv file with the schema registry of a dataset, or with the default dtypes if the dataset has no schema
+    registry, see SchemaRegistry.read_csv
+
+    Args
+        path (string): the .csv file
+        columns (list): the columns to read, or None to read every column
+        dataset (string): the name of the dataset of the file, see get_schema_registry
+        kwargs: other arguments of pandas.read_csv
+    """
+    registry = get_schema_registry(dataset)
+    if registry is not None:
+        return registry.read_csv(path, columns, **kwargs)
+    if columns is None:
+        return pd.read_csv(path, **kwargs)
+    wanted = set(columns)
+    return pd.read_csv(path, usecols=lambda column: column in wanted, **kwargs)